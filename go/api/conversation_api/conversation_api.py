@@ -96,7 +96,8 @@ class ConversationConfigResource(BaseResource):
             yield self.update_jsbox_config('javascript', jsbox_md)
 
             conversation.set_config(conv_config)
-            yield conversation.save()
+            yield conversation.user_api.conversation_store.save_conversation(
+                conversation.c)
         else:
             request.setResponseCode(http.BAD_REQUEST)
 
@@ -4,6 +4,7 @@
 from zope.interface import implements
 
 from twisted.cred import portal, checkers, credentials, error
+from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks, returnValue
 from twisted.web import resource
 from twisted.web.guard import HTTPAuthSessionWrapper, BasicCredentialFactory
@@ -25,6 +26,12 @@ class GoUserRealm(object):
 class GoUserSessionAccessChecker(object):
     """Checks that a username and password matches some constant (usually
     "session") and a Go session id.
+
+    The user account keys of valid sessions are cached in memory for up to
+    `cache_ttl` seconds, but never beyond the expiry of the session itself.
+    A session deleted from Redis is therefore only rejected once its cache
+    entry expires. The number of cache hits and misses are counted in
+    `cache_hits` and `cache_misses`.
     """
 
     implements(checkers.ICredentialsChecker)
@@ -32,17 +39,64 @@ class GoUserSessionAccessChecker(object):
 
     EXPECTED_USERNAME = "session_id"
 
-    def __init__(self, session_manager):
+    # Expired cache entries are only purged once the cache has this many
+    # entries.
+    MAX_CACHE_SIZE = 1000
+
+    clock = reactor
+
+    def __init__(self, session_manager, cache_ttl=10):
         self.session_manager = session_manager
+        self.cache_ttl = cache_ttl
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = {}
+
+    def _get_cached_account_key(self, session_id):
+        cached = self._cache.get(session_id)
+        if cached is None:
+            return None
+        user_account_key, expires_at = cached
+        if expires_at <= self.clock.seconds():
+            del self._cache[session_id]
+            return None
+        return user_account_key
+
+    def _cache_account_key(self, session_id, user_account_key, session_ttl):
+        now = self.clock.seconds()
+        if len(self._cache) >= self.MAX_CACHE_SIZE:
+            for key, (_, expires_at) in self._cache.items():
+                if expires_at <= now:
+                    del self._cache[key]
+            if len(self._cache) >= self.MAX_CACHE_SIZE:
+                self._cache.clear()
+        ttl = self.cache_ttl
+        if session_ttl is not None:
+            ttl = min(ttl, session_ttl)
+        if ttl > 0:
+            self._cache[session_id] = (user_account_key, now + ttl)
 
     @inlineCallbacks
     def requestAvatarId(self, credentials):
         if credentials.username != self.EXPECTED_USERNAME:
             raise error.UnauthorizedLogin()
         session_id = credentials.password
-        session = yield self.session_manager.get_session(session_id)
+
+        user_account_key = self._get_cached_account_key(session_id)
+        if user_account_key is not None:
+            self.cache_hits += 1
+            returnValue(user_account_key)
+        self.cache_misses += 1
+
+        # Make both calls before waiting for either of them so that they
+        # run concurrently.
+        session_d = self.session_manager.get_session(session_id)
+        session_ttl_d = self.session_manager.session_ttl(session_id)
+        session = yield session_d
+        session_ttl = yield session_ttl_d
         user_account_key = self.session_manager.get_user_account_key(session)
         if user_account_key:
+            self._cache_account_key(session_id, user_account_key, session_ttl)
             returnValue(user_account_key)
         raise error.UnauthorizedLogin()
 
@@ -24,6 +24,7 @@ from go.api.go_api.action_dispatcher import (
     ConversationSubhandler, RouterSubhandler)
 from go.api.go_api.auth import GoUserRealm, GoUserAuthSessionWrapper
 from go.api.go_api.utils import GoApiSubHandler, GoApiError
+from go.config import load_definitions
 from go.vumitools.routing_table import RoutingTable
 from go.vumitools.api import VumiApi
 
@@ -271,6 +272,9 @@ class GoApiWorker(BaseWorker):
     @inlineCallbacks
     def setup_worker(self):
         config = self.get_static_config()
+        # Resolve the conversation and router definitions used by the
+        # action dispatchers now rather than on the first request.
+        load_definitions()
         self.vumi_api = yield VumiApi.from_config_async({
             'redis_manager': config.redis_manager,
             'riak_manager': config.riak_manager,
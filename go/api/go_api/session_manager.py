@@ -81,9 +81,15 @@ class SessionManager(object):
     def save_session(self, session_key, session_data, expire_seconds):
         """Save the given session entry."""
         session_json = json.dumps(session_data)
-        yield self.manager.set(self._session_key(session_key), session_json)
-        yield self.manager.expire(
+        # SETEX takes its arguments in different orders in the sync and
+        # async Redis managers, so we make both calls before waiting for
+        # either of them instead. The async manager then sends them
+        # back to back on the same connection.
+        set_d = self.manager.set(self._session_key(session_key), session_json)
+        expire_d = self.manager.expire(
             self._session_key(session_key), expire_seconds)
+        yield set_d
+        yield expire_d
 
     def delete_session(self, session_key):
         """Deletes the given session entry."""
@@ -5,6 +5,7 @@ import base64
 from twisted.cred import error
 from twisted.cred.credentials import UsernamePassword
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import Clock
 from twisted.web import resource
 from twisted.web.test.test_web import DummyRequest
 
@@ -83,6 +84,76 @@ class TestGoUserSessionAccessChecker(VumiTestCase):
             errored = True
         self.assertTrue(errored)
 
+    def mk_checker(self, cache_ttl=10):
+        checker = GoUserSessionAccessChecker(self.sm, cache_ttl=cache_ttl)
+        checker.clock = Clock()
+        return checker
+
+    @inlineCallbacks
+    def save_session(self, session_id, user_account_key, expire_seconds):
+        session = {}
+        self.sm.set_user_account_key(session, user_account_key)
+        yield self.sm.save_session(session_id, session, expire_seconds)
+
+    @inlineCallbacks
+    def assert_unauthorized(self, checker, creds):
+        try:
+            yield checker.requestAvatarId(creds)
+        except error.UnauthorizedLogin:
+            pass
+        else:
+            self.fail("Expected UnauthorizedLogin")
+
+    @inlineCallbacks
+    def test_request_avatar_id_cached(self):
+        checker = self.mk_checker()
+        yield self.save_session(u"session-1", u"user-1", 100)
+        creds = UsernamePassword(u"session_id", u"session-1")
+        self.assertEqual((yield checker.requestAvatarId(creds)), u"user-1")
+        self.assertEqual((yield checker.requestAvatarId(creds)), u"user-1")
+        self.assertEqual((checker.cache_hits, checker.cache_misses), (1, 1))
+
+    @inlineCallbacks
+    def test_request_avatar_id_deleted_session(self):
+        checker = self.mk_checker()
+        yield self.save_session(u"session-1", u"user-1", 100)
+        creds = UsernamePassword(u"session_id", u"session-1")
+        yield checker.requestAvatarId(creds)
+        yield self.sm.delete_session(u"session-1")
+        # The deleted session is accepted until its cache entry expires.
+        self.assertEqual((yield checker.requestAvatarId(creds)), u"user-1")
+        checker.clock.advance(10)
+        yield self.assert_unauthorized(checker, creds)
+        self.assertEqual((checker.cache_hits, checker.cache_misses), (1, 2))
+
+    @inlineCallbacks
+    def test_request_avatar_id_cache_bounded_by_session_ttl(self):
+        checker = self.mk_checker()
+        yield self.save_session(u"session-1", u"user-1", 2)
+        creds = UsernamePassword(u"session_id", u"session-1")
+        yield checker.requestAvatarId(creds)
+        checker.clock.advance(2)
+        yield checker.requestAvatarId(creds)
+        self.assertEqual((checker.cache_hits, checker.cache_misses), (0, 2))
+
+    @inlineCallbacks
+    def test_request_avatar_id_unknown_session_not_cached(self):
+        checker = self.mk_checker()
+        creds = UsernamePassword(u"session_id", u"session-1")
+        yield self.assert_unauthorized(checker, creds)
+        yield self.save_session(u"session-1", u"user-1", 100)
+        self.assertEqual((yield checker.requestAvatarId(creds)), u"user-1")
+        self.assertEqual((checker.cache_hits, checker.cache_misses), (0, 2))
+
+    @inlineCallbacks
+    def test_request_avatar_id_cache_disabled(self):
+        checker = self.mk_checker(cache_ttl=0)
+        yield self.save_session(u"session-1", u"user-1", 100)
+        creds = UsernamePassword(u"session_id", u"session-1")
+        yield checker.requestAvatarId(creds)
+        yield self.sm.delete_session(u"session-1")
+        yield self.assert_unauthorized(checker, creds)
+
 
 class TestGoUserAuthSessionWrapper(VumiTestCase):
 
@@ -85,9 +85,7 @@ class TestBulkMessageApplication(VumiTestCase):
         self.assertEqual([], self.app_helper.get_dispatched_outbound())
 
     @inlineCallbacks
-    def test_consume_events(self):
-        conversation = yield self.setup_conversation()
-        yield self.app_helper.start_conversation(conversation)
+    def bulk_send_via_window(self, conversation):
         batch_id = conversation.batch.key
         yield self.app_helper.dispatch_command(
             "bulk_send",
@@ -109,6 +107,30 @@ class TestBulkMessageApplication(VumiTestCase):
             conversation, TransportUserMessage(**msg1.payload))
         yield self.app_helper.store_outbound(
             conversation, TransportUserMessage(**msg2.payload))
+        returnValue((window_id, msg1, msg2))
+
+    @inlineCallbacks
+    def delete_message_windows(self, *msgs):
+        for msg in msgs:
+            yield self.app.redis.delete(
+                self.app.message_window_key(msg['message_id']))
+
+    def record_message_lookups(self):
+        lookups = []
+        orig_find_message = self.app.find_message_for_event
+
+        def find_message_for_event(event):
+            lookups.append(event['user_message_id'])
+            return orig_find_message(event)
+
+        self.patch(self.app, 'find_message_for_event', find_message_for_event)
+        return lookups
+
+    @inlineCallbacks
+    def test_consume_events(self):
+        conversation = yield self.setup_conversation()
+        yield self.app_helper.start_conversation(conversation)
+        window_id, msg1, msg2 = yield self.bulk_send_via_window(conversation)
 
         # We should have two in flight
         self.assertEqual(
@@ -122,6 +144,60 @@ class TestBulkMessageApplication(VumiTestCase):
         self.assertEqual(
             (yield self.app.window_manager.count_in_flight(window_id)), 0)
 
+    @inlineCallbacks
+    def test_consume_events_uses_window_mapping(self):
+        conversation = yield self.setup_conversation()
+        yield self.app_helper.start_conversation(conversation)
+        window_id, msg1, msg2 = yield self.bulk_send_via_window(conversation)
+        for msg in [msg1, msg2]:
+            key = self.app.message_window_key(msg['message_id'])
+            self.assertEqual((yield self.app.redis.get(key)), window_id)
+            ttl = yield self.app.redis.ttl(key)
+            self.assertTrue(0 < ttl <= self.app.max_ack_wait)
+
+        lookups = self.record_message_lookups()
+        yield self.app_helper.make_dispatch_ack(msg1)
+        yield self.app_helper.make_dispatch_nack(msg2, nack_reason='unknown')
+
+        self.assertEqual(lookups, [])
+        self.assertEqual(
+            (yield self.app.window_manager.count_in_flight(window_id)), 0)
+        for msg in [msg1, msg2]:
+            self.assertFalse((yield self.app.redis.exists(
+                self.app.message_window_key(msg['message_id']))))
+
+    @inlineCallbacks
+    def test_consume_events_without_window_mapping(self):
+        conversation = yield self.setup_conversation()
+        yield self.app_helper.start_conversation(conversation)
+        window_id, msg1, msg2 = yield self.bulk_send_via_window(conversation)
+        # Messages sent before the mapping was recorded aren't in it.
+        yield self.delete_message_windows(msg1, msg2)
+
+        lookups = self.record_message_lookups()
+        yield self.app_helper.make_dispatch_ack(msg1)
+        yield self.app_helper.make_dispatch_nack(msg2, nack_reason='unknown')
+
+        self.assertEqual(
+            lookups, [msg1['message_id'], msg2['message_id']])
+        self.assertEqual(
+            (yield self.app.window_manager.count_in_flight(window_id)), 0)
+
+    @inlineCallbacks
+    def test_consume_event_for_unknown_message(self):
+        conversation = yield self.setup_conversation()
+        yield self.app_helper.start_conversation(conversation)
+        window_id, msg1, msg2 = yield self.bulk_send_via_window(conversation)
+        yield self.delete_message_windows(msg1, msg2)
+
+        with LogCatcher(message='Unable to find message') as lc:
+            yield self.app_helper.make_dispatch_ack(
+                self.app_helper.make_outbound(u"hi", message_id=u"unknown"))
+        [err] = lc.errors
+        self.assertTrue('user_message_id: unknown' in err['message'][0])
+        self.assertEqual(
+            (yield self.app.window_manager.count_in_flight(window_id)), 2)
+
     @inlineCallbacks
     def test_send_message_command(self):
         msg_options = {
@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 
 """Vumi application worker for the vumitools API."""
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from vumi.components.window_manager import WindowManager
+from vumi.message import TransportUserMessage
 from vumi import log
 
 from go.vumitools.app_worker import GoApplicationWorker
@@ -44,10 +45,17 @@ class BulkMessageApplication(GoApplicationWorker):
         to_addr = data['to_addr']
         content = data['content']
         msg_options = data['msg_options']
-        msg = yield self.send_to(
-            to_addr, content, endpoint='default', **msg_options)
+        # The message's window is recorded before it is sent so that it can
+        # be found for events that arrive before send_to() returns.
+        message_id = TransportUserMessage.generate_id()
         yield self.window_manager.set_external_id(window_id, flight_key,
-            msg['message_id'])
+            message_id)
+        message_window_key = self.message_window_key(message_id)
+        yield self.redis.set(message_window_key, window_id)
+        yield self.redis.expire(message_window_key, self.max_ack_wait)
+        yield self.send_to(
+            to_addr, content, endpoint='default', message_id=message_id,
+            **msg_options)
 
     def on_window_cleanup(self, window_id):
         log.info('Finished window %s, removing.' % (window_id,))
@@ -55,6 +63,14 @@ class BulkMessageApplication(GoApplicationWorker):
     def get_window_id(self, conversation_key, batch_id):
         return ':'.join([conversation_key, batch_id])
 
+    def message_window_key(self, message_id):
+        """
+        The key holding the id of the window a message was sent from. It is
+        deleted when the message's ack or nack arrives and expires after
+        `max_ack_wait` seconds, when the window stops waiting for them.
+        """
+        return ':'.join([self.worker_name, 'message_window', message_id])
+
     @inlineCallbacks
     def send_message_via_window(self, conv, window_id, batch_id, to_addr,
                                 msg_options, content):
@@ -99,6 +115,23 @@ class BulkMessageApplication(GoApplicationWorker):
 
     @inlineCallbacks
     def handle_event(self, event):
+        message_id = event['user_message_id']
+        message_window_key = self.message_window_key(message_id)
+        window_id = yield self.redis.get(message_window_key)
+        if window_id is None:
+            # Messages sent before the window mapping was recorded need to
+            # be loaded to find their window.
+            window_id = yield self.find_window_id_for_event(event)
+            if window_id is None:
+                return
+
+        flight_key = yield self.window_manager.get_internal_id(
+            window_id, message_id)
+        yield self.window_manager.remove_key(window_id, flight_key)
+        yield self.redis.delete(message_window_key)
+
+    @inlineCallbacks
+    def find_window_id_for_event(self, event):
         message = yield self.find_message_for_event(event)
         if message is None:
             log.error('Unable to find message for %s, user_message_id: %s' % (
@@ -108,10 +141,7 @@ class BulkMessageApplication(GoApplicationWorker):
         msg_mdh = self.get_metadata_helper(message)
         conv = yield msg_mdh.get_conversation()
         if conv:
-            window_id = self.get_window_id(conv.key, conv.batch.key)
-            flight_key = yield self.window_manager.get_internal_id(window_id,
-                                message['message_id'])
-            yield self.window_manager.remove_key(window_id, flight_key)
+            returnValue(self.get_window_id(conv.key, conv.batch.key))
 
     @inlineCallbacks
     def process_command_initial_action_hack(self, user_account_key,
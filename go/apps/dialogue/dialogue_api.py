@@ -9,6 +9,6 @@ class DialogueActionDispatcher(ConversationActionDispatcher):
 
     def action_save_poll(self, user_api, conv, poll):
         conv.config["poll"] = poll
-        d = conv.save()
+        d = user_api.conversation_store.save_conversation(conv)
         d.addCallback(lambda r: {"saved": True})
         return d
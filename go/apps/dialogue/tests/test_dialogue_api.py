@@ -37,3 +37,19 @@ class TestDialogueActionDispatcher(VumiTestCase):
         self.assertEqual(result, {"saved": True})
         conv = yield self.user_helper.get_conversation(conv.key)
         self.assertEqual(conv.config, {"poll": {"foo": "bar"}})
+
+    @inlineCallbacks
+    def test_save_poll_saves_through_conversation_store(self):
+        conv = yield self.create_dialogue(poll={})
+        conv_store = self.user_helper.user_api.conversation_store
+        saved = []
+        save_conversation = conv_store.save_conversation
+
+        def record_save(conversation):
+            saved.append(conversation.key)
+            return save_conversation(conversation)
+
+        self.patch(conv_store, 'save_conversation', record_save)
+        yield self.dispatcher.action_save_poll(
+            self.user_helper.user_api, conv, poll={"foo": "bar"})
+        self.assertEqual(saved, [conv.key])
@@ -8,14 +8,16 @@ from twisted.web.server import NOT_DONE_YET
 
 from vumi.config import ConfigContext
 from vumi.message import TransportUserMessage, TransportEvent
-from vumi.tests.helpers import VumiTestCase
+from vumi.tests.helpers import (
+    VumiTestCase, MessageHelper, PersistenceHelper)
 from vumi.tests.utils import MockHttpServer, LogCatcher
 from vumi.transports.vumi_bridge.client import StreamingClient
 from vumi.utils import http_request_full
 
 from go.apps.http_api.resource import (
     StreamResourceMixin, StreamingConversationResource)
-from go.apps.http_api.vumi_app import StreamingHTTPWorker
+from go.apps.http_api.vumi_app import (
+    StreamingHTTPWorker, StreamingClientManager)
 from go.apps.tests.helpers import AppWorkerHelper
 
 
@@ -680,3 +682,221 @@ class TestStreamingHTTPWorker(VumiTestCase):
         self.assertEqual(sent_msg['to_addr'], msg['from_addr'])
         self.assertEqual(sent_msg['content'], 'foo')
         self.assertEqual(sent_msg['in_reply_to'], msg['message_id'])
+
+
+class TestStreamingClientManager(VumiTestCase):
+
+    KEY = 'sphex.stream.message.conv-key'
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.msg_helper = self.add_helper(MessageHelper())
+        self.redis = yield self.persistence_helper.get_redis_manager()
+
+    def mkmanager(self, **kw):
+        manager = StreamingClientManager(self.redis, **kw)
+        self.add_cleanup(manager.stop_polling)
+        return manager
+
+    @inlineCallbacks
+    def mkclient(self, manager):
+        received = []
+        yield manager.start(self.KEY, TransportUserMessage, received.append)
+        returnValue(received)
+
+    @inlineCallbacks
+    def flush_backlog(self, manager):
+        received = []
+        yield manager.flush_backlog(
+            self.KEY, TransportUserMessage, received.append)
+        returnValue(received)
+
+    def sequenced(self, manager, msgs, start=1):
+        return [manager.with_seq(msg, seq)
+                for seq, msg in enumerate(msgs, start)]
+
+    def get_seqs(self, msgs):
+        return [msg['helper_metadata']['http_api']['stream_seq']
+                for msg in msgs]
+
+    @inlineCallbacks
+    def test_publish_to_local_client(self):
+        manager = self.mkmanager()
+        received = yield self.mkclient(manager)
+        msg = self.msg_helper.make_inbound('in 1')
+        yield manager.publish(self.KEY, msg)
+        self.assertEqual(received, self.sequenced(manager, [msg]))
+        self.assertEqual((yield manager.get_stats(self.KEY)), {
+            'seq': 1,
+            'delivered': 1,
+            'dropped': 0,
+        })
+
+    @inlineCallbacks
+    def test_publish_to_other_worker(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        received = yield self.mkclient(manager1)
+        msg1 = self.msg_helper.make_inbound('in 1')
+        msg2 = self.msg_helper.make_inbound('in 2')
+        yield manager2.publish(self.KEY, msg1)
+        yield manager2.publish(self.KEY, msg2)
+        self.assertEqual(received, [])
+        self.assertEqual((yield self.flush_backlog(manager2)), [])
+
+        yield manager1.poll_inbox()
+        self.assertEqual(received, self.sequenced(manager1, [msg1, msg2]))
+        self.assertEqual((yield manager2.get_stats(self.KEY)), {
+            'seq': 2,
+            'delivered': 2,
+            'dropped': 0,
+        })
+
+    @inlineCallbacks
+    def test_publish_to_other_worker_after_disconnect(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        received = []
+        yield manager1.start(self.KEY, TransportUserMessage, received.append)
+        msg = self.msg_helper.make_inbound('in 1')
+        yield manager2.publish(self.KEY, msg)
+        yield manager1.stop(self.KEY, received.append)
+        yield manager1.poll_inbox()
+        self.assertEqual(received, [])
+        self.assertEqual(
+            (yield self.flush_backlog(manager2)),
+            self.sequenced(manager2, [msg]))
+
+    @inlineCallbacks
+    def test_publish_skips_dead_workers(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        received = yield self.mkclient(manager1)
+        # The worker stops polling its inbox and its heartbeat expires.
+        yield self.redis.delete(manager1.alive_key(manager1.worker_id))
+        msg = self.msg_helper.make_inbound('in 1')
+        yield manager2.publish(self.KEY, msg)
+        self.assertEqual(
+            (yield self.redis.smembers(manager2.workers_key(self.KEY))),
+            set())
+        self.assertEqual(received, [])
+        self.assertEqual(
+            (yield self.flush_backlog(manager2)),
+            self.sequenced(manager2, [msg]))
+
+    @inlineCallbacks
+    def test_dead_worker_inbox_moved_to_backlog(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        yield self.mkclient(manager1)
+        msg1 = self.msg_helper.make_inbound('in 1')
+        msg2 = self.msg_helper.make_inbound('in 2')
+        yield manager2.publish(self.KEY, msg1)
+        # The worker crashes without polling its inbox and its heartbeat
+        # expires.
+        yield self.redis.delete(manager1.alive_key(manager1.worker_id))
+        yield manager2.publish(self.KEY, msg2)
+        self.assertEqual(
+            (yield self.redis.llen(manager1.inbox_key(manager1.worker_id))),
+            0)
+        self.assertEqual(
+            (yield self.flush_backlog(manager2)),
+            self.sequenced(manager2, [msg1, msg2]))
+
+    @inlineCallbacks
+    def test_flush_backlog_recovers_dead_worker_inbox(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        yield self.mkclient(manager1)
+        msg = self.msg_helper.make_inbound('in 1')
+        yield manager2.publish(self.KEY, msg)
+        yield self.redis.delete(manager1.alive_key(manager1.worker_id))
+        self.assertEqual(
+            (yield self.flush_backlog(manager2)),
+            self.sequenced(manager2, [msg]))
+
+    @inlineCallbacks
+    def test_stream_seq_shared_between_workers(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        received1 = yield self.mkclient(manager1)
+        received2 = yield self.mkclient(manager2)
+        msgs = [self.msg_helper.make_inbound('in %s' % i) for i in range(4)]
+        yield manager1.publish(self.KEY, msgs[0])
+        yield manager2.publish(self.KEY, msgs[1])
+        yield manager1.publish(self.KEY, msgs[2])
+        yield manager2.publish(self.KEY, msgs[3])
+        self.assertEqual(self.get_seqs(received1), [1, 3])
+        self.assertEqual(self.get_seqs(received2), [2, 4])
+
+        # Messages published while the stream has no clients keep their
+        # sequence numbers in the backlog, so a client can see which
+        # messages were dropped from it.
+        yield manager1.stop(self.KEY, received1.append)
+        yield manager2.stop(self.KEY, received2.append)
+        manager3 = self.mkmanager(backlog_size=2)
+        for i in range(3):
+            yield manager3.publish(
+                self.KEY, self.msg_helper.make_inbound('later %s' % i))
+        self.assertEqual(
+            self.get_seqs((yield self.flush_backlog(manager1))), [6, 7])
+        self.assertEqual((yield manager2.get_stats(self.KEY)), {
+            'seq': 7,
+            'delivered': 6,
+            'dropped': 1,
+        })
+
+    @inlineCallbacks
+    def test_publish_without_clients(self):
+        manager = self.mkmanager()
+        msgs = [self.msg_helper.make_inbound('in %s' % i) for i in range(3)]
+        for msg in msgs:
+            yield manager.publish(self.KEY, msg)
+        received = yield self.mkclient(manager)
+        yield manager.flush_backlog(
+            self.KEY, TransportUserMessage, received.append)
+        self.assertEqual(received, self.sequenced(manager, msgs))
+
+    @inlineCallbacks
+    def test_backlog_size(self):
+        manager = self.mkmanager(backlog_size=2)
+        msgs = [self.msg_helper.make_inbound('in %s' % i) for i in range(5)]
+        for msg in msgs:
+            yield manager.publish(self.KEY, msg)
+        self.assertEqual(
+            (yield self.flush_backlog(manager)),
+            self.sequenced(manager, msgs[3:], start=4))
+        self.assertEqual((yield manager.get_stats(self.KEY)), {
+            'seq': 5,
+            'delivered': 2,
+            'dropped': 3,
+        })
+
+    @inlineCallbacks
+    def test_shutdown(self):
+        manager1 = self.mkmanager()
+        manager2 = self.mkmanager()
+        received = yield self.mkclient(manager1)
+        msg = self.msg_helper.make_inbound('in 1')
+        yield manager2.publish(self.KEY, msg)
+        yield manager1.shutdown()
+        self.assertEqual(received, [])
+        self.assertFalse(
+            (yield self.redis.exists(manager1.alive_key(manager1.worker_id))))
+        self.assertEqual(
+            (yield self.redis.smembers(manager1.workers_key(self.KEY))),
+            set())
+        self.assertEqual(
+            (yield self.redis.llen(manager1.inbox_key(manager1.worker_id))),
+            0)
+        self.assertEqual(
+            (yield self.flush_backlog(manager2)),
+            self.sequenced(manager2, [msg]))
+
+    @inlineCallbacks
+    def test_flush_unpacked_backlog(self):
+        manager = self.mkmanager()
+        msg = self.msg_helper.make_inbound('in 1')
+        yield self.redis.lpush(manager.backlog_key(self.KEY), msg.to_json())
+        self.assertEqual((yield self.flush_backlog(manager)), [msg])
@@ -1,11 +1,19 @@
 # -*- test-case-name: go.apps.http_api.tests.test_vumi_app -*-
 from collections import defaultdict
+from copy import deepcopy
+import json
 import random
+from uuid import uuid4
 
-from twisted.internet.defer import inlineCallbacks, maybeDeferred
+from twisted.internet.defer import inlineCallbacks, maybeDeferred, returnValue
+from twisted.internet.task import LoopingCall
+
+from vumi.config import ConfigFloat, ConfigInt
+from vumi import log
 
 from go.apps.http_api_nostream.auth import AuthorizedResource
-from go.apps.http_api_nostream.vumi_app import NoStreamingHTTPWorker
+from go.apps.http_api_nostream.vumi_app import (
+    NoStreamingHTTPWorker, HTTPWorkerConfig)
 from go.apps.http_api.resource import (
     MessageStream, EventStream, StreamingConversationResource)
 
@@ -14,13 +22,42 @@ from go.apps.http_api.resource import (
 
 
 class StreamingClientManager(object):
+    """
+    Delivers messages to the streaming clients connected to any of the
+    HTTP API workers sharing a Redis server.
+
+    Messages for a stream with clients connected to this worker are
+    delivered directly. Otherwise they are pushed onto the Redis inbox of a
+    worker that has clients connected to the stream, which that worker
+    polls every `poll_interval` seconds. Messages for streams without any
+    connected clients are kept in a backlog of up to `backlog_size`
+    messages per stream, with older messages being dropped.
+
+    Each message published to a stream is given the next of the stream's
+    sequence numbers, which is sent to clients as the `stream_seq` field of
+    the message's `http_api` helper metadata so that they can detect gaps.
+
+    A worker that stops polling its inbox is forgotten by the next worker
+    to find it in a stream's list of workers, and the messages left in its
+    inbox are moved into the backlogs of their streams.
+    """
 
     MAX_BACKLOG_SIZE = 100
     CLIENT_PREFIX = 'clients'
+    # How long a worker is considered alive for without polling its inbox
+    WORKER_TTL = 30
 
-    def __init__(self, redis):
+    def __init__(self, redis, backlog_size=None, poll_interval=0.5,
+                 worker_id=None, clock=None):
         self.redis = redis
         self.clients = defaultdict(list)
+        self.message_classes = {}
+        self.backlog_size = backlog_size or self.MAX_BACKLOG_SIZE
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or uuid4().get_hex()
+        self.poller = LoopingCall(self.poll)
+        if clock is not None:
+            self.poller.clock = clock
 
     def client_key(self, *args):
         return u':'.join([self.CLIENT_PREFIX] + map(unicode, args))
@@ -28,46 +65,258 @@ class StreamingClientManager(object):
     def backlog_key(self, key):
         return self.client_key('backlog', key)
 
+    def workers_key(self, key):
+        return self.client_key('workers', key)
+
+    def inbox_key(self, worker_id):
+        return self.client_key('inbox', worker_id)
+
+    def alive_key(self, worker_id):
+        return self.client_key('alive', worker_id)
+
+    def seq_key(self, key):
+        return self.client_key('seq', key)
+
+    def stats_key(self, key):
+        return self.client_key('stats', key)
+
+    def start_polling(self):
+        return self.poller.start(self.poll_interval, now=True)
+
+    def stop_polling(self):
+        if self.poller.running:
+            self.poller.stop()
+
+    def poll(self):
+        d = self.poll_inbox()
+        d.addErrback(log.err, "Error polling streaming client inbox.")
+        return d
+
     @inlineCallbacks
     def flush_backlog(self, key, message_class, callback):
+        # Messages in the inboxes of dead workers are only recovered when
+        # they are found, so look for them before flushing.
+        yield self.get_live_workers(key)
         backlog_key = self.backlog_key(key)
         while True:
             obj = yield self.redis.rpop(backlog_key)
             if obj is None:
                 break
-            yield maybeDeferred(callback, message_class.from_json(obj))
+            msg_json, _key = self.unpack(obj)
+            yield self.deliver(
+                key, message_class.from_json(msg_json), callback)
 
+    @inlineCallbacks
     def start(self, key, message_class, callback):
         self.clients[key].append(callback)
+        self.message_classes[key] = message_class
+        yield self.heartbeat()
+        yield self.redis.sadd(self.workers_key(key), self.worker_id)
 
+    @inlineCallbacks
     def stop(self, key, callback):
         self.clients[key].remove(callback)
+        if not self.clients[key]:
+            yield self.redis.srem(self.workers_key(key), self.worker_id)
 
+    @inlineCallbacks
     def publish(self, key, msg):
+        seq = yield self.redis.incr(self.seq_key(key))
+        msg = self.with_seq(msg, seq)
         callbacks = self.clients[key]
         if callbacks:
-            callback = random.choice(callbacks)
-            return maybeDeferred(callback, msg)
+            yield self.deliver(key, msg, random.choice(callbacks))
+            return
+
+        worker_id = yield self.choose_worker(key)
+        if worker_id is not None:
+            yield self.redis.lpush(
+                self.inbox_key(worker_id), self.pack(msg, key))
         else:
-            return self.queue_in_backlog(key, msg)
+            yield self.queue_in_backlog(key, msg)
+
+    def with_seq(self, msg, seq):
+        """
+        Return a copy of `msg` with the stream sequence number `seq` in its
+        helper metadata.
+        """
+        msg = type(msg)(_process_fields=False, **deepcopy(msg.payload))
+        helper_metadata = msg.payload.setdefault('helper_metadata', {})
+        helper_metadata.setdefault('http_api', {})['stream_seq'] = seq
+        return msg
+
+    @inlineCallbacks
+    def choose_worker(self, key):
+        """
+        Return the id of a live worker with clients connected to the stream
+        `key`, or `None` if there isn't one.
+        """
+        worker_ids = yield self.get_live_workers(key)
+        returnValue(random.choice(worker_ids) if worker_ids else None)
+
+    @inlineCallbacks
+    def get_live_workers(self, key):
+        """
+        Return the ids of the live workers with clients connected to the
+        stream `key`. Workers that have stopped polling their inboxes are
+        forgotten.
+        """
+        worker_ids = yield self.redis.smembers(self.workers_key(key))
+        live_worker_ids = []
+        for worker_id in worker_ids:
+            if (yield self.redis.exists(self.alive_key(worker_id))):
+                live_worker_ids.append(worker_id)
+            else:
+                yield self.forget_worker(key, worker_id)
+        returnValue(live_worker_ids)
+
+    @inlineCallbacks
+    def forget_worker(self, key, worker_id):
+        """
+        Remove the dead worker `worker_id` from the stream `key`'s workers
+        and move the messages left in its inbox into their streams'
+        backlogs.
+        """
+        yield self.redis.srem(self.workers_key(key), worker_id)
+        yield self.backlog_inbox(worker_id)
+
+    def deliver(self, key, msg, callback):
+        d = maybeDeferred(callback, msg)
+        d.addCallback(lambda _: self.redis.hincrby(
+            self.stats_key(key), 'delivered', 1))
+        return d
+
+    def heartbeat(self):
+        return self.redis.setex(
+            self.alive_key(self.worker_id), self.WORKER_TTL, '1')
+
+    @inlineCallbacks
+    def poll_inbox(self):
+        """
+        Deliver messages that other workers have published to streams with
+        clients connected to this worker.
+        """
+        yield self.heartbeat()
+        inbox_key = self.inbox_key(self.worker_id)
+        while True:
+            obj = yield self.redis.rpop(inbox_key)
+            if obj is None:
+                break
+            msg_json, key = self.unpack(obj)
+            callbacks = self.clients[key]
+            if not callbacks:
+                # The clients disconnected after the message was published.
+                yield self.queue_in_backlog(
+                    key, self.message_classes[key].from_json(msg_json))
+                continue
+            yield self.deliver(
+                key, self.message_classes[key].from_json(msg_json),
+                random.choice(callbacks))
 
     @inlineCallbacks
+    def shutdown(self):
+        """
+        Stop polling, deregister this worker from the streams it has clients
+        connected to and move any messages left in its inbox into the
+        backlogs of their streams.
+        """
+        self.stop_polling()
+        yield self.redis.delete(self.alive_key(self.worker_id))
+        for key in self.message_classes:
+            yield self.redis.srem(self.workers_key(key), self.worker_id)
+        yield self.backlog_inbox(self.worker_id)
+
+    @inlineCallbacks
+    def backlog_inbox(self, worker_id):
+        """
+        Move the messages in `worker_id`'s inbox into the backlogs of their
+        streams.
+        """
+        inbox_key = self.inbox_key(worker_id)
+        while True:
+            obj = yield self.redis.rpop(inbox_key)
+            if obj is None:
+                break
+            msg_json, key = self.unpack(obj)
+            yield self.push_to_backlog(key, json.dumps({'msg': msg_json}))
+
+    def pack(self, msg, key=None):
+        data = {'msg': msg.to_json()}
+        if key is not None:
+            data['key'] = key
+        return json.dumps(data)
+
+    def unpack(self, obj):
+        """
+        Return the `(msg_json, key)` packed into `obj`.
+        """
+        data = json.loads(obj)
+        if 'msg' not in data:
+            # Backlogged before messages were packed.
+            return obj, None
+        return data['msg'], data.get('key')
+
     def queue_in_backlog(self, key, msg):
+        return self.push_to_backlog(key, self.pack(msg))
+
+    @inlineCallbacks
+    def push_to_backlog(self, key, obj):
         backlog_key = self.backlog_key(key)
-        yield self.redis.lpush(backlog_key, msg.to_json())
-        yield self.redis.ltrim(backlog_key, 0, self.MAX_BACKLOG_SIZE - 1)
+        yield self.redis.lpush(backlog_key, obj)
+        size = yield self.redis.llen(backlog_key)
+        yield self.redis.ltrim(backlog_key, 0, self.backlog_size - 1)
+        if size > self.backlog_size:
+            yield self.redis.hincrby(
+                self.stats_key(key), 'dropped', size - self.backlog_size)
+
+    @inlineCallbacks
+    def get_stats(self, key):
+        """
+        Return the stream `key`'s last sequence number and the number of
+        messages delivered to its clients and dropped from its backlog.
+        """
+        stats = yield self.redis.hgetall(self.stats_key(key))
+        seq = yield self.redis.get(self.seq_key(key))
+        returnValue({
+            'seq': int(seq or 0),
+            'delivered': int(stats.get('delivered', 0)),
+            'dropped': int(stats.get('dropped', 0)),
+        })
+
+
+class StreamingHTTPWorkerConfig(HTTPWorkerConfig):
+    """Configuration options for StreamingHTTPWorker."""
+
+    backlog_size = ConfigInt(
+        "Maximum number of messages kept for each stream while it has no "
+        "connected clients.",
+        default=StreamingClientManager.MAX_BACKLOG_SIZE, static=True)
+    fanout_poll_interval = ConfigFloat(
+        "How often, in seconds, to check for messages published by other "
+        "workers to streams connected to this worker.",
+        default=0.5, static=True)
 
 
 class StreamingHTTPWorker(NoStreamingHTTPWorker):
 
     worker_name = 'http_api_worker'
+    CONFIG_CLASS = StreamingHTTPWorkerConfig
 
     @inlineCallbacks
     def setup_application(self):
         yield super(StreamingHTTPWorker, self).setup_application()
+        config = self.get_static_config()
 
         self.client_manager = StreamingClientManager(
-            self.redis.sub_manager('http_api:message_cache'))
+            self.redis.sub_manager('http_api:message_cache'),
+            backlog_size=config.backlog_size,
+            poll_interval=config.fanout_poll_interval)
+        self.client_manager.start_polling()
+
+    @inlineCallbacks
+    def teardown_application(self):
+        yield self.client_manager.shutdown()
+        yield super(StreamingHTTPWorker, self).teardown_application()
 
     def get_conversation_resource(self):
         return AuthorizedResource(self, StreamingConversationResource)
@@ -83,12 +332,13 @@ class StreamingHTTPWorker(NoStreamingHTTPWorker):
         }
         return self.client_manager.publish(rk, message)
 
+    @inlineCallbacks
     def register_client(self, key, message_class, callback):
-        self.client_manager.start(key, message_class, callback)
-        return self.client_manager.flush_backlog(key, message_class, callback)
+        yield self.client_manager.start(key, message_class, callback)
+        yield self.client_manager.flush_backlog(key, message_class, callback)
 
     def unregister_client(self, conversation_key, callback):
-        self.client_manager.stop(conversation_key, callback)
+        return self.client_manager.stop(conversation_key, callback)
 
     def send_message_to_client(self, message, conversation, push_url):
         if push_url:
@@ -225,12 +225,13 @@ class ContactsResource(SandboxResource):
 
             store = self._contact_store_for_api(api)
             contact = yield store.get_contact_by_key(command['key'])
+            old_data = contact.get_data()
 
             dynamic_field = getattr(contact, dynamic_field_name)
             for k, v in fields.iteritems():
                 dynamic_field[k] = v
 
-            yield contact.save()
+            yield store.save_contact(contact, old_data)
         except (SandboxError, ContactError) as e:
             returnValue(self.reply(command, success=False, reason=unicode(e)))
 
@@ -393,7 +394,7 @@ class ContactsResource(SandboxResource):
             contact_store = self._contact_store_for_api(api)
 
             # raise an exception if the contact does not exist
-            yield contact_store.get_contact_by_key(key)
+            old_contact = yield contact_store.get_contact_by_key(key)
 
             contact = contact_store.contacts(
                 key,
@@ -405,7 +406,7 @@ class ContactsResource(SandboxResource):
             for group in groups:
                 contact.add_to_group(group)
 
-            yield contact.save()
+            yield contact_store.save_contact(contact, old_contact.get_data())
         except (SandboxError, ContactError) as e:
             returnValue(self.reply(command, success=False, reason=unicode(e)))
 
@@ -473,10 +474,15 @@ class ContactsResource(SandboxResource):
                             the maximum number of keys to return in the result.
                             By default keys for all matching contacts are
                             returned.
+            - ``cursor``: If present, the ``next_cursor`` returned by a
+                          previous search with the same query, used to fetch
+                          the next page of keys.
 
         Success reply fields:
             - ``success``: set to ``true``
-            - ``keys``: A list of keys for matching contacts.
+            - ``keys``: A list of keys for matching contacts, in key order.
+            - ``next_cursor``: A cursor for fetching the next page of keys
+                               or ``null`` if there are no more matches.
 
         Note: If no matches are found ``keys`` will be an empty list.
 
@@ -496,6 +502,18 @@ class ContactsResource(SandboxResource):
                 },
                 function(reply) { api.log_info(reply.keys); });
 
+        Fetching the next page of up to 100 keys:
+
+        .. code-block:: javascript
+
+            api.request(
+                'contacts.search', {
+                     query: 'name:"My Name"',
+                     max_keys: 100,
+                     cursor: reply.next_cursor,
+                },
+                function(reply) { api.log_info(reply.keys); });
+
         """
         try:
             if 'query' not in command:
@@ -513,12 +531,20 @@ class ContactsResource(SandboxResource):
                         command,
                         success=False,
                         reason=u"Value for parameter 'max_keys' is invalid"))
+            cursor = None
+            if command.get('cursor') is not None:
+                value = command['cursor']
+                if isinstance(value, basestring):
+                    cursor = value
+                else:
+                    returnValue(self.reply(
+                        command,
+                        success=False,
+                        reason=u"Value for parameter 'cursor' is invalid"))
 
             contact_store = self._contact_store_for_api(api)
-            keys = yield contact_store.contacts.raw_search(
-                command['query']).get_keys()
-            if max_keys is not None:
-                keys = keys[:max_keys]
+            keys, next_cursor = yield contact_store.search_contacts_page(
+                command['query'], cursor, max_keys)
 
         except (SandboxError,) as e:
             returnValue(self.reply(command, success=False, reason=unicode(e)))
@@ -532,7 +558,8 @@ class ContactsResource(SandboxResource):
         returnValue(self.reply(
             command,
             success=True,
-            keys=keys))
+            keys=keys,
+            next_cursor=next_cursor))
 
 
 class GroupsResource(SandboxResource):
@@ -669,8 +696,7 @@ class GroupsResource(SandboxResource):
         """
         try:
             contact_store = self._contact_store_for_api(api)
-            keys = yield contact_store.groups.search(
-                name=command['name']).get_keys()
+            groups = yield contact_store.get_groups_by_name(command['name'])
         except (SandboxError,) as e:
             returnValue(self.reply(command, success=False, reason=unicode(e)))
         except (Exception,) as e:
@@ -680,16 +706,15 @@ class GroupsResource(SandboxResource):
                 raise
             returnValue(self.reply(command, success=False, reason=unicode(e)))
 
-        if not keys:
+        if not groups:
             returnValue(self.reply(
                 command, success=False, reason='Group not found'))
 
-        if len(keys) != 1:
+        if len(groups) != 1:
             returnValue(self.reply(
                 command, success=False, reason='Multiple groups found'))
 
-        [key] = keys
-        group = yield contact_store.get_group(key)
+        [group] = groups
         returnValue(self.reply(
             command, success=True, group=group.get_data()))
 
@@ -722,8 +747,7 @@ class GroupsResource(SandboxResource):
         """
         try:
             contact_store = self._contact_store_for_api(api)
-            keys = yield contact_store.groups.search(
-                name=command['name']).get_keys()
+            groups = yield contact_store.get_groups_by_name(command['name'])
         except (SandboxError,) as e:
             returnValue(self.reply(command, success=False, reason=unicode(e)))
         except (Exception,) as e:
@@ -733,17 +757,16 @@ class GroupsResource(SandboxResource):
                 raise
             returnValue(self.reply(command, success=False, reason=unicode(e)))
 
-        if not keys:
+        if not groups:
             group = yield contact_store.new_group(command['name'])
             returnValue(self.reply(
                 command, success=True, created=True, group=group.get_data()))
 
-        if len(keys) != 1:
+        if len(groups) != 1:
             returnValue(self.reply(
                 command, success=False, reason='Multiple groups found'))
 
-        [key] = keys
-        group = yield contact_store.get_group(key)
+        [group] = groups
         returnValue(self.reply(
             command, success=True, created=False, group=group.get_data()))
 
@@ -792,7 +815,7 @@ class GroupsResource(SandboxResource):
 
         group.name = command['name']
         group.query = command.get('query', None)
-        yield group.save()
+        yield contact_store.save_group(group)
 
         returnValue(self.reply(
             command,
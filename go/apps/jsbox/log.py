@@ -4,7 +4,9 @@
 import logging
 import datetime
 
-from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet import reactor
+from twisted.internet.defer import (
+    inlineCallbacks, returnValue, succeed, gatherResults)
 
 from vumi import log
 from vumi.application.sandbox import LoggingResource
@@ -35,13 +37,31 @@ class LogManager(object):
     def _conv_key(self, campaign_key, conversation_key):
         return ":".join([campaign_key, conversation_key])
 
-    @Manager.calls_manager
-    def add_log(self, campaign_key, conversation_key, msg, level):
+    def format_log(self, msg, level):
         ts = datetime.datetime.utcnow().isoformat()
-        full_msg = "[%s, %s] %s" % (ts, logging.getLevelName(level), msg)
+        return "[%s, %s] %s" % (ts, logging.getLevelName(level), msg)
+
+    def add_log(self, campaign_key, conversation_key, msg, level):
+        return self.add_formatted_logs(
+            campaign_key, conversation_key, [self.format_log(msg, level)])
+
+    @Manager.calls_manager
+    def add_formatted_logs(self, campaign_key, conversation_key, full_msgs):
+        """
+        Add log lines formatted by :meth:`format_log`, oldest first, and
+        trim the conversation's logs once for all of them.
+        """
         conv_key = self._conv_key(campaign_key, conversation_key)
-        yield self.redis.lpush(conv_key, full_msg)
-        yield self.redis.ltrim(conv_key, 0, self.max_logs_per_conversation - 1)
+        # Lines that would be trimmed straight away aren't written.
+        full_msgs = full_msgs[-self.max_logs_per_conversation:]
+        # Make all the calls before waiting for any of them so that they're
+        # pipelined when using an asynchronous Redis manager.
+        calls = [self.redis.lpush(conv_key, full_msg)
+                 for full_msg in full_msgs]
+        calls.append(
+            self.redis.ltrim(conv_key, 0, self.max_logs_per_conversation - 1))
+        for call in calls:
+            yield call
 
     @Manager.calls_manager
     def get_logs(self, campaign_key, conversation_key):
@@ -50,12 +70,81 @@ class LogManager(object):
         returnValue(msgs)
 
 
+class BufferedLogWriter(object):
+    """
+    Buffers log lines for a :class:`LogManager` and writes them in batches.
+
+    Lines are grouped by campaign and conversation and written when
+    `flush_size` lines are buffered or `flush_interval` seconds after the
+    first line was buffered, whichever comes first. Each conversation's
+    lines are then written with one trim of its log.
+    """
+
+    clock = reactor
+
+    def __init__(self, log_manager, flush_size=100, flush_interval=1.0):
+        self.log_manager = log_manager
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer = {}
+        self._buffered = 0
+        self._flush_call = None
+
+    def add_log(self, campaign_key, conversation_key, msg, level):
+        """
+        Buffer a log line, flushing the buffer if it's full. Returns a
+        deferred that fires once the line is buffered or, if the buffer was
+        flushed, written.
+        """
+        full_msg = self.log_manager.format_log(msg, level)
+        self._buffer.setdefault(
+            (campaign_key, conversation_key), []).append(full_msg)
+        self._buffered += 1
+        if self._buffered >= self.flush_size:
+            return self.flush()
+        if self._flush_call is None:
+            self._flush_call = self.clock.callLater(
+                self.flush_interval, self.flush)
+        return succeed(None)
+
+    def flush(self):
+        """
+        Write all buffered lines. Returns a deferred that fires once they've
+        been written.
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        buffered, self._buffer = self._buffer, {}
+        self._buffered = 0
+        d = gatherResults([
+            self.log_manager.add_formatted_logs(
+                campaign_key, conversation_key, full_msgs)
+            for (campaign_key, conversation_key), full_msgs
+            in buffered.iteritems()], consumeErrors=True)
+        d.addErrback(log.err, "Error writing jsbox logs.")
+        return d
+
+
 class GoLoggingResource(LoggingResource):
     """
     Resource that allows a sandbox to log messages.
 
     Messages are logged both via Twisted's logging framework and
-    to a per-conversation log store in Redis.
+    to a per-conversation log store in Redis. Writes to the log store
+    are buffered (see :class:`BufferedLogWriter`) and are flushed when the
+    resource is torn down.
+
+    Configuration options:
+
+    :param int max_logs_per_conversation:
+        The number of log lines kept for each conversation.
+    :param int log_flush_size:
+        The number of buffered log lines that triggers a write. Defaults
+        to 100.
+    :param float log_flush_interval:
+        The longest a log line is buffered for, in seconds. Defaults to 1.
     """
 
     @inlineCallbacks
@@ -67,9 +156,14 @@ class GoLoggingResource(LoggingResource):
         self._redis = yield TxRedisManager.from_config(redis_config)
         self.log_manager = LogManager(
             self._redis, max_logs_per_conversation=max_logs_per_conversation)
+        self.log_writer = BufferedLogWriter(
+            self.log_manager,
+            flush_size=self.config.get('log_flush_size', 100),
+            flush_interval=self.config.get('log_flush_interval', 1.0))
 
     @inlineCallbacks
     def teardown(self):
+        yield self.log_writer.flush()
         yield self._redis.close_manager()
         yield super(GoLoggingResource, self).teardown()
 
@@ -83,5 +177,5 @@ class GoLoggingResource(LoggingResource):
             campaign_key, conversation_key, msg)
         log.msg(internal_msg, logLevel=level)
 
-        yield self.log_manager.add_log(campaign_key, conversation_key,
-                                       msg, level)
+        yield self.log_writer.add_log(campaign_key, conversation_key,
+                                      msg, level)
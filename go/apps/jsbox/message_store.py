@@ -6,11 +6,14 @@ Resource for accessing information stored in Go's message store.
 Allows for querying any conversation in a Go Account holder's account.
 """
 
-from functools import wraps
+from functools import wraps, partial
 
-from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet import reactor
+from twisted.internet.defer import (
+    inlineCallbacks, returnValue, maybeDeferred, DeferredList)
 
 from vumi.application.sandbox import SandboxResource
+from vumi.blinkenlights.metrics import Metric, AVG
 
 
 def conversation_owner(func):
@@ -33,7 +36,131 @@ def conversation_owner(func):
     return wrapper
 
 
+class ConversationStatsCache(object):
+    """
+    Short-lived snapshots of the message store stats of conversations.
+
+    All of a conversation's stats are fetched from the message store cache
+    at once, with the Redis calls made concurrently, and are then served
+    from the snapshot for `ttl` seconds. Snapshots are kept per batch and
+    throughput sample time. If `ttl` is zero or less, only the requested
+    stat is fetched.
+
+    If a `hit_rate_metric` is given, a value of 1 for every hit and 0 for
+    every miss is set on it, so that its average is the hit rate.
+    """
+
+    clock = reactor
+
+    def __init__(self, ttl, hit_rate_metric=None):
+        self.ttl = ttl
+        self.hit_rate_metric = hit_rate_metric
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = {}
+
+    def _record_lookup(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.hit_rate_metric is not None:
+            self.hit_rate_metric.set(1 if hit else 0)
+
+    def _expire_snapshots(self, now):
+        for snapshot_key, (expires_at, _) in self._snapshots.items():
+            if expires_at <= now:
+                del self._snapshots[snapshot_key]
+
+    def stat_getters(self, conversation, sample_time):
+        """
+        Return a dict of functions returning each of the conversation's
+        stats, keyed by the name of the sandbox command that returns it.
+        """
+        return {
+            'progress_status': conversation.get_progress_status,
+            'count_replies': conversation.count_replies,
+            'count_sent_messages': conversation.count_sent_messages,
+            'count_inbound_uniques': conversation.count_inbound_uniques,
+            'count_outbound_uniques': conversation.count_outbound_uniques,
+            'inbound_throughput': partial(
+                conversation.get_inbound_throughput, sample_time),
+            'outbound_throughput': partial(
+                conversation.get_outbound_throughput, sample_time),
+        }
+
+    @inlineCallbacks
+    def fetch_stats(self, conversation, sample_time):
+        # Make all the calls before waiting for any of them so that they run
+        # concurrently.
+        names, getters = zip(
+            *self.stat_getters(conversation, sample_time).items())
+        # Errors are consumed so that a failed call doesn't leave the
+        # failures of the others unhandled.
+        results = yield DeferredList(
+            [maybeDeferred(getter) for getter in getters],
+            consumeErrors=True)
+        stats = {}
+        for name, (success, result) in zip(names, results):
+            if not success:
+                result.raiseException()
+            stats[name] = result
+        returnValue(stats)
+
+    @inlineCallbacks
+    def get_stat(self, conversation, name, sample_time=300):
+        """
+        Return the conversation's stat called `name`, which is the name of
+        the sandbox command that returns it.
+        """
+        if self.ttl <= 0:
+            stat = yield self.stat_getters(conversation, sample_time)[name]()
+            returnValue(stat)
+
+        now = self.clock.seconds()
+        snapshot_key = (conversation.batch.key, sample_time)
+        snapshot = self._snapshots.get(snapshot_key)
+        if snapshot is not None and snapshot[0] > now:
+            self._record_lookup(True)
+            returnValue(snapshot[1][name])
+
+        self._record_lookup(False)
+        stats = yield self.fetch_stats(conversation, sample_time)
+        self._expire_snapshots(now)
+        self._snapshots[snapshot_key] = (now + self.ttl, stats)
+        returnValue(stats[name])
+
+
 class MessageStoreResource(SandboxResource):
+    """
+    Sandbox resource for reading the stats of an account's conversations.
+
+    Resource configuration options:
+        - ``stats_cache_ttl``: How long, in seconds, a conversation's stats
+          are cached for. Defaults to 5 seconds. Set it to 0 to disable
+          caching.
+        - ``metrics_prefix``: If given, the stats cache hit rate is
+          published as ``<metrics_prefix>stats_cache.hit_rate``.
+    """
+
+    def setup(self):
+        super(MessageStoreResource, self).setup()
+        self.metrics = None
+        hit_rate_metric = None
+        metrics_prefix = self.config.get('metrics_prefix')
+        if metrics_prefix is not None:
+            self.metrics = self.app_worker.vumi_api.get_metric_manager(
+                metrics_prefix)
+            hit_rate_metric = self.metrics.register(
+                Metric('stats_cache.hit_rate', [AVG]))
+            self.metrics.start_polling()
+        self.stats_cache = ConversationStatsCache(
+            self.config.get('stats_cache_ttl', 5), hit_rate_metric)
+
+    def teardown(self):
+        if self.metrics is not None:
+            self.metrics.stop_polling()
+        return super(MessageStoreResource, self).teardown()
 
     def get_user_api(self, api):
         return self.app_worker.user_api_for_api(api)
@@ -78,7 +205,8 @@ class MessageStoreResource(SandboxResource):
             - ``success``: set to ``false``
             - ``reason``: Reason for the failure.
         """
-        status = yield conversation.get_progress_status()
+        status = yield self.stats_cache.get_stat(
+            conversation, 'progress_status')
         returnValue(self.reply(command, success=True,
                                progress_status=status))
 
@@ -105,7 +233,7 @@ class MessageStoreResource(SandboxResource):
             - ``reason``: Reason for the failure.
 
         """
-        count = yield conversation.count_replies()
+        count = yield self.stats_cache.get_stat(conversation, 'count_replies')
         returnValue(self.reply(command, success=True, count=count))
 
     @conversation_owner
@@ -131,7 +259,8 @@ class MessageStoreResource(SandboxResource):
             - ``reason``: Reason for the failure.
 
         """
-        count = yield conversation.count_sent_messages()
+        count = yield self.stats_cache.get_stat(
+            conversation, 'count_sent_messages')
         returnValue(self.reply(command, success=True, count=count))
 
     @conversation_owner
@@ -158,7 +287,8 @@ class MessageStoreResource(SandboxResource):
             - ``reason``: Reason for the failure.
 
         """
-        count = yield conversation.count_inbound_uniques()
+        count = yield self.stats_cache.get_stat(
+            conversation, 'count_inbound_uniques')
         returnValue(self.reply(command, success=True, count=count))
 
     @conversation_owner
@@ -185,7 +315,8 @@ class MessageStoreResource(SandboxResource):
             - ``reason``: Reason for the failure.
 
         """
-        count = yield conversation.count_outbound_uniques()
+        count = yield self.stats_cache.get_stat(
+            conversation, 'count_outbound_uniques')
         returnValue(self.reply(command, success=True, count=count))
 
     @conversation_owner
@@ -216,7 +347,8 @@ class MessageStoreResource(SandboxResource):
 
         """
         sample_time = int(command.get('sample_time', 300))
-        throughput = yield conversation.get_inbound_throughput(sample_time)
+        throughput = yield self.stats_cache.get_stat(
+            conversation, 'inbound_throughput', sample_time)
         returnValue(self.reply(command, success=True, throughput=throughput))
 
     @conversation_owner
@@ -247,5 +379,6 @@ class MessageStoreResource(SandboxResource):
 
         """
         sample_time = int(command.get('sample_time', 300))
-        throughput = yield conversation.get_outbound_throughput(sample_time)
+        throughput = yield self.stats_cache.get_stat(
+            conversation, 'outbound_throughput', sample_time)
         returnValue(self.reply(command, success=True, throughput=throughput))
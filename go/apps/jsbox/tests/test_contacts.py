@@ -2,12 +2,14 @@
 
 import json
 
-from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.defer import (
+    inlineCallbacks, returnValue, maybeDeferred)
 
 from vumi.application.tests.test_sandbox import (
     ResourceTestCaseBase, DummyAppWorker)
 
 from go.apps.jsbox.contacts import ContactsResource, GroupsResource
+from go.vumitools.contact import ContactStore
 from go.vumitools.tests.helpers import VumiApiHelper
 
 
@@ -548,6 +550,84 @@ class TestContactsResource(ResourceTestCaseBase):
             "Value for parameter 'max_keys' is invalid" in reply['reason']
         )
 
+    def record_map_reduce_results(self):
+        """
+        Record the number of results returned from each map-reduce run by
+        the contact store's Riak manager.
+        """
+        result_counts = []
+        manager_cls = type(self.contact_store.manager)
+        orig_run_map_reduce = manager_cls.run_map_reduce
+
+        def run_map_reduce(manager, *args, **kw):
+            d = maybeDeferred(orig_run_map_reduce, manager, *args, **kw)
+
+            def record(results):
+                result_counts.append(len(results))
+                return results
+            return d.addCallback(record)
+
+        self.patch(manager_cls, 'run_map_reduce', run_map_reduce)
+        return result_counts
+
+    @inlineCallbacks
+    def test_handle_search_max_keys_fetches_bounded_keys(self):
+        for i in range(0, 6):
+            yield self.new_contact(
+                surname=unicode('Jackal%s' % i), msisdn=u'+27831234567')
+
+        result_counts = self.record_map_reduce_results()
+        reply = yield self.dispatch_command(
+            'search', query=u'surname:Jack*', max_keys=2)
+        self.assertTrue(reply['success'])
+        self.assertEqual(len(reply['keys']), 2)
+        reply = yield self.dispatch_command(
+            'search', query=u'surname:Jack*', max_keys=2,
+            cursor=reply['next_cursor'])
+        self.assertTrue(reply['success'])
+        self.assertEqual(len(reply['keys']), 2)
+        # One extra key is fetched to tell whether there's another page,
+        # and keys before the cursor are dropped in Riak.
+        self.assertEqual(result_counts, [3, 3])
+
+    @inlineCallbacks
+    def test_handle_search_cursor(self):
+        keys = []
+        for i in range(0, 5):
+            contact = yield self.new_contact(
+                surname=unicode('Jackal%s' % i), msisdn=u'+27831234567')
+            keys.append(contact.key)
+
+        pages = []
+        cursor = None
+        while True:
+            reply = yield self.dispatch_command(
+                'search', query=u'surname:Jack*', max_keys=2, cursor=cursor)
+            self.assertTrue(reply['success'])
+            pages.append(reply['keys'])
+            cursor = reply['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), sorted(keys))
+
+    @inlineCallbacks
+    def test_handle_search_no_limit_has_no_next_cursor(self):
+        yield self.new_contact(surname=u'Jackal', msisdn=u'+27831234567')
+        reply = yield self.dispatch_command('search', query=u'surname:Jack*')
+        self.assertTrue(reply['success'])
+        self.assertEqual(len(reply['keys']), 1)
+        self.assertEqual(reply['next_cursor'], None)
+
+    @inlineCallbacks
+    def test_handle_search_bad_cursor(self):
+        reply = yield self.dispatch_command(
+            'search', query=u'surname:Jack*', cursor=42)
+        self.assertFalse(reply['success'])
+        self.assertTrue(
+            "Value for parameter 'cursor' is invalid" in reply['reason'])
+
     @inlineCallbacks
     def test_handle_get_by_key(self):
         contact = yield self.new_contact(
@@ -685,6 +765,57 @@ class TestGroupsResource(ResourceTestCaseBase):
         self.assertFalse(reply['success'])
         self.assertTrue('Multiple groups found' in reply['reason'])
 
+    def fail_group_searches(self):
+        def search(**kw):
+            self.fail("Unexpected group search: %r" % (kw,))
+        self.patch(self.contact_store.groups, 'search', search)
+
+    @inlineCallbacks
+    def test_handle_get_by_name_uses_index(self):
+        group = yield self.new_group(u'foo group')
+        yield self.new_group(u'foo group 2')
+        self.fail_group_searches()
+        reply = yield self.dispatch_command('get_by_name', name=u'foo group')
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['group']['key'], group.key)
+
+    @inlineCallbacks
+    def test_handle_get_by_name_renamed(self):
+        group = yield self.new_group(u'foo group')
+        yield self.dispatch_command('update', key=group.key, name=u'bar')
+        reply = yield self.dispatch_command('get_by_name', name=u'bar')
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['group']['key'], group.key)
+        reply = yield self.dispatch_command('get_by_name', name=u'foo group')
+        self.assertFalse(reply['success'])
+        self.assertEqual(reply['reason'], 'Group not found')
+
+    @inlineCallbacks
+    def test_handle_get_by_name_deleted(self):
+        group = yield self.new_group(u'foo group')
+        yield self.contact_store.delete_group(group)
+        reply = yield self.dispatch_command('get_by_name', name=u'foo group')
+        self.assertFalse(reply['success'])
+        self.assertEqual(reply['reason'], 'Group not found')
+
+    @inlineCallbacks
+    def test_handle_get_by_name_unindexed(self):
+        # Stores without Redis don't update the group name index.
+        unindexed_store = ContactStore(
+            self.contact_store.base_manager,
+            self.contact_store.user_account_key)
+        yield self.contact_store.build_group_index()
+        group = yield unindexed_store.new_group(u'foo group')
+        reply = yield self.dispatch_command('get_by_name', name=u'foo group')
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['group']['key'], group.key)
+
+        # The group is indexed now.
+        self.fail_group_searches()
+        reply = yield self.dispatch_command('get_by_name', name=u'foo group')
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['group']['key'], group.key)
+
     @inlineCallbacks
     def test_handle_get_or_create_by_name(self):
         group = yield self.new_group(u'foo group')
@@ -7,13 +7,15 @@ import re
 
 from mock import Mock
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import Clock
 
 from vumi.application.tests.test_sandbox import (
     ResourceTestCaseBase, DummyAppWorker)
 from vumi.tests.helpers import VumiTestCase, PersistenceHelper
 from vumi.tests.utils import LogCatcher
 
-from go.apps.jsbox.log import LogManager, GoLoggingResource
+from go.apps.jsbox.log import (
+    LogManager, BufferedLogWriter, GoLoggingResource)
 
 
 class LogCheckerMixin(object):
@@ -86,11 +88,103 @@ class TestTxLogManager(VumiTestCase, LogCheckerMixin):
         logs = yield lm.get_logs("campaign-1", "conv-1")
         self.assertEqual(logs, ['2', '1', '0'])
 
+    @inlineCallbacks
+    def test_add_formatted_logs(self):
+        lm = self.log_manager(max_logs=3)
+        yield lm.add_formatted_logs(
+            "campaign-1", "conv-1", ["%d" % i for i in range(2)])
+        yield lm.add_formatted_logs(
+            "campaign-1", "conv-1", ["%d" % i for i in range(2, 7)])
+        logs = yield self.redis.lrange("campaign-1:conv-1", 0, -1)
+        self.assertEqual(logs, ['6', '5', '4'])
+
 
 class TestLogManager(TestTxLogManager):
     sync_persistence = True
 
 
+class TestBufferedLogWriter(VumiTestCase, LogCheckerMixin):
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.parent_redis = yield self.persistence_helper.get_redis_manager()
+        self.redis = self.parent_redis.sub_manager(
+            LogManager.DEFAULT_SUB_STORE)
+        self.clock = Clock()
+
+    def log_writer(self, max_logs=None, flush_size=100, flush_interval=1.0):
+        self.log_manager = LogManager(self.parent_redis, max_logs)
+        writer = BufferedLogWriter(
+            self.log_manager, flush_size=flush_size,
+            flush_interval=flush_interval)
+        writer.clock = self.clock
+        return writer
+
+    def get_logs(self, conversation_key="conv-1"):
+        return self.redis.lrange("campaign-1:%s" % (conversation_key,), 0, -1)
+
+    @inlineCallbacks
+    def test_flush_on_interval(self):
+        writer = self.log_writer(flush_interval=2.0)
+        yield writer.add_log("campaign-1", "conv-1", "a", logging.INFO)
+        yield writer.add_log("campaign-1", "conv-1", "b", logging.WARNING)
+        self.clock.advance(1.0)
+        self.assertEqual((yield self.get_logs()), [])
+        self.clock.advance(1.0)
+        self.check_logs((yield self.get_logs()), [
+            ("INFO", "a"), ("WARNING", "b")])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    @inlineCallbacks
+    def test_flush_on_size(self):
+        writer = self.log_writer(flush_size=3)
+        for i in range(2):
+            yield writer.add_log("campaign-1", "conv-1", str(i), logging.INFO)
+        self.assertEqual((yield self.get_logs()), [])
+        yield writer.add_log("campaign-1", "conv-1", "2", logging.INFO)
+        self.check_logs((yield self.get_logs()), [
+            ("INFO", "%d" % i) for i in range(3)])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    @inlineCallbacks
+    def test_flush_groups_by_conversation(self):
+        writer = self.log_writer()
+        trims = []
+        ltrim = self.log_manager.redis.ltrim
+
+        def counting_ltrim(key, start, stop):
+            trims.append(key)
+            return ltrim(key, start, stop)
+
+        self.log_manager.redis.ltrim = counting_ltrim
+        for i in range(3):
+            yield writer.add_log("campaign-1", "conv-1", str(i), logging.INFO)
+            yield writer.add_log("campaign-1", "conv-2", str(i), logging.INFO)
+        yield writer.flush()
+        self.assertEqual(
+            sorted(trims), ["campaign-1:conv-1", "campaign-1:conv-2"])
+        for conversation_key in ["conv-1", "conv-2"]:
+            self.check_logs((yield self.get_logs(conversation_key)), [
+                ("INFO", "%d" % i) for i in range(3)])
+
+    @inlineCallbacks
+    def test_flush_trims(self):
+        writer = self.log_writer(max_logs=3)
+        yield writer.add_log("campaign-1", "conv-1", "0", logging.INFO)
+        yield writer.flush()
+        for i in range(1, 6):
+            yield writer.add_log("campaign-1", "conv-1", str(i), logging.INFO)
+        yield writer.flush()
+        self.check_logs((yield self.get_logs()), [
+            ("INFO", "%d" % i) for i in range(3, 6)])
+
+    @inlineCallbacks
+    def test_flush_empty(self):
+        writer = self.log_writer()
+        yield writer.flush()
+        self.assertEqual((yield self.get_logs()), [])
+
+
 class StubbedAppWorker(DummyAppWorker):
     def __init__(self):
         super(StubbedAppWorker, self).__init__()
@@ -146,6 +240,7 @@ class TestGoLoggingResource(ResourceTestCaseBase, LogCheckerMixin):
             '[Account: campaign-1, Conversation: conv-1] Info message',
         ])
         self.check_reply(reply)
+        yield self.resource.log_writer.flush()
         logs = yield self.redis.lrange("campaign-1:conv-1", 0, -1)
         self.check_logs(logs, [
             ("INFO", "Info message")
@@ -155,3 +250,14 @@ class TestGoLoggingResource(ResourceTestCaseBase, LogCheckerMixin):
     def test_handle_info_failure(self):
         yield self.assert_bad_command(
             'info', u'Value expected for msg')
+
+    @inlineCallbacks
+    def test_teardown_flushes_logs(self):
+        yield self.dispatch_command('info', msg=u'Info message')
+        logs = yield self.redis.lrange("campaign-1:conv-1", 0, -1)
+        self.assertEqual(logs, [])
+        yield self.resource.teardown()
+        logs = yield self.redis.lrange("campaign-1:conv-1", 0, -1)
+        self.check_logs(logs, [
+            ("INFO", "Info message")
+        ])
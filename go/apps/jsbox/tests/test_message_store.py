@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, fail
+from twisted.internet.task import Clock
 
 from vumi.application.tests.test_sandbox import (
     ResourceTestCaseBase, DummyAppWorker)
+from vumi.blinkenlights.metrics import MetricManager
 
 from go.apps.jsbox.message_store import MessageStoreResource
 from go.vumitools.tests.helpers import GoMessageHelper, VumiApiHelper
@@ -113,3 +115,85 @@ class TestMessageStoreResource(ResourceTestCaseBase):
                                             conversation_key='foo')
         self.assertFalse(reply['success'])
         self.assertEqual(reply['reason'], 'Invalid conversation_key')
+
+    @inlineCallbacks
+    def add_inbound(self):
+        yield self.message_store.add_inbound_message(
+            self.msg_helper.make_inbound('hello again'),
+            batch_id=self.conversation.batch.key)
+
+    @inlineCallbacks
+    def assert_count(self, cmd, expected, **kw):
+        reply = yield self.dispatch_command(cmd, **kw)
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['count'], expected)
+
+    @inlineCallbacks
+    def test_stats_cached(self):
+        stats_cache = self.resource.stats_cache
+        stats_cache.clock = Clock()
+        yield self.assert_count('count_replies', 1)
+        yield self.add_inbound()
+        yield self.assert_count('count_replies', 1)
+        yield self.assert_count('count_inbound_uniques', 1)
+        self.assertEqual((stats_cache.hits, stats_cache.misses), (2, 1))
+
+        stats_cache.clock.advance(5)
+        yield self.assert_count('count_replies', 2)
+        self.assertEqual((stats_cache.hits, stats_cache.misses), (2, 2))
+
+    @inlineCallbacks
+    def test_stats_cached_per_sample_time(self):
+        stats_cache = self.resource.stats_cache
+        stats_cache.clock = Clock()
+        yield self.dispatch_command('inbound_throughput', sample_time=60)
+        yield self.dispatch_command('outbound_throughput', sample_time=60)
+        yield self.dispatch_command('inbound_throughput', sample_time=120)
+        self.assertEqual((stats_cache.hits, stats_cache.misses), (1, 2))
+
+    @inlineCallbacks
+    def test_stats_cache_disabled(self):
+        yield self.create_resource({'stats_cache_ttl': 0})
+        yield self.assert_count('count_replies', 1)
+        yield self.add_inbound()
+        yield self.assert_count('count_replies', 2)
+
+    @inlineCallbacks
+    def test_stats_cache_disabled_fetches_one_stat(self):
+        yield self.create_resource({'stats_cache_ttl': 0})
+        calls = []
+        for name in ['count_replies', 'count_sent_messages']:
+            def record_call(name=name, orig=getattr(self.conversation, name)):
+                calls.append(name)
+                return orig()
+            self.patch(self.conversation, name, record_call)
+        yield self.assert_count('count_replies', 1)
+        self.assertEqual(calls, ['count_replies'])
+
+    @inlineCallbacks
+    def test_stats_fetch_failure(self):
+        def failing_call(*args):
+            return fail(ValueError("Redis is having a bad day."))
+
+        for name in ['count_replies', 'count_sent_messages']:
+            self.patch(self.conversation, name, failing_call)
+        # Only the first failure is raised and the others are consumed
+        # rather than being logged as unhandled errors.
+        yield self.assertFailure(
+            self.resource.stats_cache.get_stat(
+                self.conversation, 'count_replies'),
+            ValueError)
+
+    @inlineCallbacks
+    def test_stats_cache_hit_rate_metric(self):
+        vumi_api = self.vumi_helper.get_vumi_api()
+        self.app_worker.vumi_api = vumi_api
+        self.patch(vumi_api, 'get_metric_manager', MetricManager)
+        yield self.create_resource({'metrics_prefix': 'go.jsbox.'})
+        self.resource.stats_cache.clock = Clock()
+
+        yield self.dispatch_command('count_replies')
+        yield self.dispatch_command('count_replies')
+        yield self.dispatch_command('count_sent_messages')
+        metric = self.resource.metrics['stats_cache.hit_rate']
+        self.assertEqual([value for _, value in metric.poll()], [0, 1, 1])
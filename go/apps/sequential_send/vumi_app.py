@@ -169,8 +169,10 @@ class SequentialSendApplication(GoApplicationWorker):
                     conv.batch.key, to_addr, messages[message_index],
                     message_options)
 
+                old_data = contact.get_data()
                 contact.extra[index_key] = u'%s' % (message_index + 1)
-                yield contact.save()
+                yield conv.user_api.contact_store.save_contact(
+                    contact, old_data)
 
     @inlineCallbacks
     def send_message(self, batch_id, to_addr, content, msg_options):
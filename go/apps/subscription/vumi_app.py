@@ -51,8 +51,9 @@ class SubscriptionApplication(GoApplicationWorker):
                 'subscribe': u'subscribed',
                 'unsubscribe': u'unsubscribed',
                 }[handler['operation']]
+            old_data = contact.get_data()
             contact.subscription[handler['campaign_name']] = status
-            yield contact.save()
+            yield user_api.contact_store.save_contact(contact, old_data)
             if handler['reply_copy']:
                 yield self.reply_to(message, handler['reply_copy'])
 
@@ -83,7 +83,9 @@ class SurveyApplication(PollApplication, GoApplicationMixin):
         # At the end of a session we want to store the user's responses
         # as dynamic values on the contact's record in the contact database.
         # This does that.
+        user_api = self.get_metadata_helper(message).get_user_api()
         contact = yield self.get_contact_for_message(message, create=True)
+        old_data = contact.get_data()
 
         # Clear previous answers from this poll
         possible_labels = [q.get('label') for q in poll.questions]
@@ -92,7 +94,7 @@ class SurveyApplication(PollApplication, GoApplicationMixin):
                 del contact.extra[label]
 
         contact.extra.update(participant.labels)
-        yield contact.save()
+        yield user_api.contact_store.save_contact(contact, old_data)
 
         yield self.pm.save_participant(poll.poll_id, participant)
         yield self.trigger_event(message, 'survey_completed', {
@@ -71,7 +71,7 @@ class Command(BaseCommand):
                     self.stdout.write('.')
             except:
                 for contact in written_contacts:
-                    contact.delete()
+                    user_api.contact_store.delete_contact(contact)
                 raise
             self.stdout.write('\nDone.\n')
 
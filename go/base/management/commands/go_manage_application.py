@@ -63,7 +63,7 @@ class Command(BaseCommand):
             if application_module in existing_applications:
                 [permission] = [p for p in all_permissions
                                 if p.application == application_module]
-                self.disable_application(permission, account)
+                self.disable_application(user, account, permission)
             else:
                 raise CommandError('User does not have this permission')
 
@@ -73,9 +73,11 @@ class Command(BaseCommand):
             else:
                 raise CommandError('User already has this permission')
 
-    def disable_application(self, app_permission, account):
+    def disable_application(self, user, account, app_permission):
         account.applications.remove(app_permission)
         account.save()
+        vumi_api_for_user(user).api.invalidate_cached_applications(
+            account.key)
 
     def enable_application(self, user, account, application_module):
         user_api = vumi_api_for_user(user)
@@ -87,3 +89,4 @@ class Command(BaseCommand):
 
         account.applications.add(app_permission)
         account.save()
+        api.invalidate_cached_applications(account.key)
@@ -39,6 +39,21 @@ class Command(BaseCommand):
             action='store_true',
             default=False,
             help='Delete a group'),
+        make_option('--rebuild-index',
+            dest='rebuild-index',
+            action='store_true',
+            default=False,
+            help='Rebuild the group name index'),
+        make_option('--materialize',
+            dest='materialize',
+            action='store_true',
+            default=False,
+            help='Materialize the membership of a smart group'),
+        make_option('--dematerialize',
+            dest='dematerialize',
+            action='store_true',
+            default=False,
+            help='Stop materializing the membership of a smart group'),
     ]
     option_list = BaseCommand.option_list + tuple(LOCAL_OPTIONS)
 
@@ -68,7 +83,9 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         options = options.copy()
         operation = self.get_operation(
-            options, ('list', 'create', 'create-smart', 'delete'))
+            options,
+            ('list', 'create', 'create-smart', 'delete', 'rebuild-index',
+             'materialize', 'dematerialize'))
 
         self.ask_for_options(options, ['email-address'])
         user = get_user_by_email(options['email-address'])
@@ -85,6 +102,14 @@ class Command(BaseCommand):
         elif operation == 'delete':
             self.ask_for_options(options, ['group'])
             return self.handle_delete(user_api, options)
+        elif operation == 'rebuild-index':
+            return self.handle_rebuild_index(user_api, options)
+        elif operation == 'materialize':
+            self.ask_for_options(options, ['group'])
+            return self.handle_materialize(user_api, options)
+        elif operation == 'dematerialize':
+            self.ask_for_options(options, ['group'])
+            return self.handle_dematerialize(user_api, options)
 
     def format_group(self, group):
         return '%s [%s] %s"%s"' % (
@@ -132,8 +157,38 @@ class Command(BaseCommand):
         # sit in memory is ugly.
         for contact_key in group.backlinks.contacts():
             contact = user_api.contact_store.get_contact_by_key(contact_key)
+            old_data = contact.get_data()
             contact.groups.remove(group)
-            contact.save()
+            user_api.contact_store.save_contact(contact, old_data)
             self.stdout.write('.')
         self.stdout.write('\nDone.\n')
-        group.delete()
+        user_api.contact_store.delete_group(group)
+
+    def handle_rebuild_index(self, user_api, options):
+        user_api.contact_store.rebuild_group_index()
+        count = user_api.contact_store.count_groups()
+        self.stdout.write("Group name index rebuilt with %s groups.\n" % (
+            count,))
+
+    def get_smart_group(self, user_api, options):
+        group = user_api.contact_store.get_group(options['group'])
+        if group is None:
+            raise CommandError(
+                "Group '%s' not found. Please use the group key (UUID)." % (
+                    options['group'],))
+        if not group.is_smart_group():
+            raise CommandError(
+                "Group '%s' is not a smart group." % (options['group'],))
+        return group
+
+    def handle_materialize(self, user_api, options):
+        group = self.get_smart_group(user_api, options)
+        user_api.contact_store.materialize_smart_group(group)
+        self.stdout.write(
+            "Group materialized:\n * %s\n" % (self.format_group(group),))
+
+    def handle_dematerialize(self, user_api, options):
+        group = self.get_smart_group(user_api, options)
+        user_api.contact_store.dematerialize_smart_group(group.key)
+        self.stdout.write(
+            "Group dematerialized:\n * %s\n" % (self.format_group(group),))
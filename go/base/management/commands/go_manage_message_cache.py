@@ -13,6 +13,9 @@ class Command(BaseGoCommand):
             'reconcile', help='Reconcile the message cache.'),
         make_command_option(
             'switch_to_counters', help='Switch cache to counters.'),
+        make_command_option(
+            'reconcile_aggregates',
+            help='Rebuild the aggregate message counts.'),
         make_option(
             '--email-address', dest='email_address',
             help="Act on the given user's batches."),
@@ -121,3 +124,9 @@ class Command(BaseGoCommand):
             self.mk_vumi_api().mdb.cache.switch_to_counters(batch_id)
 
         self._apply_command(switch_to_counters)
+
+    def handle_command_reconcile_aggregates(self, *args, **options):
+        def reconcile_aggregates(batch_id):
+            self.mk_vumi_api().mdb.reconcile_aggregates(batch_id)
+
+        self._apply_command(reconcile_aggregates)
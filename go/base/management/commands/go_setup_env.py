@@ -12,13 +12,13 @@ from django.template import Context, Template
 
 from vumi.persist.redis_manager import RedisManager
 from vumi.persist.riak_manager import RiakManager
-from vumi.components.tagpool import TagpoolManager
 
 from go.base.utils import (
     vumi_api_for_user, get_conversation_view_definition,
     get_router_view_definition)
-from go.vumitools.api import VumiApi
+from go.vumitools.api import VumiApi, EVENT_DISPATCHER_WORKER_NAME
 from go.vumitools.routing_table import RoutingTable, GoConnector
+from go.vumitools.tagpool import CachingTagpoolManager
 
 # Force YAML to return unicode strings
 # See: http://stackoverflow.com/questions/2890146/
@@ -161,7 +161,7 @@ class Command(BaseCommand):
         self.redis = RedisManager.from_config(config['redis_manager'])
         self.riak = RiakManager.from_config(config['riak_manager'])
         # this prefix is hard coded in VumiApi
-        self.tagpool = TagpoolManager(
+        self.tagpool = CachingTagpoolManager(
             self.redis.sub_manager('tagpool_store'))
         self.api = VumiApi(self.riak, self.redis)
 
@@ -273,6 +273,7 @@ class Command(BaseCommand):
 
         account.applications.add(app_permission)
         account.save()
+        self.api.invalidate_cached_applications(account.key)
         return app_permission
 
     def setup_channels(self, user, channels):
@@ -466,6 +467,8 @@ class Command(BaseCommand):
             '%s_application' % (app_name,) for app_name in applications)
         worker_names.extend(
             '%s_router' % (router_name,) for router_name in routers)
+        # Account config reload commands are sent to the event dispatcher.
+        worker_names.append(EVENT_DISPATCHER_WORKER_NAME)
         fn = self.mk_filename('command_dispatcher', 'yaml')
         with self.open_file(fn, 'w') as fp:
             self.write_yaml(fp, {
@@ -595,7 +598,7 @@ class Command(BaseCommand):
             account_key = user_api.user_account_key
             group = user_api.contact_store.groups(
                 group_info['key'], name=name, user_account=account_key)
-            group.save()
+            user_api.contact_store.save_group(group)
             self.stdout.write('Group %s created\n' % (group.key,))
 
     def write_startup_script(self):
@@ -1,9 +1,19 @@
 import requests
 import json
+from collections import deque
+from functools import partial
+from threading import Lock, local
+from urllib import urlencode
 
 from django.core.paginator import Paginator
 
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.task import deferLater
+from twisted.web import http
+from twisted.web.client import Agent, HTTPConnectionPool
+
 from vumi.message import TransportUserMessage
+from vumi.utils import http_request_full
 
 
 class ClientException(Exception):
@@ -11,17 +21,34 @@ class ClientException(Exception):
 
 
 class Client(object):
+    """
+    Synchronous client for the message store API.
+
+    Requests are made with `session` so connections are reused, and the
+    pages of completed match results are cached. Sessions aren't safe to
+    share between threads, so by default each thread's requests share a
+    session of their own. Use :class:`AsyncClient` from Twisted code.
+    """
 
-    def __init__(self, base_url):
+    def __init__(self, base_url, cache=None, session=None):
         self.base_url = base_url
+        self.cache = cache if cache is not None else _match_result_cache
+        self.session = session
+
+    def get_session(self):
+        if self.session is not None:
+            return self.session
+        if not hasattr(_thread_state, 'session'):
+            _thread_state.session = requests.session()
+        return _thread_state.session
 
     def do_get(self, path, params):
         url = '%s%s' % (self.base_url, path)
-        return requests.get(url, params=params)
+        return self.get_session().get(url, params=params)
 
     def do_post(self, path, data):
         url = '%s%s' % (self.base_url, path)
-        return requests.post(url, data=data)
+        return self.get_session().post(url, data=data)
 
     def match(self, batch_id, direction, query):
         path = 'batch/%s/%s/match/' % (batch_id, direction)
@@ -29,6 +56,11 @@ class Client(object):
         return response.headers['x-vms-result-token']
 
     def match_results(self, batch_id, direction, token, start, stop):
+        cached = self.cache.get(token, start, stop)
+        if cached is not None:
+            total_count, results = cached
+            return False, total_count, results
+
         path = 'batch/%s/%s/match/' % (batch_id, direction)
         response = self.do_get(path, params={
             'token': token,
@@ -41,6 +73,8 @@ class Client(object):
         total_count = int(response.headers['x-vms-result-count'])
         results = [TransportUserMessage(_process_fields=False, **payload)
                     for payload in response.json]
+        if not in_progress:
+            self.cache.set(token, start, stop, total_count, results)
         return in_progress, total_count, results
 
 
@@ -109,3 +143,156 @@ class MatchResult(object):
     def __repr__(self):
         return "<MatchResult in_progress: %s, total_count: %s>" % (
             self._in_progress, self._total_count)
+
+
+class MatchResultCache(object):
+    """
+    Cache of the pages of completed match results, keyed by result token.
+
+    Results for at most `max_tokens` tokens are kept, with the results of
+    the least recently used tokens being discarded first.
+    """
+
+    def __init__(self, max_tokens=100):
+        self.max_tokens = max_tokens
+        self._tokens = {}
+        # Tokens from least to most recently used.
+        self._order = deque()
+        # The synchronous client's cache is shared between threads.
+        self._lock = Lock()
+
+    def _touch(self, token):
+        if token in self._tokens:
+            self._order.remove(token)
+        self._order.append(token)
+
+    def get(self, token, start, stop):
+        with self._lock:
+            pages = self._tokens.get(token)
+            if pages is None:
+                return None
+            self._touch(token)
+            return pages.get((start, stop))
+
+    def set(self, token, start, stop, total_count, results):
+        with self._lock:
+            self._touch(token)
+            pages = self._tokens.setdefault(token, {})
+            pages[(start, stop)] = (total_count, results)
+            while len(self._order) > self.max_tokens:
+                del self._tokens[self._order.popleft()]
+
+
+_thread_state = local()
+_match_result_cache = MatchResultCache()
+
+
+class AsyncClient(object):
+    """
+    Asynchronous client for the message store API.
+
+    Requests are made over persistent connections from a shared connection
+    pool and the pages of completed match results are cached.
+    """
+
+    RESULT_TOKEN_HEADER = 'x-vms-result-token'
+    RESULT_COUNT_HEADER = 'x-vms-result-count'
+    IN_PROGRESS_HEADER = 'x-vms-match-in-progress'
+
+    # Match results are polled for with exponential backoff, starting with
+    # `POLL_INITIAL_DELAY` seconds between polls and doubling it each time
+    # up to `POLL_MAX_DELAY` seconds, for up to `POLL_TIMEOUT` seconds.
+    POLL_INITIAL_DELAY = 0.1
+    POLL_MAX_DELAY = 5
+    POLL_TIMEOUT = 60
+
+    def __init__(self, base_url, pool=None, cache=None, reactor=None):
+        self.base_url = base_url
+        if reactor is None:
+            # Importing the reactor installs it, which Django processes
+            # that only use the synchronous client shouldn't do.
+            from twisted.internet import reactor
+        self.reactor = reactor
+        if pool is None:
+            pool = HTTPConnectionPool(reactor, persistent=True)
+        self.pool = pool
+        self.cache = cache if cache is not None else MatchResultCache()
+
+    def close(self):
+        """
+        Close the pool's persistent connections.
+        """
+        return self.pool.closeCachedConnections()
+
+    def request(self, method, path, data=None, params=None):
+        url = '%s%s' % (self.base_url, path)
+        if params:
+            url = '%s?%s' % (url, urlencode(params))
+        d = http_request_full(
+            url, data=data, method=method,
+            agent_class=partial(Agent, pool=self.pool))
+        d.addCallback(self.check_response, method, url)
+        return d
+
+    def check_response(self, response, method, url):
+        if response.code != http.OK:
+            raise ClientException(
+                '%s %s failed with status %s: %r' % (
+                    method, url, response.code, response.delivered_body))
+        return response
+
+    def get_header(self, response, name):
+        values = response.headers.getRawHeaders(name)
+        if not values:
+            raise ClientException(
+                'Message store API response has no %r header.' % (name,))
+        return values[0]
+
+    @inlineCallbacks
+    def match(self, batch_id, direction, query):
+        path = 'batch/%s/%s/match/' % (batch_id, direction)
+        response = yield self.request('POST', path, data=json.dumps(query))
+        returnValue(self.get_header(response, self.RESULT_TOKEN_HEADER))
+
+    @inlineCallbacks
+    def match_results(self, batch_id, direction, token, start, stop):
+        cached = self.cache.get(token, start, stop)
+        if cached is not None:
+            total_count, results = cached
+            returnValue((False, total_count, results))
+
+        path = 'batch/%s/%s/match/' % (batch_id, direction)
+        response = yield self.request('GET', path, params={
+            'token': token,
+            'start': start,
+            'stop': stop,
+        })
+        in_progress = bool(int(
+            self.get_header(response, self.IN_PROGRESS_HEADER)))
+        total_count = int(self.get_header(response, self.RESULT_COUNT_HEADER))
+        results = [TransportUserMessage(_process_fields=False, **payload)
+                   for payload in json.loads(response.delivered_body)]
+        if not in_progress:
+            self.cache.set(token, start, stop, total_count, results)
+        returnValue((in_progress, total_count, results))
+
+    @inlineCallbacks
+    def wait_for_results(self, batch_id, direction, token, start, stop):
+        """
+        Poll for match results until the match has completed and return
+        the total result count and the requested page of results.
+        """
+        delay = self.POLL_INITIAL_DELAY
+        waited = 0
+        while True:
+            in_progress, total_count, results = yield self.match_results(
+                batch_id, direction, token, start, stop)
+            if not in_progress:
+                returnValue((total_count, results))
+            if waited >= self.POLL_TIMEOUT:
+                raise ClientException(
+                    'Timed out waiting for match results for token %r.' % (
+                        token,))
+            yield deferLater(self.reactor, delay, lambda: None)
+            waited += delay
+            delay = min(delay * 2, self.POLL_MAX_DELAY)
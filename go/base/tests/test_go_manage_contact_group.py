@@ -1,5 +1,7 @@
 from cStringIO import StringIO
 
+from django.core.management.base import CommandError
+
 from go.base.management.commands import go_manage_contact_group
 from go.base.tests.helpers import GoDjangoTestCase, DjangoVumiApiHelper
 
@@ -19,6 +21,9 @@ class TestGoManageContactGroupCommand(GoDjangoTestCase):
             'create': False,
             'create-smart': False,
             'delete': False,
+            'rebuild-index': False,
+            'materialize': False,
+            'dematerialize': False,
         }
         options[command] = True
         options.update(kw)
@@ -96,3 +101,37 @@ class TestGoManageContactGroupCommand(GoDjangoTestCase):
         self.assertTrue(group.key in lines[1])
         self.assertEqual(lines[2], '..')
         self.assertEqual(lines[3], 'Done.')
+
+    def test_rebuild_index(self):
+        group = self.contact_store.groups(
+            u'key1', name=u'test group',
+            user_account=self.contact_store.user_account_key)
+        group.save()
+        group_index = self.contact_store.group_index
+        self.assertEqual(group_index.keys_for_name(u'test group'), [])
+        output = self.invoke_command('rebuild-index')
+        self.assertEqual(output, 'Group name index rebuilt with 1 groups.\n')
+        self.assertEqual(
+            group_index.keys_for_name(u'test group'), [u'key1'])
+
+    def test_materialize(self):
+        group = self.contact_store.new_smart_group(
+            u'sg', query=u'surname:"Foo"')
+        contact = self.contact_store.new_contact(
+            msisdn=u'123', surname=u'Foo')
+        output = self.invoke_command('materialize', group=group.key)
+        self.assertEqual(output.splitlines()[0], 'Group materialized:')
+        self.assertTrue(self.contact_store.smart_group_is_materialized(group))
+        self.assertEqual(
+            self.contact_store.get_dynamic_contacts_for_group(group),
+            [contact.key])
+
+        output = self.invoke_command('dematerialize', group=group.key)
+        self.assertEqual(output.splitlines()[0], 'Group dematerialized:')
+        self.assertFalse(
+            self.contact_store.smart_group_is_materialized(group))
+
+    def test_materialize_static_group(self):
+        group = self.contact_store.new_group(u'test group')
+        self.assertRaises(
+            CommandError, self.invoke_command, 'materialize', group=group.key)
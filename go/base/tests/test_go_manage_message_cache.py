@@ -2,6 +2,7 @@ from tempfile import NamedTemporaryFile
 
 from go.base.management.commands import go_manage_message_cache
 from go.base.tests.helpers import GoCommandTestCase
+from go.vumitools.tests.helpers import GoMessageHelper
 
 
 def make_batch_keys_file(batch_keys):
@@ -273,3 +274,27 @@ class TestGoManageMessageCache(GoCommandTestCase):
             expected_output, 'switch_to_counters',
             email_address=self.user_email, conversation_key=conv.key)
         self.assertTrue(self.uses_counters(conv.batch.key))
+
+    def test_reconcile_aggregates(self):
+        conv = self.user_helper.create_conversation(u"http_api")
+        msg_helper = GoMessageHelper(vumi_helper=self.vumi_helper)
+        msg_helper.add_inbound_to_conv(conv, 4, time_multiplier=12)
+        mdb = self.vumi_helper.get_vumi_api().mdb
+        mdb.cache.aggregates.clear(conv.batch.key)
+        self.assertEqual(
+            mdb.get_aggregate_counts(conv.batch.key, 'inbound'), None)
+        expected_output = "\n".join([
+            u'Processing account Test User'
+            u' <user@domain.com> [test-0-user] ...',
+            u'  Performing reconcile_aggregates on'
+            u' batch %s ...' % conv.batch.key,
+            u'done.',
+            u''
+        ])
+        self.assert_command_output(
+            expected_output, 'reconcile_aggregates',
+            email_address=self.user_email, conversation_key=conv.key)
+        counts = mdb.get_aggregate_counts(conv.batch.key, 'inbound')
+        self.assertEqual(sum(count for _, count in counts), 4)
+        self.assertEqual(counts, conv.get_aggregate_count(
+            'inbound', bucket_func=lambda dt: dt.date()))
@@ -338,7 +338,8 @@ class TestGoSetupEnv(GoDjangoTestCase):
         self.assertEqual(config['transport_name'],
             'command_dispatcher')
         self.assertEqual(config['worker_names'],
-            ['app1_application', 'app2_application', 'router1_router'])
+            ['app1_application', 'app2_application', 'router1_router',
+             'event_dispatcher'])
 
     def test_create_go_api_worker_config(self):
         fake_file = FakeFile()
@@ -0,0 +1,212 @@
+from datetime import datetime, timedelta
+from threading import Thread
+
+from mock import Mock
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue, succeed
+from twisted.internet.task import Clock
+from twisted.web.http_headers import Headers
+from twisted.web.server import Site
+
+from vumi.components.message_store import MessageStore
+from vumi.components.message_store_api import MessageStoreAPI
+from vumi.tests.helpers import (
+    VumiTestCase, MessageHelper, PersistenceHelper)
+
+from go.base.message_store_client import (
+    Client, AsyncClient, MatchResultCache, ClientException)
+
+
+class TestMatchResultCache(VumiTestCase):
+
+    def test_get_missing(self):
+        cache = MatchResultCache()
+        self.assertEqual(cache.get('token', 0, 19), None)
+        cache.set('token', 0, 19, 1, ['msg'])
+        self.assertEqual(cache.get('token', 20, 39), None)
+
+    def test_set_and_get(self):
+        cache = MatchResultCache()
+        cache.set('token', 0, 19, 2, ['msg1'])
+        cache.set('token', 20, 39, 2, ['msg2'])
+        self.assertEqual(cache.get('token', 0, 19), (2, ['msg1']))
+        self.assertEqual(cache.get('token', 20, 39), (2, ['msg2']))
+
+    def test_max_tokens(self):
+        cache = MatchResultCache(max_tokens=2)
+        cache.set('token1', 0, 19, 1, ['msg1'])
+        cache.set('token2', 0, 19, 1, ['msg2'])
+        # Using token1 makes token2 the least recently used token.
+        cache.get('token1', 0, 19)
+        cache.set('token3', 0, 19, 1, ['msg3'])
+        self.assertEqual(cache.get('token1', 0, 19), (1, ['msg1']))
+        self.assertEqual(cache.get('token2', 0, 19), None)
+        self.assertEqual(cache.get('token3', 0, 19), (1, ['msg3']))
+
+
+class TestClient(VumiTestCase):
+
+    def test_match_results_cached(self):
+        cache = MatchResultCache()
+        cache.set('token', 0, 19, 1, ['msg'])
+        client = Client('http://localhost/', cache=cache)
+
+        def fail_get(*args, **kw):
+            self.fail("Completed results should be cached.")
+
+        self.patch(client, 'do_get', fail_get)
+        self.assertEqual(
+            client.match_results('batch', 'inbound', 'token', 0, 19),
+            (False, 1, ['msg']))
+
+    def test_session(self):
+        session = Mock()
+        client = Client('http://localhost/', session=session)
+        client.do_get('batch/', {'token': 'token'})
+        session.get.assert_called_once_with(
+            'http://localhost/batch/', params={'token': 'token'})
+
+    def test_session_per_thread(self):
+        client = Client('http://localhost/')
+        sessions = []
+        thread = Thread(target=lambda: sessions.append(client.get_session()))
+        thread.start()
+        thread.join()
+        self.assertTrue(client.get_session() is client.get_session())
+        self.assertFalse(client.get_session() is sessions[0])
+
+
+class TestAsyncClient(VumiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(
+            PersistenceHelper(use_riak=True))
+        self.msg_helper = self.add_helper(MessageHelper())
+        riak = self.persistence_helper.get_riak_manager()
+        redis = yield self.persistence_helper.get_redis_manager()
+        self.store = MessageStore(riak, redis)
+        self.batch_id = yield self.store.batch_start([('pool', 'tag')])
+
+        # A local stand-in for the message store API server.
+        site = Site(MessageStoreAPI(self.store))
+        port = reactor.listenTCP(0, site, interface='127.0.0.1')
+        self.add_cleanup(port.loseConnection)
+        addr = port.getHost()
+        self.client = AsyncClient('http://%s:%s/' % (addr.host, addr.port))
+        self.add_cleanup(self.client.close)
+
+    @inlineCallbacks
+    def create_inbound(self, count, content_template):
+        messages = []
+        now = datetime.now()
+        for i in range(count):
+            msg = self.msg_helper.make_inbound(
+                content_template.format(i),
+                timestamp=(now - timedelta(i * 10)))
+            yield self.store.add_inbound_message(msg, batch_id=self.batch_id)
+            messages.append(msg)
+        returnValue(messages)
+
+    def match(self, pattern):
+        return self.client.match(self.batch_id, 'inbound', [{
+            'key': 'msg.content',
+            'pattern': pattern,
+            'flags': 'i',
+        }])
+
+    @inlineCallbacks
+    def test_match(self):
+        yield self.create_inbound(5, 'hello {0}')
+        yield self.create_inbound(2, 'goodbye {0}')
+        token = yield self.match('hello')
+        total_count, results = yield self.client.wait_for_results(
+            self.batch_id, 'inbound', token, 0, 19)
+        self.assertEqual(total_count, 5)
+        self.assertEqual(
+            sorted(msg['content'] for msg in results),
+            ['hello %s' % (i,) for i in range(5)])
+
+    @inlineCallbacks
+    def test_match_results_pages(self):
+        messages = yield self.create_inbound(5, 'hello {0}')
+        token = yield self.match('hello')
+        total_count, page1 = yield self.client.wait_for_results(
+            self.batch_id, 'inbound', token, 0, 2)
+        total_count, page2 = yield self.client.wait_for_results(
+            self.batch_id, 'inbound', token, 3, 4)
+        self.assertEqual(total_count, 5)
+        self.assertEqual(len(page1), 3)
+        self.assertEqual(len(page2), 2)
+        self.assertEqual(
+            set(msg['message_id'] for msg in page1 + page2),
+            set(msg['message_id'] for msg in messages))
+
+    @inlineCallbacks
+    def test_match_results_cached(self):
+        yield self.create_inbound(3, 'hello {0}')
+        token = yield self.match('hello')
+        expected = yield self.client.wait_for_results(
+            self.batch_id, 'inbound', token, 0, 19)
+
+        def fail_request(*args, **kw):
+            self.fail("Completed results should be cached.")
+
+        self.patch(self.client, 'request', fail_request)
+        in_progress, total_count, results = yield self.client.match_results(
+            self.batch_id, 'inbound', token, 0, 19)
+        self.assertFalse(in_progress)
+        self.assertEqual((total_count, results), expected)
+
+    @inlineCallbacks
+    def test_request_error(self):
+        yield self.assertFailure(
+            self.client.match(self.batch_id, 'unknown', []), ClientException)
+
+    def test_get_header_missing(self):
+        response = Mock(code=200, headers=Headers())
+        self.assertRaises(
+            ClientException, self.client.get_header, response,
+            AsyncClient.RESULT_TOKEN_HEADER)
+
+
+class TestAsyncClientPolling(VumiTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.client = AsyncClient('http://localhost/', reactor=self.clock)
+        self.add_cleanup(self.client.close)
+        self.polls = []
+
+    def patch_match_results(self, in_progress_polls):
+        def match_results(batch_id, direction, token, start, stop):
+            self.polls.append(self.clock.seconds())
+            in_progress = len(self.polls) <= in_progress_polls
+            return succeed((in_progress, 1, ['msg']))
+
+        self.patch(self.client, 'match_results', match_results)
+
+    def test_wait_for_results_backoff(self):
+        self.patch_match_results(4)
+        d = self.client.wait_for_results('batch', 'inbound', 'token', 0, 19)
+        self.assertEqual(len(self.polls), 1)
+        for i, delay in enumerate([0.1, 0.2, 0.4, 0.8]):
+            self.assertNoResult(d)
+            self.clock.advance(delay)
+            self.assertEqual(len(self.polls), i + 2)
+        self.assertEqual(self.successResultOf(d), (1, ['msg']))
+
+    def test_wait_for_results_max_delay(self):
+        self.patch_match_results(10)
+        d = self.client.wait_for_results('batch', 'inbound', 'token', 0, 19)
+        self.clock.pump([1] * 60)
+        self.successResultOf(d)
+        delays = [b - a for a, b in zip(self.polls, self.polls[1:])]
+        self.assertEqual(max(delays), AsyncClient.POLL_MAX_DELAY)
+
+    def test_wait_for_results_timeout(self):
+        self.patch_match_results(1000)
+        d = self.client.wait_for_results('batch', 'inbound', 'token', 0, 19)
+        self.clock.pump([1] * (AsyncClient.POLL_TIMEOUT + 10))
+        self.failureResultOf(d, ClientException)
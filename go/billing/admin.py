@@ -7,7 +7,8 @@ from django.utils.translation import ugettext_lazy as _
 from django.contrib import admin
 from django.contrib import messages
 
-from go.billing.models import TagPool, Account, MessageCost, Transaction
+from go.billing.models import (
+    TagPool, Account, MessageCost, Transaction, LowCreditAlert)
 from go.billing.forms import (CreditLoadForm,
                               BaseCreditLoadFormSet,
                               MessageCostForm,
@@ -117,7 +118,22 @@ class TransactionAdmin(admin.ModelAdmin):
         return False
 
 
+class LowCreditAlertAdmin(admin.ModelAdmin):
+    list_display = ('id', 'account', 'alert_threshold',
+                    'alert_credit_balance', 'credit_balance', 'cleared',
+                    'created')
+
+    search_fields = ('account__account_number',)
+    list_filter = ('cleared', 'created')
+    readonly_fields = ('account', 'alert_threshold', 'alert_credit_balance',
+                       'credit_balance', 'cleared', 'created')
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(TagPool, TagPoolAdmin)
 admin.site.register(Account, AccountAdmin)
 admin.site.register(MessageCost, MessageCostAdmin)
 admin.site.register(Transaction, TransactionAdmin)
+admin.site.register(LowCreditAlert, LowCreditAlertAdmin)
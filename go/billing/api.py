@@ -1,4 +1,5 @@
 import json
+import base64
 
 from twisted.python import log
 from twisted.internet import defer
@@ -8,6 +9,7 @@ from twisted.web.server import NOT_DONE_YET
 from django.contrib.auth.hashers import make_password
 
 from go.billing import settings as app_settings
+from go.billing.cache import credit_balance_cache
 from go.billing.models import MessageCost
 from go.billing.utils import JSONEncoder, JSONDecoder, BillingError
 
@@ -172,7 +174,12 @@ class AccountResource(BaseResource):
     def render_GET(self, request):
         """Handle an HTTP GET request"""
         params = filter(None, request.postpath)
-        if len(params) > 0:
+        if len(params) == 2 and params[1] == 'credit_balance':
+            d = self.get_credit_balance(params[0])
+            d.addCallbacks(self._render_to_json, self._handle_error,
+                           callbackArgs=[request], errbackArgs=[request])
+
+        elif len(params) > 0:
             d = self.get_account(params[0])
             d.addCallbacks(self._render_to_json, self._handle_error,
                            callbackArgs=[request], errbackArgs=[request])
@@ -203,6 +210,33 @@ class AccountResource(BaseResource):
         else:
             defer.returnValue(None)
 
+    @defer.inlineCallbacks
+    def get_credit_balance(self, account_number):
+        """Fetch the credit balance of the account with the given
+        ``account_number``, preferably from the credit balance cache.
+
+        """
+        credit_balance = credit_balance_cache.get(account_number)
+        if credit_balance is None:
+            version = credit_balance_cache.get_version(account_number)
+            query = """
+                SELECT credit_balance
+                FROM billing_account
+                WHERE account_number = %(account_number)s
+            """
+
+            params = {'account_number': account_number}
+            result = yield self._connection_pool.runQuery(query, params)
+            if len(result) == 0:
+                defer.returnValue(None)
+            credit_balance = result[0]['credit_balance']
+            credit_balance_cache.set(account_number, credit_balance, version)
+
+        defer.returnValue({
+            'account_number': account_number,
+            'credit_balance': credit_balance,
+        })
+
     @defer.inlineCallbacks
     def get_account_list(self):
         """Fetch all accounts"""
@@ -338,6 +372,19 @@ class AccountResource(BaseResource):
 
         cursor = yield cursor.execute(query, params)
 
+        # Clear any low credit alerts so that they can be raised again
+        query = """
+            UPDATE billing_lowcreditalert
+            SET cleared = true
+            WHERE NOT cleared
+            AND account_id = (SELECT id
+                              FROM billing_account
+                              WHERE account_number = %(account_number)s)
+        """
+
+        params = {'account_number': account_number}
+        cursor = yield cursor.execute(query, params)
+
         # Fetch the latest account information
         query = """SELECT account_number, description, credit_balance,
                           alert_threshold, alert_credit_balance
@@ -355,6 +402,9 @@ class AccountResource(BaseResource):
         result = yield self._connection_pool.runInteraction(
             self.load_credits_interaction, account_number, credit_amount)
 
+        if result is not None:
+            credit_balance_cache.update(
+                account_number, result['credit_balance'])
         defer.returnValue(result)
 
 
@@ -565,7 +615,21 @@ class TransactionResource(BaseResource):
         account_number = request.args.get('account_number', [])
         page_number = request.args.get('page_number', [0])
         items_per_page = request.args.get('items_per_page', [20])
-        if len(account_number) > 0:
+        cursor = request.args.get('cursor', None)
+        if len(account_number) > 0 and cursor is not None:
+            try:
+                last_seen = self.decode_transaction_cursor(cursor[0])
+            except ValueError:
+                self._handle_bad_request(request)
+                return NOT_DONE_YET
+
+            d = self.get_transaction_page(
+                account_number[0], last_seen, items_per_page[0])
+
+            d.addCallbacks(self._render_to_json, self._handle_error,
+                           callbackArgs=[request], errbackArgs=[request])
+
+        elif len(account_number) > 0:
             d = self.get_transaction_list(
                 account_number[0], page_number[0], items_per_page[0])
 
@@ -670,7 +734,7 @@ class TransactionResource(BaseResource):
                    status, created, last_modified
             FROM billing_transaction
             WHERE account_number = %(account_number)s
-            ORDER BY created DESC
+            ORDER BY created DESC, id DESC
             OFFSET %(offset)s
             LIMIT %(limit)s
         """
@@ -699,6 +763,86 @@ class TransactionResource(BaseResource):
         else:
             defer.returnValue(None)
 
+    def encode_transaction_cursor(self, transaction):
+        """Return an opaque cursor pointing just past ``transaction``"""
+        last_seen = [transaction['created'].isoformat(), transaction['id']]
+        return base64.urlsafe_b64encode(json.dumps(last_seen))
+
+    def decode_transaction_cursor(self, cursor):
+        """Return the ``(created, id)`` pair encoded in ``cursor``.
+
+        An empty cursor refers to the start of the transaction list and
+        decodes to ``None``. Raise ``ValueError`` if the cursor is invalid.
+
+        """
+        if not cursor:
+            return None
+        try:
+            created, transaction_id = json.loads(
+                base64.urlsafe_b64decode(str(cursor)))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid transaction cursor: %r" % (cursor,))
+        if not (isinstance(created, basestring)
+                and isinstance(transaction_id, (int, long))):
+            raise ValueError("Invalid transaction cursor: %r" % (cursor,))
+        return (created, transaction_id)
+
+    @defer.inlineCallbacks
+    def get_transaction_page(self, account_number, last_seen,
+                             items_per_page):
+        """Return a page of transactions following ``last_seen``.
+
+        Unlike :meth:`get_transaction_list` this does not use an ``OFFSET``,
+        so it takes the same time to fetch a page no matter how deep into
+        the transaction history it is. ``last_seen`` is either ``None`` (for
+        the first page) or the ``(created, id)`` pair of the last
+        transaction on the previous page.
+
+        The result contains the page of ``transactions`` and a
+        ``next_cursor`` which is ``None`` once there are no more pages.
+
+        """
+        try:
+            limit = int(items_per_page)
+        except ValueError:
+            limit = 20
+        except TypeError:
+            limit = 20
+        params = {
+            'account_number': account_number,
+            'limit': limit + 1,
+        }
+
+        query = """
+            SELECT id, account_number, message_id,
+                   tag_pool_name, tag_name,
+                   message_direction, message_cost,
+                   session_created, session_cost,
+                   markup_percent, credit_factor, credit_amount,
+                   status, created, last_modified
+            FROM billing_transaction
+            WHERE account_number = %(account_number)s
+        """
+        if last_seen is not None:
+            query += """
+            AND (created, id) < (%(created)s, %(transaction_id)s)
+            """
+            params['created'], params['transaction_id'] = last_seen
+        query += """
+            ORDER BY created DESC, id DESC
+            LIMIT %(limit)s
+        """
+
+        result = yield self._connection_pool.runQuery(query, params)
+        transactions = result[:limit]
+        next_cursor = None
+        if transactions and len(result) > limit:
+            next_cursor = self.encode_transaction_cursor(transactions[-1])
+        defer.returnValue({
+            'transactions': transactions,
+            'next_cursor': next_cursor,
+        })
+
     @defer.inlineCallbacks
     def create_transaction_interaction(self, cursor, account_number,
                                        message_id, tag_pool_name, tag_name,
@@ -766,6 +910,7 @@ class TransactionResource(BaseResource):
             UPDATE billing_account
             SET credit_balance = credit_balance - %(credit_amount)s
             WHERE account_number = %(account_number)s
+            RETURNING credit_balance, alert_credit_balance
         """
 
         params = {
@@ -773,15 +918,6 @@ class TransactionResource(BaseResource):
             'account_number': account_number
         }
 
-        cursor = yield cursor.execute(query, params)
-
-        # Check the account's credit balance and raise an
-        # alert if it has gone below the credit balance threshold
-        query = """SELECT credit_balance, alert_credit_balance
-                   FROM billing_account
-                   WHERE account_number = %(account_number)s"""
-
-        params = {'account_number': account_number}
         cursor = yield cursor.execute(query, params)
         result = yield cursor.fetchone()
 
@@ -791,23 +927,60 @@ class TransactionResource(BaseResource):
                 " credit balance. Message was %s to/from tag pool %s." % (
                     account_number, message_direction, tag_pool_name))
 
+        # Raise an alert if the account's credit balance has gone below
+        # the credit balance threshold. A balance that was exactly at the
+        # threshold before this transaction counts as crossing it, otherwise
+        # no alert would be raised when the balance passes through the
+        # threshold exactly.
         credit_balance = result.get('credit_balance')
         alert_credit_balance = result.get('alert_credit_balance')
         if (credit_balance < alert_credit_balance and
-                credit_balance + credit_amount > alert_credit_balance):
-            pass  # TODO: Raise a Low Credits alert; somehow
+                credit_balance + credit_amount >= alert_credit_balance):
+            yield self.create_low_credit_alert_interaction(
+                cursor, account_number)
 
-        defer.returnValue(transaction)
+        defer.returnValue((transaction, credit_balance))
+
+    @defer.inlineCallbacks
+    def create_low_credit_alert_interaction(self, cursor, account_number):
+        """Record a low credit alert for the given ``account_number``.
+
+        Nothing is recorded if there is already an uncleared alert for the
+        account's current alert credit balance.
+
+        """
+        query = """
+            INSERT INTO billing_lowcreditalert
+                (account_id, alert_threshold, alert_credit_balance,
+                 credit_balance, cleared, created)
+            SELECT a.id, a.alert_threshold, a.alert_credit_balance,
+                   a.credit_balance, false, now()
+            FROM billing_account a
+            WHERE a.account_number = %(account_number)s
+            AND NOT EXISTS (
+                SELECT 1
+                FROM billing_lowcreditalert l
+                WHERE l.account_id = a.id
+                AND l.alert_credit_balance = a.alert_credit_balance
+                AND NOT l.cleared)
+        """
+
+        params = {'account_number': account_number}
+        cursor = yield cursor.execute(query, params)
+        defer.returnValue(cursor)
 
     @defer.inlineCallbacks
     def create_transaction(self, account_number, message_id, tag_pool_name,
                            tag_name, message_direction, session_created):
         """Create a new transaction for the given ``account_number``"""
-        result = yield self._connection_pool.runInteraction(
-            self.create_transaction_interaction, account_number, message_id,
-            tag_pool_name, tag_name, message_direction, session_created)
+        transaction, credit_balance = yield (
+            self._connection_pool.runInteraction(
+                self.create_transaction_interaction, account_number,
+                message_id, tag_pool_name, tag_name, message_direction,
+                session_created))
 
-        defer.returnValue(result)
+        credit_balance_cache.update(account_number, credit_balance)
+        defer.returnValue(transaction)
 
 
 class Root(BaseResource):
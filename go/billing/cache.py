@@ -0,0 +1,76 @@
+import time
+
+from go.billing import settings as app_settings
+
+
+class CreditBalanceCache(object):
+    """An in-process cache of account credit balance snapshots.
+
+    Each account has a version that is incremented whenever its credit
+    balance is known to have changed. A balance read from the database is
+    only stored if the account's version hasn't changed since before the
+    read started, so a slow read can't replace a newer balance.
+
+    Snapshots expire after ``ttl`` seconds, which bounds how stale a
+    balance can be when it is changed by another process.
+
+    """
+
+    def __init__(self, ttl, get_time=time.time):
+        self.ttl = ttl
+        self._get_time = get_time
+        self._versions = {}
+        self._snapshots = {}
+
+    def get_version(self, account_number):
+        """Return the current version of ``account_number``'s balance."""
+        return self._versions.get(account_number, 0)
+
+    def get(self, account_number):
+        """Return the cached credit balance for ``account_number``.
+
+        Returns ``None`` if there is no current snapshot.
+        """
+        snapshot = self._snapshots.get(account_number)
+        if snapshot is None:
+            return None
+        credit_balance, version, timestamp = snapshot
+        if (version != self.get_version(account_number)
+                or self._get_time() - timestamp >= self.ttl):
+            del self._snapshots[account_number]
+            return None
+        return credit_balance
+
+    def set(self, account_number, credit_balance, version):
+        """Store a credit balance read at the given ``version``.
+
+        Returns ``False`` (and stores nothing) if the balance has been
+        invalidated since ``version``.
+        """
+        if version != self.get_version(account_number):
+            return False
+        self._snapshots[account_number] = (
+            credit_balance, version, self._get_time())
+        return True
+
+    def invalidate(self, account_number):
+        """Discard ``account_number``'s snapshot and return the new version.
+        """
+        version = self.get_version(account_number) + 1
+        self._versions[account_number] = version
+        self._snapshots.pop(account_number, None)
+        return version
+
+    def update(self, account_number, credit_balance):
+        """Store a credit balance that has just changed."""
+        version = self.invalidate(account_number)
+        self.set(account_number, credit_balance, version)
+
+    def clear(self):
+        """Discard all snapshots."""
+        for account_number in self._snapshots.keys():
+            self.invalidate(account_number)
+
+
+credit_balance_cache = CreditBalanceCache(
+    app_settings.CREDIT_BALANCE_CACHE_TTL)
@@ -7,7 +7,8 @@ from django.forms.models import BaseModelFormSet
 
 from go.vumitools.api import VumiApi
 
-from go.billing.models import Account, TagPool, MessageCost, Transaction
+from go.billing.models import (
+    Account, TagPool, MessageCost, Transaction, LowCreditAlert)
 
 
 def cost_rounded_to_zero(a, context):
@@ -95,6 +96,10 @@ class CreditLoadForm(ModelForm):
 
         account.save()
 
+        # Allow low credit alerts to be raised again
+        LowCreditAlert.objects.filter(
+            account=account, cleared=False).update(cleared=True)
+
         # Update the transaction's status to Completed
         transaction.status = Transaction.STATUS_COMPLETED
         transaction.save()
@@ -7,6 +7,7 @@ from django.conf import settings
 
 
 import go.billing.settings as app_settings
+from go.billing.cache import credit_balance_cache
 from go.base.models import UserProfile
 
 
@@ -51,6 +52,15 @@ post_save.connect(create_billing_account, sender=UserProfile,
     dispatch_uid='go.billing.models.create_billing_account')
 
 
+def update_credit_balance_cache(sender, instance, **kwargs):
+    credit_balance_cache.update(
+        instance.account_number, instance.credit_balance)
+
+
+post_save.connect(update_credit_balance_cache, sender=Account,
+    dispatch_uid='go.billing.models.update_credit_balance_cache')
+
+
 class MessageCost(models.Model):
     """Specifies the cost of a single message.
 
@@ -215,10 +225,36 @@ class Transaction(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        index_together = [
+            ['account_number', 'created', 'id'],
+        ]
+
     def __unicode__(self):
         return unicode(self.pk)
 
 
+class LowCreditAlert(models.Model):
+    """Records an account's credit balance dropping below its alert
+    credit balance.
+
+    Only one uncleared alert is recorded for each alert credit balance.
+    Alerts are cleared when credits are loaded into the account.
+
+    """
+
+    account = models.ForeignKey(Account)
+    alert_threshold = models.DecimalField(max_digits=10, decimal_places=2)
+    alert_credit_balance = models.DecimalField(max_digits=20,
+                                               decimal_places=6)
+    credit_balance = models.DecimalField(max_digits=20, decimal_places=6)
+    cleared = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return u"Low credit alert for %s" % (self.account,)
+
+
 class Statement(models.Model):
     """Account statement for a period of time"""
 
@@ -251,3 +287,37 @@ class LineItem(models.Model):
 
     def __unicode__(self):
         return u"%s line item" % (self.statement.title,)
+
+
+class DailyTransactionSummary(models.Model):
+    """The total cost of an account's transactions for a single day.
+
+    Summaries are grouped the same way as statement line items, so that a
+    statement can be generated from a month's summaries instead of from the
+    raw transactions. A summary is ``finalised`` once its day is over. A
+    finalised summary is only recalculated if one of its day's transactions
+    is created or modified after ``summarised_at``.
+
+    """
+
+    account = models.ForeignKey(Account)
+    day = models.DateField()
+    tag_pool_name = models.CharField(max_length=100, blank=True, default='')
+    tag_name = models.CharField(max_length=100, blank=True, default='')
+    message_direction = models.CharField(max_length=20, blank=True,
+                                         default='')
+
+    total_cost = models.DecimalField(max_digits=20, decimal_places=6,
+                                     default=Decimal('0.0'))
+
+    finalised = models.BooleanField(default=False)
+    summarised_at = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = [
+            ['account', 'day', 'tag_pool_name', 'tag_name',
+             'message_direction'],
+        ]
+
+    def __unicode__(self):
+        return u"%s summary for %s" % (self.day, self.account)
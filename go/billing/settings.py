@@ -25,6 +25,9 @@ ENDPOINT_DESCRIPTION_STRING = getattr(
 MONTHLY_STATEMENT_TITLE = getattr(
     settings, 'BILLING_MONTHLY_STATEMENT_TITLE', "Monthly Statement")
 
+CREDIT_BALANCE_CACHE_TTL = getattr(
+    settings, 'BILLING_CREDIT_BALANCE_CACHE_TTL', 60)
+
 STATEMENTS_PER_PAGE = getattr(
     settings, 'BILLING_STATEMENTS_PER_PAGE', 12)
 
@@ -1,21 +1,22 @@
-from datetime import date
+from datetime import date, datetime
 
 from dateutil.relativedelta import relativedelta
 
 from celery.task import task, group
 
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Sum, Max, Q
 
 from go.billing import settings
-from go.billing.models import Account, Transaction, Statement, LineItem
+from go.billing.models import (
+    Account, Transaction, Statement, LineItem, DailyTransactionSummary)
 
 
-@task()
-def generate_monthly_statement(account_id, from_date, to_date):
-    """Generate a new *Monthly* ``Statement`` for the given ``account_id``
-       between the given ``from_date`` and ``to_date``.
+def get_transaction_totals(account, from_date, to_date):
+    """Return the total cost of ``account``'s transactions between the
+       given ``from_date`` and ``to_date`` (inclusive), grouped by tag pool,
+       tag and message direction.
     """
-    account = Account.objects.get(id=account_id)
     transaction_list = Transaction.objects\
         .filter(account_number=account.account_number,
                 created__gte=from_date,
@@ -23,6 +24,139 @@ def generate_monthly_statement(account_id, from_date, to_date):
         .values('tag_pool_name', 'tag_name', 'message_direction')\
         .annotate(total_cost=Sum('credit_amount'))
 
+    return list(transaction_list)
+
+
+def get_summary_totals(account, from_date, to_date):
+    """Return the same totals as :func:`get_transaction_totals`, but
+       calculated from ``account``'s daily transaction summaries.
+    """
+    summary_list = DailyTransactionSummary.objects\
+        .filter(account=account, day__gte=from_date, day__lte=to_date)\
+        .values('tag_pool_name', 'tag_name', 'message_direction')\
+        .annotate(cost=Sum('total_cost'))
+
+    return [{
+        'tag_pool_name': summary['tag_pool_name'],
+        'tag_name': summary['tag_name'],
+        'message_direction': summary['message_direction'],
+        'total_cost': summary['cost'],
+    } for summary in summary_list]
+
+
+def _as_date(value):
+    # Depending on the database, ``DATE(...)`` is returned as a date, a
+    # datetime or a ``YYYY-MM-DD`` string.
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, basestring):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+
+def _with_day(transactions):
+    return transactions.extra(select={'day': 'DATE(created)'})
+
+
+@transaction.commit_on_success
+def summarise_transactions(account, today=None):
+    """Bring the ``DailyTransactionSummary`` records for ``account`` up to
+       date.
+
+       Days after the last finalised summary are processed, as well as any
+       finalised days with transactions that were created or modified since
+       they were last summarised. Summaries for days before ``today`` are
+       finalised, while the summaries for ``today`` are recalculated on the
+       next run.
+    """
+    if today is None:
+        today = date.today()
+    summarised_at = datetime.now()
+
+    # Lock the account so that concurrent runs for it don't try to create
+    # the same summaries.
+    Account.objects.select_for_update().get(pk=account.pk)
+
+    summaries = DailyTransactionSummary.objects.filter(account=account)
+    latest_day = summaries.filter(finalised=True)\
+        .aggregate(day=Max('day'))['day']
+    last_summarised_at = summaries\
+        .aggregate(summarised_at=Max('summarised_at'))['summarised_at']
+
+    transactions = Transaction.objects.filter(
+        account_number=account.account_number,
+        created__lt=(today + relativedelta(days=1)))
+    changed = transactions
+    if latest_day is not None:
+        new_or_modified = Q(created__gte=(latest_day + relativedelta(days=1)))
+        if last_summarised_at is not None:
+            new_or_modified |= Q(last_modified__gte=last_summarised_at)
+        changed = changed.filter(new_or_modified)
+
+    days = sorted(set(
+        _as_date(day) for day in
+        _with_day(changed).values_list('day', flat=True).distinct()))
+
+    summaries.filter(Q(finalised=False) | Q(day__in=days)).delete()
+    if not days:
+        return []
+
+    in_days = 'DATE(created) IN (%s)' % (', '.join(['%s'] * len(days)),)
+    totals = _with_day(transactions)\
+        .extra(where=[in_days], params=days)\
+        .values('day', 'tag_pool_name', 'tag_name', 'message_direction')\
+        .annotate(total_cost=Sum('credit_amount'))
+
+    summary_list = []
+    for total in totals:
+        day = _as_date(total['day'])
+        summary_list.append(DailyTransactionSummary(
+            account=account,
+            day=day,
+            tag_pool_name=total.get('tag_pool_name', ''),
+            tag_name=total.get('tag_name', ''),
+            message_direction=total.get('message_direction', ''),
+            total_cost=total.get('total_cost', 0),
+            finalised=(day < today),
+            summarised_at=summarised_at))
+
+    DailyTransactionSummary.objects.bulk_create(summary_list)
+    return summary_list
+
+
+@task()
+def summarise_account_transactions(account_id):
+    """Update the ``DailyTransactionSummary`` records for the given
+       ``account_id``.
+    """
+    account = Account.objects.get(id=account_id)
+    return len(summarise_transactions(account))
+
+
+@task()
+def summarise_all_account_transactions():
+    """Spawn sub-tasks to update the ``DailyTransactionSummary`` records for
+       all accounts.
+    """
+    task_list = []
+    for account in Account.objects.all():
+        task_list.append(summarise_account_transactions.s(account.id))
+
+    return group(task_list)()
+
+
+@task()
+def generate_monthly_statement(account_id, from_date, to_date):
+    """Generate a new *Monthly* ``Statement`` for the given ``account_id``
+       between the given ``from_date`` and ``to_date``.
+
+       The statement is built from the account's daily transaction
+       summaries, which are brought up to date first.
+    """
+    account = Account.objects.get(id=account_id)
+    summarise_transactions(account)
+    total_list = get_summary_totals(account, from_date, to_date)
+
     statement = Statement(
         account=account,
         title=settings.MONTHLY_STATEMENT_TITLE,
@@ -33,13 +167,13 @@ def generate_monthly_statement(account_id, from_date, to_date):
     statement.save()
 
     line_item_list = []
-    for transaction in transaction_list:
+    for total in total_list:
         line_item_list.append(LineItem(
             statement=statement,
-            tag_pool_name=transaction.get('tag_pool_name', ''),
-            tag_name=transaction.get('tag_name', ''),
-            message_direction=transaction.get('message_direction', ''),
-            total_cost=transaction.get('total_cost', 0)))
+            tag_pool_name=total.get('tag_pool_name', ''),
+            tag_name=total.get('tag_name', ''),
+            message_direction=total.get('message_direction', ''),
+            total_cost=total.get('total_cost', 0)))
 
     statement.lineitem_set.bulk_create(line_item_list)
     return statement
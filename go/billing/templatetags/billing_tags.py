@@ -1,20 +1,41 @@
 from django import template
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils.translation import ungettext
 
+from go.billing.cache import credit_balance_cache
+from go.billing.models import Account
+
 register = template.Library()
 
 
+def get_credit_balance(account_number):
+    """Return the credit balance for ``account_number``, preferably from
+    the credit balance cache.
+    """
+    credit_balance = credit_balance_cache.get(account_number)
+    if credit_balance is not None:
+        return credit_balance
+
+    version = credit_balance_cache.get_version(account_number)
+    credit_balances = Account.objects.filter(
+        account_number=account_number).values_list(
+            'credit_balance', flat=True)
+    if not credit_balances:
+        return 0
+    credit_balance = credit_balances[0]
+    credit_balance_cache.set(account_number, credit_balance, version)
+    return credit_balance
+
+
 @register.simple_tag
 def credit_balance(user):
-    """Return the credit balance for the given ``user``'s account.
-
-    If the user has multiple accounts, the first one's balance is returned.
-    """
+    """Return the credit balance for the given ``user``'s account."""
     try:
-        account = user.account_set.all()[0]
-        credit_balance = account.credit_balance
-    except IndexError:
+        account_number = user.get_profile().user_account
+    except ObjectDoesNotExist:
         credit_balance = 0
+    else:
+        credit_balance = get_credit_balance(account_number)
 
     return ungettext(
         "%(credit_balance)d credit",
@@ -9,6 +9,7 @@ from vumi.tests.helpers import VumiTestCase
 
 from go.billing import settings as app_settings
 from go.billing import api
+from go.billing.cache import credit_balance_cache
 from go.billing.models import MessageCost
 from go.billing.utils import DummySite, DictRowConnectionPool, JSONDecoder
 
@@ -49,10 +50,12 @@ class BillingApiTestCase(VumiTestCase):
     @inlineCallbacks
     def tearDown(self):
         for table in ('billing_transaction', 'billing_messagecost',
-                      'billing_tagpool', 'billing_account'):
+                      'billing_tagpool', 'billing_lowcreditalert',
+                      'billing_account'):
             yield self.connection_pool.runOperation(
                 'DELETE FROM %s' % (table,))
         self.connection_pool.close()
+        credit_balance_cache.clear()
 
     @inlineCallbacks
     def call_api(self, method, path, **kw):
@@ -104,6 +107,13 @@ class BillingApiTestCase(VumiTestCase):
         """
         return self.call_api('get', 'accounts/%s' % (account_number,))
 
+    def get_api_credit_balance(self, account_number):
+        """
+        Retrieve the credit balance of an account by account number.
+        """
+        return self.call_api(
+            'get', 'accounts/%s/credit_balance' % (account_number,))
+
     def get_api_account_list(self):
         """
         Retrieve a list of all accounts.
@@ -173,6 +183,19 @@ class BillingApiTestCase(VumiTestCase):
         }
         return self.call_api('get', 'transactions', args=args)
 
+    def get_api_transaction_page(self, account_number, cursor="",
+                                 items_per_page=20):
+        """
+        Retrieve a cursor-based page of transactions for a given account
+        number.
+        """
+        args = {
+            'account_number': account_number,
+            'cursor': cursor,
+            'items_per_page': items_per_page,
+        }
+        return self.call_api('get', 'transactions', args=args)
+
 
 class TestUser(BillingApiTestCase):
 
@@ -239,6 +262,36 @@ class TestAccount(BillingApiTestCase):
         [my_account] = yield self.get_api_account_list()
         self.assertEqual(my_account, account)
 
+    @inlineCallbacks
+    def test_credit_balance(self):
+        yield self.create_api_user(email="test2@example.com")
+        yield self.create_api_account(email="test2@example.com")
+        self.assertEqual(credit_balance_cache.get("12345"), None)
+
+        balance = yield self.get_api_credit_balance("12345")
+        self.assertEqual(balance, {
+            "account_number": "12345",
+            "credit_balance": decimal.Decimal('0.0'),
+        })
+        self.assertEqual(
+            credit_balance_cache.get("12345"), decimal.Decimal('0.0'))
+
+        # Loading credits updates the cached balance
+        yield self.load_api_account_credits("12345", 100)
+        self.assertEqual(
+            credit_balance_cache.get("12345"), decimal.Decimal('100.0'))
+        balance = yield self.get_api_credit_balance("12345")
+        self.assertEqual(balance['credit_balance'], decimal.Decimal('100.0'))
+
+    @inlineCallbacks
+    def test_credit_balance_unknown_account(self):
+        try:
+            yield self.get_api_credit_balance("unknown-account")
+        except ApiCallError, e:
+            self.assertEqual(e.response.responseCode, 404)
+        else:
+            self.fail("Expected an unknown account to be rejected.")
+
 
 class TestCost(BillingApiTestCase):
 
@@ -559,3 +612,198 @@ class TestTransaction(BillingApiTestCase):
             ("Unable to find billing account unknown-account while"
              " checking credit balance. Message was Outbound to/from"
              " tag pool some-random-pool.",))
+
+    @inlineCallbacks
+    def create_transactions(self, account_number, count):
+        yield self.create_api_cost(
+            tag_pool_name="test_pool",
+            message_direction="Outbound",
+            message_cost=0.1, session_cost=0.2,
+            markup_percent=10.0)
+        for i in range(count):
+            yield self.create_api_transaction(
+                account_number=account_number,
+                message_id='msg-id-%d' % (i,),
+                tag_pool_name="test_pool",
+                tag_name="12345",
+                message_direction="Outbound",
+                session_created=False)
+
+    @inlineCallbacks
+    def test_transaction_page_cursor(self):
+        yield self.create_api_user(email="test6@example.com")
+        account = yield self.create_api_account(
+            email="test6@example.com", account_number="22222")
+        yield self.create_transactions(account['account_number'], 5)
+
+        all_transactions = yield self.get_api_transaction_list(
+            account['account_number'])
+        self.assertEqual(len(all_transactions), 5)
+
+        pages = []
+        cursor = ""
+        while cursor is not None:
+            page = yield self.get_api_transaction_page(
+                account['account_number'], cursor=cursor, items_per_page=2)
+            pages.append([t['id'] for t in page['transactions']])
+            cursor = page['next_cursor']
+
+        self.assertEqual(
+            pages, [[t['id'] for t in all_transactions[i:i + 2]]
+                    for i in range(0, 5, 2)])
+
+    @inlineCallbacks
+    def test_transaction_page_cursor_exact_multiple(self):
+        yield self.create_api_user(email="test7@example.com")
+        account = yield self.create_api_account(
+            email="test7@example.com", account_number="33333")
+        yield self.create_transactions(account['account_number'], 2)
+
+        page = yield self.get_api_transaction_page(
+            account['account_number'], items_per_page=2)
+        self.assertEqual(len(page['transactions']), 2)
+        self.assertEqual(page['next_cursor'], None)
+
+    @inlineCallbacks
+    def test_transaction_page_empty(self):
+        page = yield self.get_api_transaction_page("unknown-account")
+        self.assertEqual(page, {'transactions': [], 'next_cursor': None})
+
+    @inlineCallbacks
+    def test_transaction_page_invalid_cursor(self):
+        try:
+            yield self.get_api_transaction_page("12345", cursor="bad-cursor")
+        except ApiCallError, e:
+            self.assertEqual(e.response.responseCode, 400)
+        else:
+            self.fail("Expected an invalid cursor to be rejected.")
+
+
+class TestLowCreditAlert(BillingApiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        yield super(TestLowCreditAlert, self).setUp()
+        yield self.create_api_user(email="test8@example.com")
+        self.account = yield self.create_api_account(
+            email="test8@example.com", account_number="44444")
+        yield self.connection_pool.runOperation(
+            "UPDATE billing_account SET alert_threshold = 50"
+            " WHERE account_number = %(account_number)s",
+            {'account_number': self.account['account_number']})
+        yield self.create_api_cost(
+            tag_pool_name="test_pool",
+            message_direction="Outbound",
+            message_cost=3.0, session_cost=0.0,
+            markup_percent=0.0)
+        self.credit_amount = MessageCost.calculate_credit_cost(
+            decimal.Decimal('3.0'), decimal.Decimal('0.0'),
+            decimal.Decimal('0.0'), session_created=False)
+
+    def send_message(self):
+        return self.create_api_transaction(
+            account_number=self.account['account_number'],
+            message_id='msg-id',
+            tag_pool_name="test_pool",
+            tag_name="12345",
+            message_direction="Outbound",
+            session_created=False)
+
+    def get_alerts(self):
+        return self.connection_pool.runQuery(
+            "SELECT alert_threshold, alert_credit_balance, credit_balance,"
+            " cleared FROM billing_lowcreditalert ORDER BY id")
+
+    @inlineCallbacks
+    def test_alert_raised_once_per_threshold(self):
+        yield self.load_api_account_credits(
+            self.account['account_number'], self.credit_amount * 3)
+        alert_credit_balance = self.credit_amount * 3 / 2
+
+        yield self.send_message()
+        alerts = yield self.get_alerts()
+        self.assertEqual(alerts, [])
+
+        # The balance drops below the threshold
+        yield self.send_message()
+        [alert] = yield self.get_alerts()
+        self.assertEqual(alert['alert_threshold'], decimal.Decimal('50.0'))
+        self.assertEqual(alert['alert_credit_balance'], alert_credit_balance)
+        self.assertEqual(alert['credit_balance'], self.credit_amount)
+        self.assertEqual(alert['cleared'], False)
+
+        # The balance stays below the threshold
+        yield self.send_message()
+        alerts = yield self.get_alerts()
+        self.assertEqual(len(alerts), 1)
+
+    @inlineCallbacks
+    def test_alert_raised_when_leaving_threshold(self):
+        # The threshold is one message's worth of credits.
+        yield self.load_api_account_credits(
+            self.account['account_number'], self.credit_amount * 2)
+
+        # The balance drops to exactly the threshold, which isn't below it.
+        yield self.send_message()
+        alerts = yield self.get_alerts()
+        self.assertEqual(alerts, [])
+
+        # The balance drops below the threshold from exactly the threshold.
+        yield self.send_message()
+        [alert] = yield self.get_alerts()
+        self.assertEqual(alert['alert_credit_balance'], self.credit_amount)
+        self.assertEqual(alert['credit_balance'], 0)
+
+    @inlineCallbacks
+    def test_alert_not_duplicated_for_same_threshold(self):
+        yield self.load_api_account_credits(
+            self.account['account_number'], self.credit_amount * 2)
+
+        # Drop below the threshold
+        yield self.send_message()
+        yield self.send_message()
+        # Move back above the threshold without loading credits and drop
+        # below it again.
+        yield self.connection_pool.runOperation(
+            "UPDATE billing_account SET credit_balance = %(credit_balance)s"
+            " WHERE account_number = %(account_number)s",
+            {'credit_balance': self.credit_amount * 2,
+             'account_number': self.account['account_number']})
+        yield self.send_message()
+        yield self.send_message()
+
+        alerts = yield self.get_alerts()
+        self.assertEqual(len(alerts), 1)
+
+    @inlineCallbacks
+    def test_alert_cleared_by_credit_load(self):
+        yield self.load_api_account_credits(
+            self.account['account_number'], self.credit_amount * 2)
+        yield self.send_message()
+        yield self.send_message()
+        [alert] = yield self.get_alerts()
+        self.assertEqual(alert['cleared'], False)
+
+        yield self.load_api_account_credits(
+            self.account['account_number'], self.credit_amount * 3)
+        [alert] = yield self.get_alerts()
+        self.assertEqual(alert['cleared'], True)
+
+        # The new balance is three messages' worth of credits, so the
+        # threshold is now one and a half messages' worth.
+        yield self.send_message()
+        yield self.send_message()
+        alerts = yield self.get_alerts()
+        self.assertEqual(
+            [a['cleared'] for a in alerts], [True, False])
+        self.assertEqual(
+            alerts[1]['alert_credit_balance'], self.credit_amount * 3 / 2)
+
+    @inlineCallbacks
+    def test_credit_balance_cache_updated(self):
+        yield self.load_api_account_credits(
+            self.account['account_number'], self.credit_amount * 2)
+        yield self.send_message()
+        self.assertEqual(
+            credit_balance_cache.get(self.account['account_number']),
+            self.credit_amount)
@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+from go.base.tests.helpers import GoDjangoTestCase, DjangoVumiApiHelper
+from go.billing.cache import CreditBalanceCache, credit_balance_cache
+from go.billing.models import Account
+from go.billing.templatetags import billing_tags
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def get_time(self):
+        return self.now
+
+
+class TestCreditBalanceCache(GoDjangoTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = CreditBalanceCache(ttl=60, get_time=self.clock.get_time)
+
+    def test_get_missing(self):
+        self.assertEqual(self.cache.get("12345"), None)
+
+    def test_set_and_get(self):
+        version = self.cache.get_version("12345")
+        self.assertTrue(self.cache.set("12345", Decimal('10.0'), version))
+        self.assertEqual(self.cache.get("12345"), Decimal('10.0'))
+
+    def test_get_expired(self):
+        self.cache.set("12345", Decimal('10.0'), 0)
+        self.clock.advance(59)
+        self.assertEqual(self.cache.get("12345"), Decimal('10.0'))
+        self.clock.advance(1)
+        self.assertEqual(self.cache.get("12345"), None)
+
+    def test_invalidate(self):
+        self.cache.set("12345", Decimal('10.0'), 0)
+        self.assertEqual(self.cache.invalidate("12345"), 1)
+        self.assertEqual(self.cache.get("12345"), None)
+        self.assertEqual(self.cache.get_version("12345"), 1)
+
+    def test_set_stale_version(self):
+        version = self.cache.get_version("12345")
+        # The balance changes while an older balance is being read.
+        self.cache.update("12345", Decimal('5.0'))
+        self.assertFalse(self.cache.set("12345", Decimal('10.0'), version))
+        self.assertEqual(self.cache.get("12345"), Decimal('5.0'))
+
+    def test_update(self):
+        self.cache.update("12345", Decimal('5.0'))
+        self.assertEqual(self.cache.get("12345"), Decimal('5.0'))
+        self.cache.update("12345", Decimal('4.0'))
+        self.assertEqual(self.cache.get("12345"), Decimal('4.0'))
+
+    def test_clear(self):
+        self.cache.update("12345", Decimal('5.0'))
+        self.cache.update("54321", Decimal('4.0'))
+        self.cache.clear()
+        self.assertEqual(self.cache.get("12345"), None)
+        self.assertEqual(self.cache.get("54321"), None)
+
+
+class TestCreditBalanceTag(GoDjangoTestCase):
+    def setUp(self):
+        self.vumi_helper = self.add_helper(DjangoVumiApiHelper())
+        self.user_helper = self.vumi_helper.make_django_user()
+        self.add_cleanup(credit_balance_cache.clear)
+        credit_balance_cache.clear()
+        self.account = Account.objects.get(
+            user=self.user_helper.get_django_user())
+
+    def test_credit_balance(self):
+        self.account.credit_balance = Decimal('5.0')
+        self.account.save()
+        self.assertEqual(
+            billing_tags.credit_balance(self.user_helper.get_django_user()),
+            "5 credits")
+
+    def test_credit_balance_cached(self):
+        user = self.user_helper.get_django_user()
+        self.assertEqual(billing_tags.credit_balance(user), "0 credits")
+        # Balance changes made in other processes aren't seen until the
+        # cached balance expires.
+        Account.objects.filter(pk=self.account.pk).update(
+            credit_balance=Decimal('5.0'))
+        self.assertEqual(billing_tags.credit_balance(user), "0 credits")
+        credit_balance_cache.invalidate(self.account.account_number)
+        self.assertEqual(billing_tags.credit_balance(user), "5 credits")
+
+    def test_account_save_updates_cache(self):
+        self.account.credit_balance = Decimal('1.0')
+        self.account.save()
+        self.assertEqual(
+            credit_balance_cache.get(self.account.account_number),
+            Decimal('1.0'))
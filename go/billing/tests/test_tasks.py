@@ -1,13 +1,14 @@
 import mock
 
-from datetime import date
+from datetime import date, datetime
 
 from decimal import Decimal
 
 from dateutil.relativedelta import relativedelta
 
 from go.base.tests.helpers import GoDjangoTestCase, DjangoVumiApiHelper
-from go.billing.models import MessageCost, Account, Transaction, Statement
+from go.billing.models import (
+    MessageCost, Account, Transaction, Statement, DailyTransactionSummary)
 from go.billing import tasks
 
 
@@ -78,3 +79,173 @@ class TestMonthlyStatementTask(GoDjangoTestCase):
 
         self.assertEqual(result, statement)
         self.assertEqual(statement.lineitem_set.count(), 2)
+
+
+class TestTransactionSummaryTasks(GoDjangoTestCase):
+
+    def setUp(self):
+        self.vumi_helper = self.add_helper(DjangoVumiApiHelper())
+        self.user_helper = self.vumi_helper.make_django_user()
+        self.account = Account.objects.get(
+            user=self.user_helper.get_django_user())
+
+    def _mk_transaction(self, created, tag_pool_name='pool1',
+                        tag_name="tag1",
+                        message_direction=MessageCost.DIRECTION_INBOUND,
+                        credit_amount=28):
+        transaction = Transaction(
+            account_number=self.account.account_number,
+            tag_pool_name=tag_pool_name,
+            tag_name=tag_name,
+            message_direction=message_direction,
+            message_cost=100,
+            markup_percent=Decimal('10.0'),
+            credit_factor=Decimal('0.25'),
+            credit_amount=credit_amount,
+            status=Transaction.STATUS_COMPLETED)
+        transaction.save()
+        # `created` is set automatically on save, so we override it here.
+        Transaction.objects.filter(pk=transaction.pk).update(created=created)
+        return transaction
+
+    def _mk_month_of_transactions(self):
+        # Just outside the month.
+        self._mk_transaction(datetime(2014, 2, 28, 23, 59, 59, 999999))
+        self._mk_transaction(datetime(2014, 4, 1, 0, 0, 0))
+        # Edge days of the month.
+        self._mk_transaction(datetime(2014, 3, 1, 0, 0, 0))
+        self._mk_transaction(
+            datetime(2014, 3, 1, 12, 0, 0), tag_name="tag2")
+        self._mk_transaction(
+            datetime(2014, 3, 31, 23, 59, 59, 999999),
+            message_direction=MessageCost.DIRECTION_OUTBOUND)
+        # Days in the middle of the month.
+        self._mk_transaction(
+            datetime(2014, 3, 15, 8, 0, 0), credit_amount=Decimal('1.5'))
+        self._mk_transaction(
+            datetime(2014, 3, 16, 8, 0, 0), tag_pool_name='pool2')
+
+    def assert_totals_equal(self, totals1, totals2):
+        def sort_key(total):
+            return (total['tag_pool_name'], total['tag_name'],
+                    total['message_direction'])
+
+        self.assertEqual(
+            sorted(totals1, key=sort_key), sorted(totals2, key=sort_key))
+
+    def assert_summary_totals_correct(self, from_date, to_date):
+        self.assert_totals_equal(
+            tasks.get_summary_totals(self.account, from_date, to_date),
+            tasks.get_transaction_totals(self.account, from_date, to_date))
+
+    def test_summarise_transactions(self):
+        self._mk_month_of_transactions()
+        tasks.summarise_transactions(self.account, today=date(2014, 5, 1))
+
+        self.assert_summary_totals_correct(date(2014, 3, 1), date(2014, 3, 31))
+        self.assert_summary_totals_correct(date(2014, 2, 1), date(2014, 2, 28))
+        self.assert_summary_totals_correct(date(2014, 4, 1), date(2014, 4, 30))
+        self.assert_summary_totals_correct(
+            date(2014, 3, 15), date(2014, 3, 15))
+
+        summaries = DailyTransactionSummary.objects.filter(
+            account=self.account)
+        self.assertEqual(
+            sorted(set(s.day for s in summaries)),
+            [date(2014, 2, 28), date(2014, 3, 1), date(2014, 3, 15),
+             date(2014, 3, 16), date(2014, 3, 31), date(2014, 4, 1)])
+        self.assertTrue(all(s.finalised for s in summaries))
+
+    def test_summarise_transactions_finalises_past_days(self):
+        self._mk_transaction(datetime(2014, 3, 1, 12, 0, 0))
+        self._mk_transaction(datetime(2014, 3, 2, 12, 0, 0))
+        tasks.summarise_transactions(self.account, today=date(2014, 3, 2))
+
+        [finalised] = DailyTransactionSummary.objects.filter(
+            account=self.account, finalised=True)
+        self.assertEqual(finalised.day, date(2014, 3, 1))
+        [unfinalised] = DailyTransactionSummary.objects.filter(
+            account=self.account, finalised=False)
+        self.assertEqual(unfinalised.day, date(2014, 3, 2))
+
+        self._mk_transaction(datetime(2014, 3, 2, 13, 0, 0))
+        tasks.summarise_transactions(self.account, today=date(2014, 3, 3))
+
+        summaries = DailyTransactionSummary.objects.filter(
+            account=self.account).order_by('day')
+        self.assertEqual(
+            [(s.day, s.total_cost, s.finalised) for s in summaries],
+            [(date(2014, 3, 1), Decimal('28.0'), True),
+             (date(2014, 3, 2), Decimal('56.0'), True)])
+
+    def test_summarise_transactions_resummarises_changed_days(self):
+        self._mk_transaction(datetime(2014, 3, 1, 12, 0, 0))
+        self._mk_transaction(datetime(2014, 3, 2, 12, 0, 0))
+        tasks.summarise_transactions(self.account, today=date(2014, 3, 3))
+        untouched = DailyTransactionSummary.objects.get(
+            account=self.account, day=date(2014, 3, 2))
+
+        # This transaction lands on a day that has already been finalised.
+        self._mk_transaction(datetime(2014, 3, 1, 13, 0, 0))
+        tasks.summarise_transactions(self.account, today=date(2014, 3, 4))
+
+        summaries = DailyTransactionSummary.objects.filter(
+            account=self.account).order_by('day')
+        self.assertEqual(
+            [(s.day, s.total_cost, s.finalised) for s in summaries],
+            [(date(2014, 3, 1), Decimal('56.0'), True),
+             (date(2014, 3, 2), Decimal('28.0'), True)])
+        # Finalised days without changed transactions are left alone.
+        self.assertEqual(
+            DailyTransactionSummary.objects.get(
+                account=self.account, day=date(2014, 3, 2)).pk,
+            untouched.pk)
+
+    def test_summarise_transactions_nothing_to_do(self):
+        self._mk_transaction(datetime(2014, 3, 1, 12, 0, 0))
+        tasks.summarise_transactions(self.account, today=date(2014, 3, 2))
+        self.assertEqual(
+            tasks.summarise_transactions(self.account, today=date(2014, 3, 2)),
+            [])
+        self.assertEqual(
+            DailyTransactionSummary.objects.filter(
+                account=self.account).count(), 1)
+
+    def test_summarise_account_transactions(self):
+        self._mk_transaction(datetime(2014, 3, 1, 12, 0, 0))
+        self.assertEqual(
+            tasks.summarise_account_transactions(self.account.id), 1)
+        self.assertEqual(
+            DailyTransactionSummary.objects.filter(
+                account=self.account).count(), 1)
+
+    @mock.patch('go.billing.tasks.summarise_account_transactions.s',
+                new_callable=mock.MagicMock)
+    def test_summarise_all_account_transactions(self, s):
+        tasks.summarise_all_account_transactions()
+        s.assert_called_with(self.account.id)
+
+    def test_monthly_statement_from_summaries(self):
+        self._mk_month_of_transactions()
+        from_date = date(2014, 3, 1)
+        to_date = date(2014, 3, 31)
+
+        statement = tasks.generate_monthly_statement(
+            self.account.id, from_date, to_date)
+
+        line_items = [{
+            'tag_pool_name': item.tag_pool_name,
+            'tag_name': item.tag_name,
+            'message_direction': item.message_direction,
+            'total_cost': item.total_cost,
+        } for item in statement.lineitem_set.all()]
+        expected_line_items = [{
+            'tag_pool_name': total['tag_pool_name'],
+            'tag_name': total['tag_name'],
+            'message_direction': total['message_direction'],
+            'total_cost': int(total['total_cost']),
+        } for total in tasks.get_transaction_totals(
+            self.account, from_date, to_date)]
+
+        self.assertEqual(len(line_items), 4)
+        self.assert_totals_equal(line_items, expected_line_items)
@@ -39,37 +39,76 @@ def obsolete_router_types():
     return set(_VUMI_OBSOLETE_ROUTERS)
 
 
-def get_conversation_pkg(conversation_type, fromlist):
+def _conversation_module(conversation_type):
     for module, data in _VUMI_INSTALLED_APPS.iteritems():
         if data['namespace'] == conversation_type:
-            app_pkg = __import__(module,
-                                 fromlist=fromlist)
-            return app_pkg
+            return module
     raise UnknownConversationType(
         "Can't find python package for conversation type: %r"
         % (conversation_type,))
 
 
-def get_router_pkg(router_type, fromlist=()):
+def _router_module(router_type):
     for module, data in _VUMI_INSTALLED_ROUTERS.iteritems():
         if data['namespace'] == router_type:
-            router_pkg = __import__(module,
-                                 fromlist=fromlist)
-            return router_pkg
+            return module
     raise UnknownRouterType(
         "Can't find python package for router type: %r"
         % (router_type,))
 
 
+def get_conversation_pkg(conversation_type, fromlist):
+    return __import__(_conversation_module(conversation_type),
+                      fromlist=fromlist)
+
+
+def get_router_pkg(router_type, fromlist=()):
+    return __import__(_router_module(router_type), fromlist=fromlist)
+
+
+def _get_definition_class(module, class_name):
+    # Cached by module rather than namespace so that changes to the
+    # installed apps and routers (e.g. in tests) are still respected.
+    key = (module, class_name)
+    if key not in _DEFINITION_CLASSES:
+        pkg = __import__(module, fromlist=['definition'])
+        _DEFINITION_CLASSES[key] = getattr(pkg.definition, class_name)
+    return _DEFINITION_CLASSES[key]
+
+
+def get_conversation_definition_class(conversation_type):
+    return _get_definition_class(
+        _conversation_module(conversation_type), 'ConversationDefinition')
+
+
+def get_router_definition_class(router_type):
+    return _get_definition_class(
+        _router_module(router_type), 'RouterDefinition')
+
+
 def get_conversation_definition(conversation_type, conv=None):
-    app_pkg = get_conversation_pkg(conversation_type, ['definition'])
-    return app_pkg.definition.ConversationDefinition(conv)
+    return get_conversation_definition_class(conversation_type)(conv)
 
 
 def get_router_definition(router_type, router=None):
-    router_pkg = get_router_pkg(router_type, ['definition'])
-    return router_pkg.definition.RouterDefinition(router)
+    return get_router_definition_class(router_type)(router)
+
+
+def load_definitions():
+    """Import and cache the definition classes of all installed
+       conversation and router types.
+
+       Definition classes are otherwise loaded the first time each type is
+       used. This may be called at startup to avoid that.
+       """
+    for data in _VUMI_INSTALLED_APPS.itervalues():
+        get_conversation_definition_class(data['namespace'])
+    for data in _VUMI_INSTALLED_ROUTERS.itervalues():
+        get_router_definition_class(data['namespace'])
+
 
+# Definition classes already imported, keyed by (module, class name).
+_DEFINITION_CLASSES = {}
 
 _VUMI_INSTALLED_APPS = {
     'go.apps.bulk_message': {
@@ -0,0 +1,176 @@
+# -*- test-case-name: go.contacts.tests -*-
+
+from multiprocessing.pool import ThreadPool
+from threading import local
+
+
+class GroupMemberDeletion(object):
+    """
+    Removes every member of a contact group from the group, or deletes
+    every member of the group, a chunk of contacts at a time.
+
+    Member keys are fetched from the group's secondary indexes a page of
+    `chunk_size` keys at a time and the contacts in each page are processed
+    by up to `concurrency` threads. Riak and Redis clients aren't shared
+    between threads, so each thread gets a contact store of its own from
+    `store_factory`. Without a `store_factory`, contacts are processed one
+    at a time using `contact_store`.
+
+    Every processed contact is recorded in Redis so that progress can be
+    polled through :meth:`get_progress`. A contact stops being a member of
+    the group once it has been processed, so a job that is interrupted
+    resumes where it stopped when it is run again.
+
+    This uses a synchronous contact store and is intended to be run from a
+    Celery task.
+    """
+
+    ACTIONS = ('remove', 'delete')
+
+    # Number of member keys to fetch and process at a time
+    CHUNK_SIZE = 100
+    # Number of contacts in a chunk that are processed at the same time
+    CONCURRENCY = 10
+    # How long a finished job's progress is kept in seconds
+    FINISHED_TTL = 60 * 60
+
+    def __init__(self, contact_store, group_key, action, chunk_size=None,
+                 concurrency=None, store_factory=None):
+        if action not in self.ACTIONS:
+            raise ValueError("Unknown group deletion action: %r" % (action,))
+        self.contact_store = contact_store
+        self.group_key = group_key
+        self.action = action
+        self.redis = self.progress_redis(contact_store)
+        if chunk_size is not None:
+            self.CHUNK_SIZE = chunk_size
+        if concurrency is not None:
+            self.CONCURRENCY = concurrency
+        self.store_factory = store_factory
+        self._thread_state = local()
+
+    def progress_redis(self, contact_store):
+        return contact_store.redis.sub_manager(
+            'group_deletion:%s:%s' % (self.action, self.group_key))
+
+    def get_progress(self):
+        """
+        Return a dict containing the `total` number of contacts to process,
+        the number `processed` so far and whether the job is `finished`, or
+        `None` if the job hasn't been started.
+        """
+        progress = self.redis.hgetall('progress')
+        if not progress:
+            return None
+        return {
+            'total': int(progress['total']),
+            'processed': self.redis.scard('processed'),
+            'finished': progress['state'] == 'finished',
+        }
+
+    def count_members(self, group):
+        if self.action == 'remove':
+            return self.contact_store.contacts.index_lookup(
+                'groups', group.key).get_count()
+        return self.contact_store.count_contacts_for_group(group)
+
+    def get_index_pages(self, field_name, group):
+        page = self.contact_store.contacts.index_keys_page(
+            field_name, group.key, max_results=self.CHUNK_SIZE)
+        while page is not None:
+            keys = list(page)
+            if keys:
+                yield keys
+            page = page.next_page() if page.has_next_page() else None
+
+    def get_member_pages(self, group):
+        """
+        Yield pages of the keys of the group's remaining members. The next
+        page is only fetched once the previous one has been processed.
+        """
+        for keys in self.get_index_pages('groups', group):
+            yield keys
+        if self.action == 'remove' or not group.is_smart_group():
+            return
+        if self.contact_store.smart_group_is_materialized(group):
+            for keys in self.get_index_pages('smart_groups', group):
+                yield keys
+        else:
+            # Riak search results can't be paged through an index.
+            keys = self.contact_store.contacts.raw_search(
+                group.query).get_keys()
+            for i in range(0, len(keys), self.CHUNK_SIZE):
+                yield keys[i:i + self.CHUNK_SIZE]
+
+    def get_thread_store(self):
+        """
+        Return the calling thread's contact store and the Redis manager its
+        progress is recorded with.
+        """
+        if self.store_factory is None:
+            return self.contact_store, self.redis
+        state = self._thread_state
+        if not hasattr(state, 'contact_store'):
+            state.contact_store = self.store_factory()
+            state.redis = self.progress_redis(state.contact_store)
+        return state.contact_store, state.redis
+
+    def process_contact(self, contact_key):
+        contact_store, redis = self.get_thread_store()
+        contact = contact_store.contacts.load(contact_key)
+        if contact is not None:
+            if self.action == 'remove':
+                old_data = contact.get_data()
+                contact.groups.remove_key(self.group_key)
+                contact_store.save_contact(contact, old_data)
+            else:
+                contact_store.delete_contact(contact)
+        # A contact that is already gone may have been deleted by a
+        # previous run of this job.
+        redis.sadd('processed', contact_key)
+
+    def run(self):
+        """
+        Process all the group's remaining members and return the number of
+        contacts processed by this run.
+
+        If the action is `remove`, the group itself is deleted once it has
+        no members left.
+        """
+        group = self.contact_store.get_group(self.group_key)
+        if group is None:
+            return 0
+        if self.redis.hget('progress', 'state') == 'finished':
+            # A new job for a group whose members were processed before.
+            self.redis.delete('progress')
+            self.redis.delete('processed')
+        if not self.redis.exists('progress'):
+            self.redis.hmset('progress', {
+                'total': self.count_members(group),
+                'state': 'running',
+            })
+
+        processed = 0
+        if self.store_factory is None:
+            pool = None
+        else:
+            pool = ThreadPool(self.CONCURRENCY)
+        try:
+            for page in self.get_member_pages(group):
+                if pool is None:
+                    for contact_key in page:
+                        self.process_contact(contact_key)
+                else:
+                    pool.map(self.process_contact, page)
+                processed += len(page)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if self.action == 'remove':
+            self.contact_store.delete_group(group)
+        self.redis.hmset('progress', {'state': 'finished'})
+        self.redis.expire('progress', self.FINISHED_TTL)
+        self.redis.expire('processed', self.FINISHED_TTL)
+        return processed
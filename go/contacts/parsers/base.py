@@ -1,10 +1,16 @@
 import os.path
+import sys
+from itertools import chain
 
 from django.core.files.storage import default_storage
 
 from vumi.utils import load_class, normalize_msisdn
 
 
+# Marks values for fields that are missing from a row.
+MISSING = object()
+
+
 class ContactParserException(Exception):
     pass
 
@@ -50,9 +56,15 @@ class FieldNormalizer(object):
     def __iter__(self):
         return iter(self.normalizers)
 
+    def get_normalizer(self, name):
+        """
+        Return the function that normalizes values for the normalizer
+        called `name`. Unknown normalizers return values as is.
+        """
+        return getattr(self, 'normalize_%s' % (name,), lambda v: v)
+
     def normalize(self, name, value):
-        normalizer = getattr(self, 'normalize_%s' % (name,), lambda v: v)
-        return normalizer(value)
+        return self.get_normalizer(name)(value)
 
     def normalize_string(self, value):
         if value is not None:
@@ -86,16 +98,28 @@ class FieldNormalizer(object):
                 string = string[len(chop):]
         return string
 
-    def do_msisdn(self, value, country_code):
-        value = self.normalize_string(value)
-        value = self.lchop(value, ['+'])
-        float_value = self.normalize_float(value)
-        if not (self.is_numeric(value) and float_value.is_integer()):
+    def msisdn_digits(self, value, chops):
+        """
+        Return the digits of the MSISDN `value` as a unicode string, after
+        removing any of the prefixes in `chops`. MSISDNs read from XLS files
+        are floats, so `761234567.0` becomes `u'761234567'`.
+        """
+        value = self.lchop(value, chops)
+        try:
+            float_value = float(value)
+        except ValueError:
+            float_value = None
+        if float_value is None or not float_value.is_integer():
             raise FieldNormalizerException('Invalid MSISDN: %s' % (value,))
+        if not float_value:
+            return unicode(float_value)
+        return unicode(int(float_value))
 
-        msisdn = self.normalize_string(self.normalize_integer(float_value))
-        msisdn = self.lchop(msisdn, [country_code])
-        msisdn = '0%s' % (msisdn,)
+    def do_msisdn(self, value, country_code):
+        msisdn = self.msisdn_digits(value, ['+'])
+        if msisdn.startswith(country_code):
+            msisdn = msisdn[len(country_code):]
+        msisdn = u'0%s' % (msisdn,)
         return self.normalize_string(normalize_msisdn(msisdn, country_code))
 
     def normalize_msisdn_za(self, value):
@@ -120,13 +144,7 @@ class FieldNormalizer(object):
         return self.do_msisdn(value, '255')
 
     def normalize_msisdn_int(self, value):
-        value = self.normalize_string(value)
-        value = self.lchop(value, ['+', '00'])
-        float_value = self.normalize_float(value)
-        if not (self.is_numeric(value) and float_value.is_integer()):
-            raise FieldNormalizerException('Invalid MSISDN: %s' % (value,))
-
-        msisdn = self.normalize_string(self.normalize_integer(float_value))
+        msisdn = self.msisdn_digits(value, ['+', '00'])
         country_code = msisdn[:3]
         return self.normalize_string(normalize_msisdn(msisdn, country_code))
 
@@ -154,6 +172,9 @@ class ContactFileParser(object):
 
     SETTABLE_ATTRIBUTES = set(DEFAULT_HEADERS.keys())
 
+    # The number of rows to normalize at a time in `parse_file`.
+    CHUNK_SIZE = 1000
+
     def __init__(self):
         self.normalizer = FieldNormalizer()
 
@@ -223,32 +244,90 @@ class ContactFileParser(object):
         # order is important and needs to stay intact while being encoded
         # and decoded as JSON
         field_names = [field[0] for field in fields]
-        field_map = dict(fields)
-        # We're expecting a generator so loop over it and save as contacts
-        # in the contact_store, normalizing anything we need to
+        normalizer_plan = self.get_normalizer_plan(fields)
+        # We're expecting a generator so we read it a chunk at a time and
+        # normalize each chunk a column at a time, yielding contact
+        # dictionaries ready to be saved in the contact_store.
         data_dictionaries = self.read_data_from_file(
             file_path, field_names, has_header)
-        for data_dictionary in data_dictionaries:
-
-            # Populate this with whatever we'll be sending to the
-            # contact to be saved
-            contact_dictionary = {}
-            for key, value in data_dictionary.items():
-                value = self.normalizer.normalize(field_map[key], value)
-                if not isinstance(value, basestring):
-                    value = unicode(str(value), self.ENCODING,
-                                    self.ENCODING_ERRORS)
-                elif isinstance(value, str):
-                    value = unicode(value, self.ENCODING,
-                                    self.ENCODING_ERRORS)
-
+        for chunk in self.chunk_rows(data_dictionaries):
+            try:
+                contact_dictionaries = self.normalize_rows(
+                    normalizer_plan, chunk)
+            except Exception:
+                # Normalize the chunk a row at a time instead, so that the
+                # rows before the one that failed are still returned before
+                # the error is raised.
+                contact_dictionaries = chain.from_iterable(
+                    self.normalize_rows(normalizer_plan, [row])
+                    for row in chunk)
+            for contact_dictionary in contact_dictionaries:
+                yield contact_dictionary
+
+    def normalize_rows(self, normalizer_plan, rows):
+        """
+        Normalize a list of `rows` a column at a time and return a contact
+        dictionary for each row.
+        """
+        contact_dictionaries = [{} for _ in rows]
+        for key, normalizer, settable in normalizer_plan:
+            column = [row.get(key, MISSING) for row in rows]
+            values = [
+                value if value is MISSING else normalizer(value)
+                for value in column]
+            for contact_dictionary, value in zip(
+                    contact_dictionaries, values):
+                if value is MISSING:
+                    continue
+                value = self.to_unicode(value)
                 if value is None or value == '':
                     continue
 
-                if key in self.SETTABLE_ATTRIBUTES:
+                if settable:
                     contact_dictionary[key] = value
                 else:
                     extra = contact_dictionary.setdefault('extra', {})
                     extra[key] = value
+        return contact_dictionaries
+
+    def get_normalizer_plan(self, fields):
+        """
+        Resolve the normalizer for each of the `fields` once per file.
 
-            yield contact_dictionary
+        Returns a list of `(key, normalizer, settable)` tuples, where
+        `normalizer` is the function that normalizes values for the field
+        and `settable` is `True` if the field is one of the
+        SETTABLE_ATTRIBUTES rather than an `extra`.
+        """
+        return [
+            (key, self.normalizer.get_normalizer(normalizer_name),
+             key in self.SETTABLE_ATTRIBUTES)
+            for key, normalizer_name in fields]
+
+    def chunk_rows(self, rows):
+        """
+        Group the `rows` from `read_data_from_file` into lists of at most
+        CHUNK_SIZE rows.
+        """
+        chunk = []
+        try:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self.CHUNK_SIZE:
+                    yield chunk
+                    chunk = []
+        except Exception:
+            # Return the rows read before the error and then raise it.
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            if chunk:
+                yield chunk
+            raise exc_type, exc_value, exc_traceback
+        if chunk:
+            yield chunk
+
+    def to_unicode(self, value):
+        if not isinstance(value, basestring):
+            return unicode(str(value), self.ENCODING, self.ENCODING_ERRORS)
+        elif isinstance(value, str):
+            return unicode(value, self.ENCODING, self.ENCODING_ERRORS)
+        return value
@@ -148,6 +148,23 @@ class TestCSVParser(ParserTestCase):
             'name': 'Name 1',
         }])
 
+    def test_contacts_parsing_in_chunks(self):
+        csv_file = self.fixture('sample-contacts-with-headers.csv')
+        fields = zip(
+            ['name', 'surname', 'msisdn'],
+            ['string', 'string', 'msisdn_za'])
+        expected = list(self.parser.parse_file(
+            default_storage.open(csv_file, 'rU'), fields, has_header=True))
+        self.parser.CHUNK_SIZE = 2
+        contacts = list(self.parser.parse_file(
+            default_storage.open(csv_file, 'rU'), fields, has_header=True))
+        self.assertEqual(len(contacts), 3)
+        self.assertEqual(contacts, expected)
+
+    def test_contacts_with_missing_fields_in_chunks(self):
+        self.parser.CHUNK_SIZE = 100
+        self.test_contacts_with_missing_fields()
+
 
 class TestXLSParser(ParserTestCase):
     PARSER_CLASS = XLSFileParser
@@ -178,3 +195,25 @@ class TestXLSParser(ParserTestCase):
                 'msisdn': '1.0',
                 'surname': '2',
                 'name': 'xxx'})
+
+    def test_contacts_parsing_msisdns(self):
+        xls_file = self.fixture('sample-contacts.xls')
+        contacts = list(self.parser.parse_file(xls_file, zip(
+            ['name', 'surname', 'msisdn'],
+            ['string', 'string', 'msisdn_za']), has_header=False))
+        self.assertEqual(contacts[0], {
+                'msisdn': '+271',
+                'surname': '2.0',
+                'name': 'xxx'})
+
+    def test_contacts_parsing_in_chunks(self):
+        xls_file = self.fixture('sample-contacts-with-headers.xlsx')
+        fields = zip(
+            ['name', 'surname', 'msisdn'],
+            ['string', 'integer', 'number'])
+        expected = list(
+            self.parser.parse_file(xls_file, fields, has_header=True))
+        self.parser.CHUNK_SIZE = 1
+        contacts = list(
+            self.parser.parse_file(xls_file, fields, has_header=True))
+        self.assertEqual(contacts, expected)
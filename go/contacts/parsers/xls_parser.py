@@ -7,20 +7,45 @@ from go.contacts.parsers.base import ContactFileParser, ContactParserException
 
 class XLSFileParser(ContactFileParser):
 
-    def read_data_from_file(self, file_path, field_names, has_header):
-        book = xlrd.open_workbook(self.get_real_path(file_path))
-        sheet = book.sheet_by_index(0)
-        start_at = 1 if has_header else 0
-        for row_number in range(start_at, sheet.nrows):
+    def open_sheet(self, file_path):
+        """
+        Open the workbook at `file_path` and return it along with its first
+        sheet. Other sheets in the workbook are never loaded.
+        """
+        # xlrd only supports loading sheets on demand for XLS files.
+        on_demand = self.get_file_extension(file_path) == 'xls'
+        book = xlrd.open_workbook(
+            self.get_real_path(file_path), on_demand=on_demand)
+        return book, book.sheet_by_index(0)
+
+    def iter_rows(self, sheet, start_at, num_columns=None):
+        """
+        Lazily yield the values of each row of `sheet` that has data,
+        starting at row `start_at` and truncated to `num_columns` columns.
+        """
+        for row_number in xrange(start_at, sheet.nrows):
             row = sheet.row_values(row_number)
             # Only process rows that actually have data
-            if any([column for column in row]):
-                yield dict(zip(field_names,
-                        sheet.row_values(row_number)[:len(field_names)]))
+            if any(row):
+                yield row[:num_columns]
+
+    def read_data_from_file(self, file_path, field_names, has_header):
+        book, sheet = self.open_sheet(file_path)
+        try:
+            start_at = 1 if has_header else 0
+            for row in self.iter_rows(sheet, start_at, len(field_names)):
+                yield dict(zip(field_names, row))
+        finally:
+            book.release_resources()
 
     def guess_headers_and_row(self, file_path):
-        book = xlrd.open_workbook(self.get_real_path(file_path))
-        sheet = book.sheet_by_index(0)
+        book, sheet = self.open_sheet(file_path)
+        try:
+            return self._guess_headers_and_row(sheet)
+        finally:
+            book.release_resources()
+
+    def _guess_headers_and_row(self, sheet):
         if sheet.nrows == 0:
             raise ContactParserException('Worksheet is empty.')
         elif sheet.nrows == 1:
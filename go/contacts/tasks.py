@@ -11,14 +11,26 @@ from django.core.files.storage import default_storage
 from django.template.loader import render_to_string
 from django.utils.safestring import mark_safe
 
-from go.vumitools.api import VumiUserApi
-from go.vumitools.contact.models import ContactNotFoundError
+from go.vumitools.api import VumiApi, VumiUserApi
+from go.vumitools.contact.models import ContactStore, ContactNotFoundError
 from go.base.models import UserProfile
 from go.base.utils import UnicodeCSVWriter
+from go.contacts.group_deletion import GroupMemberDeletion
 from go.contacts.parsers import ContactFileParser
 from go.contacts.utils import contacts_by_key
 
 
+def contact_store_factory(account_key):
+    """
+    Return a function that creates a contact store with Riak and Redis
+    clients of its own, for use in another thread.
+    """
+    def factory():
+        return VumiUserApi.from_config_sync(
+            account_key, settings.VUMI_API_CONFIG).contact_store
+    return factory
+
+
 @task(ignore_result=True)
 def delete_group(account_key, group_key):
     # NOTE: There is a small chance that this can break when running in
@@ -28,29 +40,32 @@ def delete_group(account_key, group_key):
     #       has been deleted. If this happens those contacts will have
     #       secondary indexes in Riak pointing to a non-existent Group.
     api = VumiUserApi.from_config_sync(account_key, settings.VUMI_API_CONFIG)
-    contact_store = api.contact_store
-    group = contact_store.get_group(group_key)
-    # We do this one at a time because we're already saving them one at a time
-    # and the boilerplate for fetching batches without having them all sit in
-    # memory is ugly.
-    for contact_key in group.backlinks.contacts():
-        contact = contact_store.get_contact_by_key(contact_key)
-        contact.groups.remove(group)
-        contact.save()
-    group.delete()
+    GroupMemberDeletion(
+        api.contact_store, group_key, 'remove',
+        store_factory=contact_store_factory(account_key)).run()
 
 
 @task(ignore_result=True)
 def delete_group_contacts(account_key, group_key):
     api = VumiUserApi.from_config_sync(account_key, settings.VUMI_API_CONFIG)
-    contact_store = api.contact_store
-    group = contact_store.get_group(group_key)
-    contacts = contact_store.get_contacts_for_group(group)
-    # We do this one at a time because we're already saving them one at a time
-    # and the boilerplate for fetching batches without having them all sit in
-    # memory is ugly.
-    for contact_key in contacts:
-        contact_store.get_contact_by_key(contact_key).delete()
+    GroupMemberDeletion(
+        api.contact_store, group_key, 'delete',
+        store_factory=contact_store_factory(account_key)).run()
+
+
+@task(ignore_result=True)
+def refresh_materialized_smart_groups(account_key):
+    api = VumiUserApi.from_config_sync(account_key, settings.VUMI_API_CONFIG)
+    api.contact_store.refresh_stale_smart_groups()
+
+
+@task(ignore_result=True)
+def refresh_all_materialized_smart_groups():
+    api = VumiApi.from_config_sync(settings.VUMI_API_CONFIG)
+    account_keys = ContactStore.materialized_account_keys(
+        api.redis.sub_manager('contact_store'))
+    for account_key in account_keys:
+        refresh_materialized_smart_groups.delay(account_key)
 
 
 def zipped_file(filename, data):
@@ -289,7 +304,7 @@ def import_new_contacts_file(account_key, group_key, file_name, file_path,
         # Clean up if something went wrong, either everything is written
         # or nothing is written
         for contact in written_contacts:
-            contact.delete()
+            contact_store.delete_contact(contact)
 
         exc_type, exc_value, exc_traceback = sys.exc_info()
 
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import csv
+import json
 import os
 import tempfile
 from datetime import datetime
@@ -7,13 +8,19 @@ from os import path
 from StringIO import StringIO
 from zipfile import ZipFile
 
+import mock
+
 from django.conf import settings
 from django.core import mail
 from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
 from django.utils.html import escape
 
-from go.contacts.parsers.base import FieldNormalizer
+from go.contacts import tasks
+from go.contacts.group_deletion import GroupMemberDeletion
+from go.vumitools.api import VumiUserApi
+from go.contacts.parsers.base import (
+    FieldNormalizer, FieldNormalizerException)
 from go.base.tests.helpers import GoDjangoTestCase, DjangoVumiApiHelper
 
 
@@ -1173,6 +1180,18 @@ class TestSmartGroups(BaseContactsTestCase):
         contact.save()
         return contact
 
+    @mock.patch('go.contacts.tasks.refresh_materialized_smart_groups.delay')
+    def test_refresh_all_materialized_smart_groups(self, delay):
+        # Accounts without materialized groups are skipped.
+        self.contact_store.new_smart_group(u'sg', u'surname:"Foo"')
+        tasks.refresh_all_materialized_smart_groups()
+        self.assertEqual(delay.call_count, 0)
+
+        group = self.contact_store.new_smart_group(u'sg2', u'surname:"Bar"')
+        self.contact_store.materialize_smart_group(group)
+        tasks.refresh_all_materialized_smart_groups()
+        delay.assert_called_once_with(self.contact_store.user_account_key)
+
     def test_smart_groups_creation(self):
         group = self.mksmart_group('msisdn:\+12*')
         self.assertEqual(u'a smart group', group.name)
@@ -1370,6 +1389,173 @@ class TestSmartGroups(BaseContactsTestCase):
         self.assertEqual(mime_type, 'application/zip')
 
 
+class TestGroupMemberDeletion(BaseContactsTestCase):
+    def mkgroup(self, num_contacts):
+        group = self.contact_store.new_group(TEST_GROUP_NAME)
+        for i in range(num_contacts):
+            self.mkcontact(msisdn=u'+2776%07d' % (i,), groups=[group])
+        return group
+
+    def mkjob(self, group, action, concurrency=2):
+        self.thread_stores = []
+
+        def store_factory():
+            user_api = VumiUserApi(
+                self.vumi_helper.get_vumi_api(), self.user_helper.account_key)
+            self.thread_stores.append(user_api.contact_store)
+            return user_api.contact_store
+
+        return GroupMemberDeletion(
+            self.contact_store, group.key, action, chunk_size=2,
+            concurrency=concurrency, store_factory=store_factory)
+
+    def interrupt_at(self, job, contact_key):
+        """
+        Make processing `contact_key` fail. Member keys are processed in
+        key order.
+        """
+        process_contact = job.process_contact
+
+        def interrupting_process_contact(key):
+            if key == contact_key:
+                raise ValueError("Interrupted")
+            return process_contact(key)
+
+        job.process_contact = interrupting_process_contact
+
+    def test_unknown_action(self):
+        self.assertRaises(
+            ValueError, GroupMemberDeletion, self.contact_store, 'key', 'foo')
+
+    def test_delete_members(self):
+        group = self.mkgroup(5)
+        job = self.mkjob(group, 'delete')
+        self.assertEqual(job.get_progress(), None)
+        self.assertEqual(job.run(), 5)
+        self.assertEqual(self.contact_store.get_contacts_for_group(group), [])
+        self.assertEqual(self.contact_store.list_contacts(), [])
+        self.assertEqual(job.get_progress(), {
+            'total': 5,
+            'processed': 5,
+            'finished': True,
+        })
+
+    def test_remove_members(self):
+        group = self.mkgroup(5)
+        job = self.mkjob(group, 'remove')
+        self.assertEqual(job.run(), 5)
+        self.assertEqual(self.contact_store.get_group(group.key), None)
+        contacts = self.contact_store.list_contacts()
+        self.assertEqual(len(contacts), 5)
+        for key in contacts:
+            contact = self.contact_store.get_contact_by_key(key)
+            self.assertEqual(contact.groups.keys(), [])
+
+    def test_remove_members_updates_smart_group_counts(self):
+        group = self.mkgroup(2)
+        smart_group = self.contact_store.new_smart_group(
+            u'smart group', u'msisdn:\\+2776* OR name:foo')
+        self.contact_store.count_cache.set_count(smart_group, 2)
+        self.mkjob(group, 'remove').run()
+        # The contacts were saved with ContactStore.save_contact, which
+        # discards counts for queries that can't be evaluated locally.
+        self.assertEqual(
+            self.contact_store.count_cache.get_count(smart_group), None)
+
+    def test_delete_members_concurrently(self):
+        group = self.mkgroup(5)
+        job = self.mkjob(group, 'delete', concurrency=2)
+        self.assertEqual(job.run(), 5)
+        self.assertEqual(self.contact_store.list_contacts(), [])
+        # Each thread uses a contact store of its own.
+        self.assertTrue(1 <= len(self.thread_stores) <= 2)
+
+    def test_delete_members_without_store_factory(self):
+        group = self.mkgroup(3)
+        job = GroupMemberDeletion(
+            self.contact_store, group.key, 'delete', chunk_size=2)
+        self.assertEqual(job.run(), 3)
+        self.assertEqual(self.contact_store.list_contacts(), [])
+
+    def test_delete_members_fetches_index_pages(self):
+        group = self.mkgroup(5)
+        job = self.mkjob(group, 'delete')
+        pages = list(job.get_member_pages(group))
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            sum(pages, []),
+            sorted(self.contact_store.get_contacts_for_group(group)))
+
+    def test_delete_members_resumes(self):
+        group = self.mkgroup(5)
+        keys = sorted(self.contact_store.get_contacts_for_group(group))
+        job = self.mkjob(group, 'delete')
+        self.interrupt_at(job, keys[3])
+        self.assertRaises(ValueError, job.run)
+        # Only contacts that were actually processed are counted.
+        self.assertEqual(job.get_progress(), {
+            'total': 5,
+            'processed': 3,
+            'finished': False,
+        })
+        self.assertEqual(
+            len(self.contact_store.get_contacts_for_group(group)), 2)
+
+        job = self.mkjob(group, 'delete')
+        self.assertEqual(job.run(), 2)
+        self.assertEqual(self.contact_store.get_contacts_for_group(group), [])
+        self.assertEqual(self.contact_store.list_contacts(), [])
+        # Contacts processed by both runs are only counted once.
+        self.assertEqual(job.get_progress(), {
+            'total': 5,
+            'processed': 5,
+            'finished': True,
+        })
+
+    def test_remove_members_resumes(self):
+        group = self.mkgroup(5)
+        keys = sorted(self.contact_store.get_contacts_for_group(group))
+        job = self.mkjob(group, 'remove')
+        self.interrupt_at(job, keys[3])
+        self.assertRaises(ValueError, job.run)
+        self.assertEqual(job.get_progress()['processed'], 3)
+        self.assertNotEqual(self.contact_store.get_group(group.key), None)
+
+        job = self.mkjob(group, 'remove')
+        self.assertEqual(job.run(), 2)
+        self.assertEqual(job.get_progress()['processed'], 5)
+        self.assertEqual(self.contact_store.get_group(group.key), None)
+        for key in self.contact_store.list_contacts():
+            contact = self.contact_store.get_contact_by_key(key)
+            self.assertEqual(contact.groups.keys(), [])
+
+    def test_delete_members_again(self):
+        group = self.mkgroup(2)
+        self.mkjob(group, 'delete').run()
+        self.mkcontact(groups=[group])
+        job = self.mkjob(group, 'delete')
+        self.assertEqual(job.run(), 1)
+        self.assertEqual(job.get_progress()['total'], 1)
+        self.assertEqual(self.contact_store.get_contacts_for_group(group), [])
+
+    def test_group_progress(self):
+        group = self.mkgroup(3)
+        progress_url = reverse(
+            'contacts:group_progress', kwargs={'group_key': group.key})
+        response = self.client.get(progress_url)
+        self.assertEqual(
+            json.loads(response.content), {'remove': None, 'delete': None})
+
+        self.client.post(group_url(group.key), {
+            '_delete_group_contacts': True,
+        })
+        response = self.client.get(progress_url)
+        self.assertEqual(json.loads(response.content), {
+            'remove': None,
+            'delete': {'total': 3, 'processed': 3, 'finished': True},
+        })
+
+
 class TestFieldNormalizer(GoDjangoTestCase):
 
     def setUp(self):
@@ -1442,3 +1628,16 @@ class TestFieldNormalizer(GoDjangoTestCase):
         self.assertNormalized('baz', '', '', str)
         self.assertNormalized('fubar', 'None', 'None', str)
         self.assertNormalized('zab', None, None)
+
+    def test_invalid_msisdn(self):
+        self.assertRaises(
+            FieldNormalizerException, self.fn.do_msisdn, 'foo', '27')
+        self.assertRaises(
+            FieldNormalizerException, self.fn.do_msisdn, '7612.5', '27')
+        self.assertRaises(
+            FieldNormalizerException, self.fn.normalize, 'msisdn_int', 'foo')
+
+    def test_get_normalizer(self):
+        self.assertEqual(
+            self.fn.get_normalizer('integer'), self.fn.normalize_integer)
+        self.assertEqual(self.fn.get_normalizer('foo')('1.1'), '1.1')
@@ -7,6 +7,8 @@ urlpatterns = patterns('',
     url(r'^groups/(?P<type>[\w ]+)/$', views.groups, name='groups_type'),
     # TODO: Is the group_name regex sane?
     url(r'^group/(?P<group_key>[\w ]+)/$', views.group, name='group'),
+    url(r'^group/(?P<group_key>[\w ]+)/progress/$', views.group_progress,
+        name='group_progress'),
     url(r'^people/$', views.people, name='people'),
     url(r'^people/new/$', views.new_person, name='new_person'),
     url(r'^people/(?P<person_key>\w+)/$', views.person, name='person'),
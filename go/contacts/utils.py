@@ -52,3 +52,35 @@ def groups_by_key(contact_store, *keys):
         groups.extend(bunch)
 
     return groups
+
+
+class GroupPageList(object):
+    """
+    The groups of an account ordered by name, for use with Django's
+    paginator. Groups are only loaded when they are sliced out of the list.
+    """
+
+    def __init__(self, contact_store, group_type=None):
+        self.contact_store = contact_store
+        self.group_type = group_type
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.contact_store.count_groups(self.group_type)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None:
+                raise ValueError("Slicing with a step is not supported.")
+            return self.contact_store.list_groups_page(
+                index.start or 0, index.stop, self.group_type)
+        groups = self.contact_store.list_groups_page(
+            index, index + 1, self.group_type)
+        if not groups:
+            raise IndexError(index)
+        return groups[0]
@@ -1,8 +1,9 @@
 import re
+import json
 
 from urllib import urlencode
 
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect
 from django.core.urlresolvers import reverse
 from django.core.files.storage import default_storage
@@ -16,6 +17,7 @@ from go.contacts.forms import (
     ContactForm, ContactGroupForm, UploadContactsForm, SmartGroupForm,
     SelectContactGroupForm)
 from go.contacts import tasks, utils
+from go.contacts.group_deletion import GroupMemberDeletion
 from go.contacts.import_handlers import (
     handle_import_new_contacts, handle_import_existing_is_truth,
     handle_import_upload_is_truth)
@@ -89,15 +91,13 @@ def groups(request, type=None):
             query = 'name:%s' % (query,)
         keys = contact_store.groups.raw_search(query).get_keys()
         groups = utils.groups_by_key(contact_store, *keys)
+        groups = sorted(
+            groups, key=lambda group: group.created_at, reverse=True)
     else:
-        if type == 'static':
-            groups = contact_store.list_static_groups()
-        elif type == 'smart':
-            groups = contact_store.list_smart_groups()
-        else:
-            groups = contact_store.list_groups()
+        # Only the groups on the page being displayed are loaded.
+        group_type = type if type in ('static', 'smart') else None
+        groups = utils.GroupPageList(contact_store, group_type)
 
-    groups = sorted(groups, key=lambda group: group.created_at, reverse=True)
     paginator = Paginator(groups, 15)
     try:
         page = paginator.page(request.GET.get('p', 1))
@@ -137,6 +137,21 @@ def _group(request, group_key):
         return _static_group(request, contact_store, group)
 
 
+@login_required
+def group_progress(request, group_key):
+    """
+    Return the progress of the jobs removing or deleting the group's
+    members as JSON, for polling from the group page.
+    """
+    contact_store = request.user_api.contact_store
+    progress = dict(
+        (action, GroupMemberDeletion(
+            contact_store, group_key, action).get_progress())
+        for action in GroupMemberDeletion.ACTIONS)
+    return HttpResponse(
+        json.dumps(progress), content_type="application/json")
+
+
 @login_required
 @csrf_protect
 def _static_group(request, contact_store, group):
@@ -148,7 +163,7 @@ def _static_group(request, contact_store, group):
         if '_save_group' in request.POST:
             if group_form.is_valid():
                 group.name = group_form.cleaned_data['name']
-                group.save()
+                contact_store.save_group(group)
             messages.info(request, 'The group name has been updated')
             return redirect(_group_url(group.key))
         elif '_export' in request.POST:
@@ -164,8 +179,9 @@ def _static_group(request, contact_store, group):
             contacts = request.POST.getlist('contact')
             for person_key in contacts:
                 contact = contact_store.get_contact_by_key(person_key)
+                old_data = contact.get_data()
                 contact.groups.remove(group)
-                contact.save()
+                contact_store.save_contact(contact, old_data)
             messages.info(
                 request,
                 '%d Contacts removed from group' % len(contacts))
@@ -283,7 +299,7 @@ def _smart_group(request, contact_store, group):
             if smart_group_form.is_valid():
                 group.name = smart_group_form.cleaned_data['name']
                 group.query = smart_group_form.cleaned_data['query']
-                group.save()
+                contact_store.save_group(group)
                 return redirect(_group_url(group.key))
         elif '_export' in request.POST:
             tasks.export_group_contacts.delay(
@@ -349,7 +365,7 @@ def _people(request):
             contacts = request.POST.getlist('contact')
             for person_key in contacts:
                 contact = contact_store.get_contact_by_key(person_key)
-                contact.delete()
+                contact_store.delete_contact(contact)
             messages.info(request, '%d Contacts deleted' % len(contacts))
         elif '_export' in request.POST:
             tasks.export_contacts.delay(
@@ -437,12 +453,13 @@ def person(request, person_key):
     groups = contact_store.list_groups()
     if request.method == 'POST':
         if '_delete' in request.POST:
-            contact.delete()
+            contact_store.delete_contact(contact)
             messages.info(request, 'Contact deleted')
             return redirect(reverse('contacts:people'))
         else:
             form = ContactForm(request.POST, groups=groups)
             if form.is_valid():
+                old_data = contact.get_data()
                 for k, v in form.cleaned_data.items():
                     if k == 'groups':
                         contact.groups.clear()
@@ -450,7 +467,7 @@ def person(request, person_key):
                             contact.add_to_group(group)
                         continue
                     setattr(contact, k, v)
-                contact.save()
+                contact_store.save_contact(contact, old_data)
                 messages.add_message(request, messages.INFO, 'Profile Updated')
                 return redirect(reverse('contacts:person', kwargs={
                     'person_key': contact.key}))
@@ -19,6 +19,7 @@ from go.conversation.view_definition import (
     ConversationViewDefinitionBase, EditConversationView)
 from go.conversation.tasks import export_conversation_messages_unsorted
 from go.vumitools.api import VumiApiCommand
+from go.vumitools.conversation import ConversationStore
 from go.vumitools.conversation.definition import (
     ConversationDefinitionBase, ConversationAction)
 from go.vumitools.conversation.utils import ConversationWrapper
@@ -253,6 +254,29 @@ class TestConversationsDashboardView(BaseConversationViewTestCase):
         response = self.client.get(reverse('conversations:index'), {'p': 2})
         self.assertContains(response, conv.name, count=1)
 
+    def test_index_loads_only_page_conversations(self):
+        convs = [
+            self.user_helper.create_conversation(u'dummy', name=u'conv%d' % i)
+            for i in range(30)]
+        self.user_helper.user_api.conversation_store.build_summary_index()
+
+        loaded_keys = []
+        load_all_bunches = ConversationStore.load_all_bunches
+
+        def counting_load_all_bunches(conv_store, keys):
+            loaded_keys.extend(keys)
+            return load_all_bunches(conv_store, keys)
+
+        self.monkey_patch(
+            ConversationStore, 'load_all_bunches', counting_load_all_bunches)
+
+        response = self.client.get(reverse('conversations:index'), {'p': 2})
+        # CONVERSATIONS_PER_PAGE = 12, newest first
+        self.assertEqual(
+            sorted(loaded_keys), sorted(c.key for c in convs[6:18]))
+        self.assertContains(response, convs[17].name)
+        self.assertNotContains(response, convs[18].name)
+
     def test_pagination_with_query_and_type(self):
         self.user_helper.add_app_permission(u'gotest.dummy')
         self.user_helper.add_app_permission(u'gotest.with_actions')
@@ -28,26 +28,12 @@ def index(request):
     conversation_type = search_form.cleaned_data['conversation_type']
     query = search_form.cleaned_data['query']
 
-    get_conversations = {
-        'running': user_api.running_conversations,
-        'finished': user_api.archived_conversations,
-        'draft': user_api.draft_conversations,
-    }.get(conversation_status, user_api.active_conversations)
-
-    conversations = [user_api.wrap_conversation(c)
-                        for c in get_conversations()]
-
-    if conversation_type:
-        conversations = [c for c in conversations
-                         if c.conversation_type == conversation_type]
-
-    if query:
-        conversations = [c for c in conversations
-                         if query.lower() in c.name.lower()]
-
-    # sort with newest first
-    conversations = sorted(conversations, key=lambda c: c.created_at,
-                            reverse=True)
+    # Conversations are filtered, sorted (newest first) and paged using the
+    # account's conversation summaries and only the conversations on the
+    # page being displayed are loaded.
+    conversation_store = user_api.conversation_store
+    conversations = conversation_store.list_conversation_summaries(
+        conversation_status or None, conversation_type or None, query)
 
     paginator = Paginator(conversations, CONVERSATIONS_PER_PAGE)
     try:
@@ -57,6 +43,11 @@ def index(request):
     except EmptyPage:
         page = paginator.page(paginator.num_pages)
 
+    page.object_list = [
+        user_api.wrap_conversation(c)
+        for c in conversation_store.load_conversations(
+            [summary['key'] for summary in page.object_list])]
+
     pagination_params = urlencode({
         'query': query,
         'conversation_status': conversation_status,
@@ -0,0 +1,142 @@
+# -*- test-case-name: go.routers.app_multiplexer.tests.test_session -*-
+import time
+
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from vumi.components.session import SessionManager
+
+
+class SessionCache(object):
+    """
+    A process local cache of session data keyed by user address.
+
+    Sessions are cached for at most `ttl` seconds and never beyond the time
+    at which their Redis session would expire. A `ttl` of zero disables the
+    cache.
+    """
+
+    # Expired sessions are removed when the cache grows beyond this size.
+    PRUNE_SIZE = 10000
+
+    def __init__(self, ttl, get_time=time.time):
+        self.ttl = ttl
+        self.get_time = get_time
+        self._sessions = {}
+
+    def get(self, key):
+        entry = self._sessions.get(key)
+        if entry is None:
+            return None
+        expires_at, session = entry
+        if expires_at <= self.get_time():
+            del self._sessions[key]
+            return None
+        return dict(session)
+
+    def set(self, key, session, expires_at=None):
+        if self.ttl <= 0:
+            return
+        now = self.get_time()
+        if expires_at is None:
+            expires_at = now + self.ttl
+        else:
+            expires_at = min(now + self.ttl, expires_at)
+        if len(self._sessions) >= self.PRUNE_SIZE:
+            self.prune()
+        self._sessions[key] = (expires_at, dict(session))
+
+    def delete(self, key):
+        self._sessions.pop(key, None)
+
+    def prune(self):
+        now = self.get_time()
+        for key, (expires_at, _) in self._sessions.items():
+            if expires_at <= now:
+                del self._sessions[key]
+
+
+class CachedSessionManager(SessionManager):
+    """
+    A :class:`SessionManager` that caches sessions in a
+    :class:`SessionCache` and writes each session to Redis in a single
+    operation rather than one per field.
+
+    The cache is write-through: all writes go to Redis as well as the
+    cache, so sessions are never lost if a worker restarts. Cached sessions
+    are used without reading Redis until they expire from the cache, so
+    changes made by other workers are only seen once the cached copy
+    expires.
+
+    :param SessionCache cache:
+        The cache to use. It may be shared between managers with different
+        `cache_prefix` values.
+    :param str cache_prefix:
+        Prefix for this manager's keys in the cache.
+    """
+
+    def __init__(self, redis, cache, cache_prefix, max_session_length=None):
+        super(CachedSessionManager, self).__init__(
+            redis, max_session_length=max_session_length)
+        self.cache = cache
+        self.cache_prefix = cache_prefix
+
+    def session_key(self, user_id):
+        return "%s:%s" % ('session', user_id)
+
+    def cache_key(self, user_id):
+        return (self.cache_prefix, user_id)
+
+    def session_expires_at(self, session):
+        if not self.max_session_length or 'created_at' not in session:
+            return None
+        return float(session['created_at']) + int(self.max_session_length)
+
+    def cache_session(self, user_id, session):
+        self.cache.set(
+            self.cache_key(user_id), session,
+            self.session_expires_at(session))
+
+    @inlineCallbacks
+    def load_session(self, user_id):
+        session = self.cache.get(self.cache_key(user_id))
+        if session is None:
+            session = yield self.redis.hgetall(self.session_key(user_id))
+            if session:
+                self.cache_session(user_id, session)
+        returnValue(session)
+
+    @inlineCallbacks
+    def create_session(self, user_id, **kwargs):
+        ukey = self.session_key(user_id)
+        session = {
+            'created_at': time.time()
+        }
+        session.update(kwargs)
+        yield self.redis.delete(ukey)
+        yield self.redis.hmset(ukey, session)
+        if self.max_session_length:
+            yield self.schedule_session_expiry(
+                user_id, int(self.max_session_length))
+        self.cache_session(user_id, session)
+        returnValue(session)
+
+    @inlineCallbacks
+    def clear_session(self, user_id):
+        self.cache.delete(self.cache_key(user_id))
+        yield self.redis.delete(self.session_key(user_id))
+
+    @inlineCallbacks
+    def save_session(self, user_id, session):
+        """
+        Save a session. Like :meth:`SessionManager.save_session`, fields
+        not in `session` are left unchanged.
+        """
+        if not session:
+            returnValue(session)
+        yield self.redis.hmset(self.session_key(user_id), session)
+        cache_key = self.cache_key(user_id)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            cached.update(session)
+            self.cache_session(user_id, cached)
+        returnValue(session)
@@ -0,0 +1,177 @@
+from twisted.internet.defer import inlineCallbacks
+
+from vumi.tests.helpers import VumiTestCase, PersistenceHelper
+
+from go.routers.app_multiplexer.session import (
+    SessionCache, CachedSessionManager)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def get_time(self):
+        return self.now
+
+
+class TestSessionCache(VumiTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SessionCache(10, get_time=self.clock.get_time)
+
+    def test_get_missing(self):
+        self.assertEqual(self.cache.get('123'), None)
+
+    def test_set_and_get(self):
+        self.cache.set('123', {'state': 'start'})
+        self.assertEqual(self.cache.get('123'), {'state': 'start'})
+
+    def test_get_returns_copy(self):
+        self.cache.set('123', {'state': 'start'})
+        self.cache.get('123')['state'] = 'select'
+        self.assertEqual(self.cache.get('123'), {'state': 'start'})
+
+    def test_ttl(self):
+        self.cache.set('123', {'state': 'start'})
+        self.clock.advance(9)
+        self.assertEqual(self.cache.get('123'), {'state': 'start'})
+        self.clock.advance(1)
+        self.assertEqual(self.cache.get('123'), None)
+
+    def test_expires_at(self):
+        self.cache.set('123', {'state': 'start'}, expires_at=1005)
+        self.clock.advance(4)
+        self.assertEqual(self.cache.get('123'), {'state': 'start'})
+        self.clock.advance(1)
+        self.assertEqual(self.cache.get('123'), None)
+
+    def test_disabled(self):
+        cache = SessionCache(0, get_time=self.clock.get_time)
+        cache.set('123', {'state': 'start'})
+        self.assertEqual(cache.get('123'), None)
+
+    def test_delete(self):
+        self.cache.set('123', {'state': 'start'})
+        self.cache.delete('123')
+        self.cache.delete('unknown')
+        self.assertEqual(self.cache.get('123'), None)
+
+    def test_prune(self):
+        self.cache.set('123', {'state': 'start'})
+        self.clock.advance(5)
+        self.cache.set('456', {'state': 'start'})
+        self.clock.advance(5)
+        self.cache.prune()
+        self.assertEqual(self.cache._sessions.keys(), ['456'])
+
+
+class TestCachedSessionManager(VumiTestCase):
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.redis = yield self.persistence_helper.get_redis_manager()
+        self.clock = FakeClock()
+        self.cache = SessionCache(10, get_time=self.clock.get_time)
+        self.manager = self.mkmanager()
+
+    def mkmanager(self, cache=None):
+        return CachedSessionManager(
+            self.redis, cache or self.cache, 'prefix', max_session_length=60)
+
+    @inlineCallbacks
+    def test_create_session(self):
+        session = yield self.manager.create_session('123', state='start')
+        self.assertEqual(session['state'], 'start')
+        self.assertTrue('created_at' in session)
+        stored = yield self.redis.hgetall('session:123')
+        self.assertEqual(stored['state'], 'start')
+        ttl = yield self.redis.ttl('session:123')
+        self.assertTrue(0 < ttl <= 60)
+        self.assertEqual(self.cache.get(('prefix', '123')), session)
+
+    @inlineCallbacks
+    def test_create_session_clears_old_fields(self):
+        yield self.redis.hmset('session:123', {'old': 'value'})
+        yield self.manager.create_session('123', state='start')
+        stored = yield self.redis.hgetall('session:123')
+        self.assertFalse('old' in stored)
+
+    @inlineCallbacks
+    def test_load_session_cached(self):
+        yield self.redis.hmset('session:123', {'state': 'start'})
+        session = yield self.manager.load_session('123')
+        self.assertEqual(session, {'state': 'start'})
+        # Changes made directly in Redis aren't seen until the cached
+        # session expires.
+        yield self.redis.hset('session:123', 'state', 'select')
+        session = yield self.manager.load_session('123')
+        self.assertEqual(session, {'state': 'start'})
+        self.clock.advance(10)
+        session = yield self.manager.load_session('123')
+        self.assertEqual(session, {'state': 'select'})
+
+    @inlineCallbacks
+    def test_load_session_changed_by_other_worker(self):
+        other = self.mkmanager(SessionCache(10, get_time=self.clock.get_time))
+        yield self.manager.create_session('123', state='start')
+        self.assertEqual(
+            (yield other.load_session('123'))['state'], 'start')
+        yield self.manager.save_session('123', {'state': 'select'})
+        self.assertEqual(
+            (yield other.load_session('123'))['state'], 'start')
+        self.clock.advance(10)
+        self.assertEqual(
+            (yield other.load_session('123'))['state'], 'select')
+
+    @inlineCallbacks
+    def test_load_session_cached_without_redis(self):
+        yield self.manager.create_session('123', state='start')
+        self.patch(self.redis, 'hgetall', lambda key: self.fail(key))
+        self.patch(self.redis, 'hget', lambda key, field: self.fail(key))
+        session = yield self.manager.load_session('123')
+        self.assertEqual(session['state'], 'start')
+
+    @inlineCallbacks
+    def test_load_session_not_cached_beyond_expiry(self):
+        yield self.redis.hmset('session:123', {
+            'state': 'start',
+            'created_at': self.clock.now - 55,
+        })
+        yield self.manager.load_session('123')
+        self.clock.advance(5)
+        self.assertEqual(self.cache.get(('prefix', '123')), None)
+
+    @inlineCallbacks
+    def test_save_session(self):
+        yield self.manager.create_session('123', state='start', foo='bar')
+        yield self.manager.save_session('123', {'state': 'select'})
+        stored = yield self.redis.hgetall('session:123')
+        self.assertEqual(stored['state'], 'select')
+        self.assertEqual(stored['foo'], 'bar')
+        session = yield self.manager.load_session('123')
+        self.assertEqual(session['state'], 'select')
+        self.assertEqual(session['foo'], 'bar')
+
+    @inlineCallbacks
+    def test_save_session_uncached(self):
+        yield self.manager.save_session('123', {'state': 'select'})
+        self.assertEqual(self.cache.get(('prefix', '123')), None)
+        stored = yield self.redis.hgetall('session:123')
+        self.assertEqual(stored, {'state': 'select'})
+
+    @inlineCallbacks
+    def test_clear_session(self):
+        yield self.manager.create_session('123', state='start')
+        yield self.manager.clear_session('123')
+        self.assertEqual((yield self.redis.exists('session:123')), False)
+        self.assertEqual((yield self.manager.load_session('123')), {})
+
+    @inlineCallbacks
+    def test_shared_cache_prefixes(self):
+        other = CachedSessionManager(
+            self.redis.sub_manager('other'), self.cache, 'other')
+        yield self.manager.create_session('123', state='start')
+        self.assertEqual((yield other.load_session('123')), {})
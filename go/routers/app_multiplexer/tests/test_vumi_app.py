@@ -185,6 +185,57 @@ class TestApplicationMultiplexerRouter(VumiTestCase):
             'endpoints': '["flappy-bird"]',
         })
 
+    def count_session_operations(self):
+        """
+        Record the Redis operations on session keys.
+        """
+        operations = []
+        client = self.router_worker.redis._client
+
+        def record(name, orig):
+            def wrapper(key, *args, **kw):
+                if ':session:' in key:
+                    operations.append(name)
+                return orig(key, *args, **kw)
+            return wrapper
+
+        for name in ['hget', 'hgetall', 'hset', 'hmset', 'delete', 'expire']:
+            self.patch(client, name, record(name, getattr(client, name)))
+        return operations
+
+    @inlineCallbacks
+    def test_session_operations_per_message(self):
+        """
+        A multi-hop USSD flow reads the session from Redis once and then
+        does a single session write for each message after the first.
+        """
+        router = yield self.router_helper.create_router(
+            started=True, config=self.ROUTER_CONFIG)
+        operations = self.count_session_operations()
+        hops = [
+            (None, 'new'),
+            ('1', 'resume'),
+            ('Up!', 'resume'),
+            ('Up!', 'resume'),
+            ('Down!', 'resume'),
+        ]
+        counts = []
+        for content, session_event in hops:
+            del operations[:]
+            yield self.router_helper.ri.make_dispatch_inbound(
+                content, router=router, from_addr='123',
+                session_event=session_event)
+            counts.append(len(operations))
+
+        self.assertEqual(counts, [4, 1, 1, 1, 1])
+        self.assertEqual(
+            len(self.router_helper.ro.get_dispatched_inbound()), 4)
+        yield self.assert_session(router, '123', {
+            'state': ApplicationMultiplexer.STATE_SELECTED,
+            'active_endpoint': 'flappy-bird',
+            'endpoints': '["flappy-bird"]',
+        })
+
     @inlineCallbacks
     def test_bad_input_for_endpoint_choice(self):
         """
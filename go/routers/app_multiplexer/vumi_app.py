@@ -5,11 +5,12 @@ from twisted.internet.defer import inlineCallbacks, returnValue
 
 from vumi import log
 from vumi.config import ConfigDict, ConfigList, ConfigInt, ConfigText
-from vumi.components.session import SessionManager
 from vumi.message import TransportUserMessage
 
 from go.vumitools.app_worker import GoRouterWorker
 from go.routers.app_multiplexer.common import mkmenu, clean
+from go.routers.app_multiplexer.session import (
+    SessionCache, CachedSessionManager)
 
 
 class ApplicationMultiplexerConfig(GoRouterWorker.CONFIG_CLASS):
@@ -18,6 +19,12 @@ class ApplicationMultiplexerConfig(GoRouterWorker.CONFIG_CLASS):
     session_expiry = ConfigInt(
         "Maximum amount of time in seconds to keep session data around",
         default=300, static=True)
+    session_cache_ttl = ConfigInt(
+        "Maximum amount of time in seconds to cache session data in memory. "
+        "Cached sessions are used without checking Redis, so changes made "
+        "by other workers are only seen once they expire from the cache. "
+        "Zero disables the cache.",
+        default=10, static=True)
 
     # Dynamic, per-message configuration
     menu_title = ConfigDict(
@@ -82,12 +89,16 @@ class ApplicationMultiplexer(GoRouterWorker):
             self.STATE_SELECTED: self.handle_state_selected,
             self.STATE_BAD_INPUT: self.handle_state_bad_input,
         }
+        self.session_cache = SessionCache(
+            self.get_static_config().session_cache_ttl)
         return d
 
     def session_manager(self, config):
         key_prefix = ':'.join((self.worker_name, config.router.key))
         redis = self.redis.sub_manager(key_prefix)
-        return SessionManager(redis, max_session_length=config.session_expiry)
+        return CachedSessionManager(
+            redis, self.session_cache, key_prefix,
+            max_session_length=config.session_expiry)
 
     def target_endpoints(self, config):
         """
@@ -108,11 +119,12 @@ class ApplicationMultiplexer(GoRouterWorker):
         session_manager = yield self.session_manager(config)
         session = yield session_manager.load_session(user_id)
         session_event = msg['session_event']
-        if not session or session_event == TransportUserMessage.SESSION_NEW:
+        new_session = (
+            not session or session_event == TransportUserMessage.SESSION_NEW)
+        if new_session:
             log.msg("Creating session for user %s" % user_id)
             session = {}
             state = self.STATE_START
-            yield session_manager.create_session(user_id)
         elif session_event == TransportUserMessage.SESSION_CLOSE:
             yield self.handle_session_close(config, session, msg)
             return
@@ -133,7 +145,11 @@ class ApplicationMultiplexer(GoRouterWorker):
                 if state != next_state:
                     log.msg("State transition for user %s: %s => %s" %
                             (user_id, state, next_state))
-                yield session_manager.save_session(user_id, session)
+                # The session is only written once per message.
+                if new_session:
+                    yield session_manager.create_session(user_id, **session)
+                else:
+                    yield session_manager.save_session(user_id, session)
         except:
             log.err()
             yield session_manager.clear_session(user_id)
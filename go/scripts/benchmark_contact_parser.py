@@ -0,0 +1,214 @@
+"""
+Benchmark the contact file parsers.
+
+Generates a CSV or XLSX file with the requested number of contacts, parses
+it and reports the rows parsed per second and the peak memory used.
+"""
+
+import csv
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from twisted.python import usage
+
+from go.contacts.parsers.csv_parser import CSVFileParser
+from go.contacts.parsers.xls_parser import XLSFileParser
+
+
+FIELDS = [
+    ('name', 'string'),
+    ('surname', 'string'),
+    ('msisdn', 'msisdn_za'),
+]
+
+
+class BenchmarkOptions(usage.Options):
+    optParameters = [
+        ["rows", None, "100000", "Number of contacts to generate."],
+        ["format", None, "csv", "File format to benchmark (csv or xlsx)."],
+        ["chunk-size", None, None,
+         "Number of rows to normalize at a time."],
+    ]
+
+    def postOptions(self):
+        try:
+            self['rows'] = int(self['rows'])
+        except (TypeError, ValueError):
+            self['rows'] = 0
+        if self['rows'] <= 0:
+            raise usage.UsageError("Please provide a positive int for rows")
+        if self['format'] not in ('csv', 'xlsx'):
+            raise usage.UsageError("Please provide a format of csv or xlsx")
+        if self['chunk-size'] is not None:
+            try:
+                self['chunk-size'] = int(self['chunk-size'])
+            except (TypeError, ValueError):
+                self['chunk-size'] = 0
+            if self['chunk-size'] <= 0:
+                raise usage.UsageError(
+                    "Please provide a positive int for chunk-size")
+
+
+class LocalFileMixin(object):
+    """
+    Read files from the local filesystem rather than from Django's
+    default storage.
+    """
+
+    def get_real_path(self, file_path):
+        return file_path
+
+
+class BenchmarkCSVFileParser(LocalFileMixin, CSVFileParser):
+    pass
+
+
+class BenchmarkXLSFileParser(LocalFileMixin, XLSFileParser):
+    pass
+
+
+def generate_rows(num_rows):
+    yield [name for name, _ in FIELDS]
+    for i in xrange(num_rows):
+        yield ['Name %s' % (i,), 'Surname %s' % (i,), '+2776%07d' % (i,)]
+
+
+def write_csv(file_path, num_rows):
+    with open(file_path, 'wb') as fp:
+        writer = csv.writer(fp)
+        for row in generate_rows(num_rows):
+            writer.writerow(row)
+
+
+XLSX_FILES = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'content-types">'
+        '<Default Extension="rels" ContentType="application/'
+        'vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType='
+        '"application/vnd.openxmlformats-officedocument.spreadsheetml.'
+        'worksheet+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" ContentType='
+        '"application/vnd.openxmlformats-officedocument.spreadsheetml.'
+        'sharedStrings+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/'
+        'spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.'
+        'org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/sharedStrings" '
+        'Target="sharedStrings.xml"/>'
+        '</Relationships>'),
+}
+
+
+def write_xlsx(file_path, num_rows):
+    strings = []
+    sheet_rows = []
+    for row_number, row in enumerate(generate_rows(num_rows)):
+        cells = []
+        for column, value in zip('ABC', row):
+            cells.append('<c r="%s%s" t="s"><v>%s</v></c>' % (
+                column, row_number + 1, len(strings)))
+            strings.append('<si><t>%s</t></si>' % (escape(value),))
+        sheet_rows.append('<row r="%s">%s</row>' % (
+            row_number + 1, ''.join(cells)))
+
+    zf = ZipFile(file_path, 'w', ZIP_DEFLATED)
+    try:
+        for name, content in XLSX_FILES.items():
+            zf.writestr(name, content)
+        zf.writestr('xl/sharedStrings.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/'
+            '2006/main" count="%s" uniqueCount="%s">%s</sst>' % (
+                len(strings), len(strings), ''.join(strings))))
+        zf.writestr('xl/worksheets/sheet1.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/'
+            'spreadsheetml/2006/main"><sheetData>%s</sheetData>'
+            '</worksheet>' % (''.join(sheet_rows),)))
+    finally:
+        zf.close()
+
+
+def get_peak_memory():
+    """
+    Return the peak resident set size of this process in kilobytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def benchmark(file_format, num_rows, chunk_size=None):
+    """
+    Parse a generated file of `num_rows` contacts and return a tuple of
+    `(rows_parsed, seconds_taken)`.
+    """
+    if file_format == 'csv':
+        parser, write = BenchmarkCSVFileParser(), write_csv
+    else:
+        parser, write = BenchmarkXLSFileParser(), write_xlsx
+    if chunk_size is not None:
+        parser.CHUNK_SIZE = chunk_size
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        file_path = os.path.join(tmp_dir, 'contacts.%s' % (file_format,))
+        write(file_path, num_rows)
+        start = time.time()
+        rows_parsed = 0
+        for _ in parser.parse_file(file_path, FIELDS, has_header=True):
+            rows_parsed += 1
+        return rows_parsed, time.time() - start
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main(options):
+    rows_parsed, seconds = benchmark(
+        options['format'], options['rows'], options['chunk-size'])
+    print 'Parsed %s rows in %.2f seconds (%.0f rows/sec).' % (
+        rows_parsed, seconds, rows_parsed / max(seconds, 1e-6))
+    print 'Peak memory: %s KB.' % (get_peak_memory(),)
+
+
+if __name__ == '__main__':
+    try:
+        options = BenchmarkOptions()
+        options.parseOptions()
+    except usage.UsageError, errortext:
+        print '%s: %s' % (sys.argv[0], errortext)
+        print '%s: Try --help for usage details.' % (sys.argv[0])
+        sys.exit(1)
+
+    main(options)
@@ -0,0 +1,42 @@
+from twisted.python import usage
+
+from go.base.tests.helpers import GoDjangoTestCase
+from go.scripts.benchmark_contact_parser import BenchmarkOptions, benchmark
+
+
+class TestBenchmarkOptions(GoDjangoTestCase):
+
+    def mk_opts(self, args):
+        opts = BenchmarkOptions()
+        opts.parseOptions(args)
+        return opts
+
+    def test_defaults(self):
+        opts = self.mk_opts([])
+        self.assertEqual(opts['rows'], 100000)
+        self.assertEqual(opts['format'], 'csv')
+        self.assertEqual(opts['chunk-size'], None)
+
+    def test_overrides(self):
+        opts = self.mk_opts([
+            "--rows", "10", "--format", "xlsx", "--chunk-size", "5"])
+        self.assertEqual(opts['rows'], 10)
+        self.assertEqual(opts['format'], 'xlsx')
+        self.assertEqual(opts['chunk-size'], 5)
+
+    def test_invalid_rows(self):
+        self.assertRaises(usage.UsageError, self.mk_opts, ["--rows", "0"])
+
+    def test_invalid_format(self):
+        self.assertRaises(usage.UsageError, self.mk_opts, ["--format", "ods"])
+
+
+class TestBenchmark(GoDjangoTestCase):
+
+    def test_benchmark_csv(self):
+        rows_parsed, seconds = benchmark('csv', 10, chunk_size=3)
+        self.assertEqual(rows_parsed, 10)
+
+    def test_benchmark_xlsx(self):
+        rows_parsed, seconds = benchmark('xlsx', 10, chunk_size=3)
+        self.assertEqual(rows_parsed, 10)
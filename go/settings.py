@@ -302,6 +302,14 @@ CELERYBEAT_SCHEDULE = {
         'schedule': crontab(hour=0, minute=0),
         'args': ('daily',)
     },
+    'refresh-materialized-smart-groups': {
+        'task': 'go.contacts.tasks.refresh_all_materialized_smart_groups',
+        'schedule': crontab(minute='*/15'),
+    },
+#    'summarise-all-account-transactions': {
+#        'task': 'go.billing.tasks.summarise_all_account_transactions',
+#        'schedule': crontab(hour=0, minute=30),
+#    },
 #    'generate-monthly-account-statements': {
 #        'task': 'go.billing.tasks.generate_monthly_account_statements',
 #        'schedule': crontab(day_of_month=1),
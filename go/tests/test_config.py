@@ -2,16 +2,34 @@
 
 from twisted.trial.unittest import TestCase
 
+import __builtin__
+
+import go.config
 from go.config import (
     get_conversation_pkg, get_router_pkg,
     get_conversation_definition, get_router_definition,
+    get_conversation_definition_class, get_router_definition_class,
+    load_definitions,
     configured_conversation_types, configured_router_types,
     configured_conversations, configured_routers,
     obsolete_conversation_types, obsolete_router_types)
 from go.errors import UnknownConversationType, UnknownRouterType
 
 
-class ConversationDefinitionHelpersTestCase(TestCase):
+class DefinitionCacheMixin(object):
+    def setUp(self):
+        self.patch(go.config, '_DEFINITION_CLASSES', {})
+        self.imports = []
+        orig_import = __builtin__.__import__
+
+        def record_import(name, *args, **kw):
+            self.imports.append(name)
+            return orig_import(name, *args, **kw)
+
+        self.patch(__builtin__, '__import__', record_import)
+
+
+class ConversationDefinitionHelpersTestCase(DefinitionCacheMixin, TestCase):
     def test_configured_conversation_types(self):
         conv_types = configured_conversation_types()
         self.assertEqual(conv_types['bulk_message'], 'Group Message')
@@ -48,8 +66,32 @@ class ConversationDefinitionHelpersTestCase(TestCase):
         conv_def = get_conversation_definition('bulk_message', dummy_conv)
         self.assertTrue(conv_def.conv is dummy_conv)
 
+    def test_get_conversation_definition_class_cached(self):
+        from go.apps.bulk_message.definition import ConversationDefinition
+        del self.imports[:]
+        for _ in range(3):
+            self.assertEqual(
+                get_conversation_definition_class('bulk_message'),
+                ConversationDefinition)
+        self.assertEqual(self.imports, ['go.apps.bulk_message'])
+
+    def test_get_conversation_definition_class_fails(self):
+        self.assertRaises(UnknownConversationType,
+                          get_conversation_definition_class, 'unknown')
 
-class RouterDefinitionHelpersTestCase(TestCase):
+    def test_load_definitions(self):
+        load_definitions()
+        from go.apps.bulk_message.definition import ConversationDefinition
+        from go.routers.keyword.definition import RouterDefinition
+        del self.imports[:]
+        self.assertEqual(get_conversation_definition_class('bulk_message'),
+                         ConversationDefinition)
+        self.assertEqual(get_router_definition_class('keyword'),
+                         RouterDefinition)
+        self.assertEqual(self.imports, [])
+
+
+class RouterDefinitionHelpersTestCase(DefinitionCacheMixin, TestCase):
     def test_configured_router_types(self):
         conv_types = configured_router_types()
         self.assertEqual(conv_types['keyword'], 'Keyword')
@@ -84,3 +126,15 @@ class RouterDefinitionHelpersTestCase(TestCase):
         dummy_router = object()
         router_def = get_router_definition('keyword', dummy_router)
         self.assertTrue(router_def.router is dummy_router)
+
+    def test_get_router_definition_class_cached(self):
+        from go.routers.keyword.definition import RouterDefinition
+        del self.imports[:]
+        for _ in range(3):
+            self.assertEqual(
+                get_router_definition_class('keyword'), RouterDefinition)
+        self.assertEqual(self.imports, ['go.routers.keyword'])
+
+    def test_get_router_definition_class_fails(self):
+        self.assertRaises(UnknownRouterType,
+                          get_router_definition_class, 'unknown')
@@ -3,6 +3,7 @@
 
 """Convenience API, mostly for working with various datastores."""
 
+import json
 from collections import defaultdict
 
 from twisted.internet.defer import inlineCallbacks, returnValue
@@ -10,8 +11,6 @@ from twisted.internet.defer import inlineCallbacks, returnValue
 from vumi.blinkenlights.metrics import MetricManager
 from vumi.errors import VumiError
 from vumi.message import Message
-from vumi.components.tagpool import TagpoolManager
-from vumi.components.message_store import MessageStore
 from vumi.persist.model import Manager
 from vumi.persist.riak_manager import RiakManager
 from vumi.persist.txriak_manager import TxRiakManager
@@ -27,8 +26,10 @@ from go.vumitools.account import AccountStore
 from go.vumitools.channel import ChannelStore
 from go.vumitools.contact import ContactStore
 from go.vumitools.conversation import ConversationStore
+from go.vumitools.message_store import GoMessageStore
 from go.vumitools.opt_out import OptOutStore
 from go.vumitools.router import RouterStore
+from go.vumitools.tagpool import CachingTagpoolManager
 from go.vumitools.conversation.utils import ConversationWrapper
 from go.vumitools.token_manager import TokenManager
 
@@ -37,6 +38,10 @@ from django.utils.datastructures import SortedDict
 from vumi.message import TransportUserMessage
 
 
+# The worker name that the event dispatcher consumes control commands for.
+EVENT_DISPATCHER_WORKER_NAME = 'event_dispatcher'
+
+
 class TagpoolSet(object):
     """Holder for helper methods for retrieving tag pool information.
 
@@ -90,10 +95,12 @@ class VumiUserApi(object):
         self.api = api
         self.manager = self.api.manager
         self.user_account_key = user_account_key
-        self.conversation_store = ConversationStore(self.api.manager,
-                                                    self.user_account_key)
-        self.contact_store = ContactStore(self.api.manager,
-                                          self.user_account_key)
+        self.conversation_store = ConversationStore(
+            self.api.manager, self.user_account_key,
+            redis=self.api.redis.sub_manager('conversation_store'))
+        self.contact_store = ContactStore(
+            self.api.manager, self.user_account_key,
+            redis=self.api.redis.sub_manager('contact_store'))
         self.router_store = RouterStore(self.api.manager,
                                         self.user_account_key)
         self.channel_store = ChannelStore(self.api.manager,
@@ -221,7 +228,6 @@ class VumiUserApi(object):
         for tag in user_account.tags:
             tp_usage[tag[0]] += 1
 
-        all_pools = yield self.api.tpm.list_pools()
         allowed_pools = set()
         for tp_bunch in user_account.tagpools.load_all_bunches():
             for tp in (yield tp_bunch):
@@ -229,32 +235,40 @@ class VumiUserApi(object):
                         or tp.max_keys > tp_usage[tp.tagpool]):
                     allowed_pools.add(tp.tagpool)
 
-        available_pools = []
-        for pool in all_pools:
-            if pool not in allowed_pools:
-                continue
-            free_tags = yield self.api.tpm.free_tags(pool)
-            if free_tags:
-                available_pools.append(pool)
-
-        pool_data = dict([(pool, (yield self.api.tpm.get_metadata(pool)))
-                          for pool in available_pools])
+        snapshot = yield self.api.tpm.get_snapshot()
+        pool_data = dict([
+            (pool, pool_snapshot['metadata'])
+            for pool, pool_snapshot in snapshot.iteritems()
+            if pool in allowed_pools and pool_snapshot['free']])
         returnValue(TagpoolSet(pool_data))
 
     @Manager.calls_manager
     def applications(self):
-        user_account = yield self.get_user_account()
-        # NOTE: This assumes that we don't have very large numbers of
-        #       applications.
-        app_permissions = []
-        for permissions in user_account.applications.load_all_bunches():
-            app_permissions.extend((yield permissions))
-        applications = [permission.application for permission
-                            in app_permissions]
+        """
+        Return a :class:`SortedDict` of the installed applications this
+        account has permission to use.
+
+        The permitted applications are cached per account until
+        :meth:`VumiApi.invalidate_cached_applications` is called or the
+        cache expires.
+        """
+        applications = yield self.api.get_cached_applications(
+            self.user_account_key)
+        if applications is None:
+            user_account = yield self.get_user_account()
+            # NOTE: This assumes that we don't have very large numbers of
+            #       applications.
+            app_permissions = []
+            for permissions in user_account.applications.load_all_bunches():
+                app_permissions.extend((yield permissions))
+            applications = sorted(permission.application for permission
+                                  in app_permissions)
+            yield self.api.set_cached_applications(
+                self.user_account_key, applications)
         app_settings = configured_conversations()
         returnValue(SortedDict([(application,
                         app_settings[application])
-                        for application in sorted(applications)
+                        for application in applications
                         if application in app_settings]))
 
     @Manager.calls_manager
@@ -297,6 +311,27 @@ class VumiUserApi(object):
                 "Routing table missing for account: %s" % (user_account.key,))
         returnValue(user_account.routing_table)
 
+    @Manager.calls_manager
+    def set_event_handler_config(self, event_handler_config):
+        """Save the account's event handler config.
+
+        This bumps the account's event handler config version and tells the
+        event dispatcher to reload the account's config.
+
+        :param list event_handler_config:
+            A list of `[[conversation_key, event_type], handlers]` pairs,
+            where `handlers` is a list of `[handler_name, handler_config]`
+            pairs.
+        """
+        user_account = yield self.get_user_account()
+        user_account.event_handler_config = event_handler_config
+        yield user_account.save()
+        version = yield self.api.incr_event_handler_config_version(
+            self.user_account_key)
+        yield self.api.send_command(
+            EVENT_DISPATCHER_WORKER_NAME, 'reload_account_config',
+            account_key=self.user_account_key, version=version)
+
     @Manager.calls_manager
     def validate_routing_table(self, user_account=None):
         """Check that the routing table on this account is valid.
@@ -511,6 +546,11 @@ class VumiRouterApi(object):
 
 
 class VumiApi(object):
+
+    # How long an account's list of permitted applications is cached for,
+    # in seconds
+    APPLICATIONS_CACHE_TTL = 300
+
     def __init__(self, manager, redis, sender=None, metric_publisher=None):
         # local import to avoid circular import since
         # go.api.go_api needs to access VumiApi
@@ -519,14 +559,19 @@ class VumiApi(object):
         self.manager = manager
         self.redis = redis
 
-        self.tpm = TagpoolManager(self.redis.sub_manager('tagpool_store'))
-        self.mdb = MessageStore(self.manager,
-                                self.redis.sub_manager('message_store'))
+        self.tpm = CachingTagpoolManager(
+            self.redis.sub_manager('tagpool_store'))
+        self.mdb = GoMessageStore(self.manager,
+                                  self.redis.sub_manager('message_store'))
         self.account_store = AccountStore(self.manager)
         self.token_manager = TokenManager(
                                 self.redis.sub_manager('token_manager'))
         self.session_manager = SessionManager(
             self.redis.sub_manager('session_manager'))
+        self.event_handler_config_versions = self.redis.sub_manager(
+            'event_handler_config_versions')
+        self.cached_applications = self.redis.sub_manager(
+            'cached_applications')
         self.mapi = sender
         self.metric_publisher = metric_publisher
 
@@ -577,6 +622,50 @@ class VumiApi(object):
     def get_user_api(self, user_account_key):
         return VumiUserApi(self, user_account_key)
 
+    @Manager.calls_manager
+    def get_event_handler_config_version(self, user_account_key):
+        """
+        Return the version of an account's event handler config. This is
+        zero until the config is saved with
+        :meth:`VumiUserApi.set_event_handler_config`.
+        """
+        version = yield self.event_handler_config_versions.get(
+            user_account_key)
+        returnValue(int(version or 0))
+
+    def incr_event_handler_config_version(self, user_account_key):
+        return self.event_handler_config_versions.incr(user_account_key)
+
+    @Manager.calls_manager
+    def get_cached_applications(self, user_account_key):
+        """
+        Return the cached list of applications an account has permission to
+        use or ``None`` if the list isn't cached.
+        """
+        applications = yield self.cached_applications.get(user_account_key)
+        if applications is not None:
+            applications = json.loads(applications)
+        returnValue(applications)
+
+    @Manager.calls_manager
+    def set_cached_applications(self, user_account_key, applications):
+        # Make both calls before waiting for either so that they run
+        # concurrently when using an asynchronous Redis manager.
+        d_set = self.cached_applications.set(
+            user_account_key, json.dumps(applications))
+        d_expire = self.cached_applications.expire(
+            user_account_key, self.APPLICATIONS_CACHE_TTL)
+        yield d_set
+        yield d_expire
+
+    def invalidate_cached_applications(self, user_account_key):
+        """
+        Clear the cached list of applications an account has permission to
+        use. This must be called whenever an account's application
+        permissions change.
+        """
+        return self.cached_applications.delete(user_account_key)
+
     def send_command(self, worker_name, command, *args, **kwargs):
         """Create a VumiApiCommand and send it.
 
@@ -3,15 +3,20 @@
 
 """Vumi application worker for the vumitools API."""
 
-from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet import reactor
+from twisted.internet.defer import (
+    inlineCallbacks, returnValue, maybeDeferred, gatherResults,
+    DeferredSemaphore, CancelledError)
 
 from vumi.application import ApplicationWorker
+from vumi.blinkenlights.metrics import (
+    MetricManager, MetricPublisher, Metric, AVG, MAX, SUM)
 from vumi.utils import load_class_by_string
 from vumi import log
 
 from go.vumitools.api import (
     VumiApi, VumiApiCommand, VumiApiEvent, ApiCommandPublisher,
-    ApiEventPublisher)
+    ApiEventPublisher, EVENT_DISPATCHER_WORKER_NAME)
 
 
 # TODO: None of these should be ApplicationWorker subclasses.
@@ -27,7 +32,9 @@ class CommandDispatcher(ApplicationWorker):
 
     :param list worker_names:
         A list of known worker names that we can forward
-        VumiApiCommands to.
+        VumiApiCommands to. This must include the event dispatcher's
+        `worker_name` for changes to accounts' event handler configs to
+        reach it.
     """
 
     # TODO: Make this not an ApplicationWorker.
@@ -70,9 +77,19 @@ class EventDispatcher(ApplicationWorker):
     An application worker that forwards event arriving on the Vumi Api Event
     queue to the relevant handlers.
 
-    FIXME: The configuration is currently static.
-    TODO: We need a "flush cache" command for when the per-account config
-          updates.
+    Each account's handler config is cached along with its version. Cached
+    configs are dropped when a `reload_account_config` command for a newer
+    version arrives on the `<worker_name>.control` queue, and the version is
+    checked every `account_config_check_interval` seconds in case the
+    command went to another dispatcher. The command is sent on `vumi.api`,
+    so `worker_name` must be in the command dispatcher's `worker_names`.
+
+    The handlers for an event are run concurrently, with at most
+    `max_concurrent_handlers` handlers running at a time across all events.
+    A handler that fails or takes longer than `handler_timeout` seconds is
+    logged and doesn't affect the other handlers. The latency, errors and
+    timeouts of each handler are published as metrics.
+
     TODO: We should wrap the command publisher and such to make event handlers
           saner. Or something.
 
@@ -80,31 +97,67 @@ class EventDispatcher(ApplicationWorker):
 
     :param dict event_handlers:
         A mapping from handler name to fully-qualified class name.
+    :param str worker_name:
+        The name to consume control commands for. Defaults to
+        `event_dispatcher`.
+    :param int max_concurrent_handlers:
+        The maximum number of handlers to run at the same time. Defaults
+        to 10.
+    :param float handler_timeout:
+        How long a handler may take, in seconds. Defaults to 30.
+    :param float account_config_check_interval:
+        How often to check the version of a cached account config, in
+        seconds. Defaults to 60.
+    :param str metrics_prefix:
+        The prefix for handler metrics. Defaults to `go.event_dispatcher.`.
     """
 
     # TODO: Make this not an ApplicationWorker.
 
+    clock = reactor
+
     def validate_config(self):
         self.api_event_consumer = None
+        self.control_consumer = None
         self.handler_config = self.config.get('event_handlers', {})
         self.account_handler_configs = self.config.get(
             'account_handler_configs', {})
+        self.worker_name = self.config.get(
+            'worker_name', EVENT_DISPATCHER_WORKER_NAME)
+        self.max_concurrent_handlers = self.config.get(
+            'max_concurrent_handlers', 10)
+        self.handler_timeout = self.config.get('handler_timeout', 30)
+        self.account_config_check_interval = self.config.get(
+            'account_config_check_interval', 60)
+        self.metrics_prefix = self.config.get(
+            'metrics_prefix', 'go.event_dispatcher.')
 
     @inlineCallbacks
     def setup_application(self):
         self.handlers = {}
+        self.handler_semaphore = DeferredSemaphore(
+            self.max_concurrent_handlers)
 
         self.api_command_publisher = yield self.start_publisher(
             ApiCommandPublisher)
+        self.metric_publisher = yield self.start_publisher(MetricPublisher)
+        self.metrics = MetricManager(
+            self.metrics_prefix, publisher=self.metric_publisher)
+        self.metrics.start_polling()
         self.vumi_api = yield VumiApi.from_config_async(
             self.config, self.api_command_publisher)
         self.account_config = {}
+        # Account key -> (config version, time the version was checked)
+        self.account_config_versions = {}
 
         for name, handler_class in self.handler_config.items():
             cls = load_class_by_string(handler_class)
             self.handlers[name] = cls(self, self.config.get(name, {}))
             yield self.handlers[name].setup_handler()
 
+        self.control_consumer = yield self.consume(
+            '%s.control' % (self.worker_name,), self.consume_control_command,
+            message_class=VumiApiCommand)
         self.api_event_consumer = yield self.consume(
             ApiEventPublisher.routing_key, self.consume_api_event,
             message_class=VumiApiEvent)
@@ -114,10 +167,54 @@ class EventDispatcher(ApplicationWorker):
         if self.api_event_consumer:
             yield self.api_event_consumer.stop()
             self.api_event_consumer = None
+        if self.control_consumer:
+            yield self.control_consumer.stop()
+            self.control_consumer = None
+        self.metrics.stop_polling()
 
         for name, handler in self.handlers.items():
             yield handler.teardown_handler()
 
+    def consume_control_command(self, cmd):
+        cmd_method = getattr(
+            self, 'process_command_%s' % (cmd.get('command'),), None)
+        if cmd_method is None:
+            log.error('Unknown event dispatcher command: %s' % (cmd,))
+            return
+        return cmd_method(*cmd['args'], **cmd['kwargs'])
+
+    def process_command_reload_account_config(self, account_key, version):
+        """
+        Drop the cached config for `account_key` if it's older than
+        `version`.
+        """
+        cached_version, _ = self.account_config_versions.get(
+            account_key, (None, None))
+        if cached_version is None or cached_version < version:
+            self.account_config.pop(account_key, None)
+            self.account_config_versions.pop(account_key, None)
+
+    @inlineCallbacks
+    def account_config_is_current(self, account_key):
+        """
+        Check whether the cached config for `account_key` is current,
+        checking its version at most every `account_config_check_interval`
+        seconds. Configs that weren't loaded from an account (such as those
+        given in the worker config) are always current.
+        """
+        if account_key not in self.account_config_versions:
+            returnValue(True)
+        cached_version, checked_at = self.account_config_versions[account_key]
+        now = self.clock.seconds()
+        if now - checked_at < self.account_config_check_interval:
+            returnValue(True)
+        version = yield self.vumi_api.get_event_handler_config_version(
+            account_key)
+        if version != cached_version:
+            returnValue(False)
+        self.account_config_versions[account_key] = (version, now)
+        returnValue(True)
+
     @inlineCallbacks
     def get_account_config(self, account_key):
         """Find the appropriate account config.
@@ -147,19 +244,63 @@ class EventDispatcher(ApplicationWorker):
 
         Hence the juggling of eggs below.
         """
-        if account_key not in self.account_config:
-            user_account = yield self.vumi_api.get_user_account(account_key)
-            event_handler_config = {}
-            for k, v in (user_account.event_handler_config or
-                         self.account_handler_configs.get(account_key) or []):
-                event_handler_config[tuple(k)] = v
-            self.account_config[account_key] = event_handler_config
-        returnValue(self.account_config[account_key])
+        if (account_key in self.account_config and
+                (yield self.account_config_is_current(account_key))):
+            returnValue(self.account_config[account_key])
+
+        # We get the version before loading the config so that a config
+        # saved while we're loading is reloaded next time.
+        version = yield self.vumi_api.get_event_handler_config_version(
+            account_key)
+        user_account = yield self.vumi_api.get_user_account(account_key)
+        event_handler_config = {}
+        for k, v in (user_account.event_handler_config or
+                     self.account_handler_configs.get(account_key) or []):
+            event_handler_config[tuple(k)] = v
+        self.account_config[account_key] = event_handler_config
+        self.account_config_versions[account_key] = (
+            version, self.clock.seconds())
+        returnValue(event_handler_config)
+
+    @inlineCallbacks
+    def run_handler(self, handler_name, event, handler_config):
+        """
+        Run a handler, cancelling it if it takes longer than
+        `handler_timeout` seconds. Errors are logged rather than raised.
+        """
+        handler = self.handlers.get(handler_name)
+        if handler is None:
+            log.error('Unknown event handler: %r' % (handler_name,))
+            return
+
+        start = self.clock.seconds()
+        d = maybeDeferred(handler.handle_event, event, handler_config)
+        timeout = self.clock.callLater(self.handler_timeout, d.cancel)
+        try:
+            yield d
+        except CancelledError:
+            log.warning('Event handler %r timed out handling event: %r' % (
+                handler_name, event))
+            self.metrics.oneshot(
+                Metric('handlers.%s.timeouts' % (handler_name,), [SUM]), 1)
+        except Exception:
+            log.err(None, 'Event handler %r failed handling event: %r' % (
+                handler_name, event))
+            self.metrics.oneshot(
+                Metric('handlers.%s.errors' % (handler_name,), [SUM]), 1)
+        finally:
+            if timeout.active():
+                timeout.cancel()
+            self.metrics.oneshot(
+                Metric('handlers.%s.latency' % (handler_name,), [AVG, MAX]),
+                self.clock.seconds() - start)
 
     @inlineCallbacks
     def consume_api_event(self, event):
         log.msg("Handling event: %r" % (event,))
         config = yield self.get_account_config(event['account_key'])
-        for handler, handler_config in config.get(
-                (event['conversation_key'], event['event_type']), []):
-            yield self.handlers[handler].handle_event(event, handler_config)
+        yield gatherResults([
+            self.handler_semaphore.run(
+                self.run_handler, handler, event, handler_config)
+            for handler, handler_config in config.get(
+                (event['conversation_key'], event['event_type']), [])])
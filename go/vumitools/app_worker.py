@@ -1,6 +1,7 @@
 from zope.interface import implements
 from twisted.internet.defer import (
-    inlineCallbacks, returnValue, maybeDeferred, gatherResults)
+    inlineCallbacks, returnValue, maybeDeferred, gatherResults,
+    DeferredSemaphore)
 
 from vumi import log
 from vumi.worker import BaseWorker
@@ -143,8 +144,10 @@ class GoWorkerMixin(object):
             return
         self._metrics_conversations.add(key_tuple)
         user_api = self.get_user_api(user_account_key)
-        yield self.collect_metrics(user_api, conversation_key)
-        self._metrics_conversations.remove(key_tuple)
+        try:
+            yield self.collect_metrics(user_api, conversation_key)
+        finally:
+            self._metrics_conversations.remove(key_tuple)
 
     @inlineCallbacks
     def process_command_reconcile_cache(self, conversation_key,
@@ -309,6 +312,10 @@ class GoWorkerMixin(object):
 
 
 class GoApplicationMixin(GoWorkerMixin):
+    # The number of conversations from a single `collect_metrics_batch`
+    # command that we collect metrics for concurrently.
+    metrics_batch_concurrency = 10
+
     def get_config_data_for_conversation(self, conversation):
         config = conversation.config.copy()
         config["conversation"] = conversation
@@ -333,6 +340,32 @@ class GoApplicationMixin(GoWorkerMixin):
 
         returnValue(self.get_config_for_conversation(conversation))
 
+    def process_command_collect_metrics_batch(self, conversations):
+        """
+        Collect metrics for a batch of conversations.
+
+        :param list conversations:
+            A list of ``(user_account_key, conversation_key)`` pairs.
+
+        At most :attr:`metrics_batch_concurrency` conversations are processed
+        at the same time. A failure to collect metrics for one conversation
+        is logged and does not affect the rest of the batch.
+        """
+        semaphore = DeferredSemaphore(self.metrics_batch_concurrency)
+
+        def collect(user_account_key, conversation_key):
+            d = semaphore.run(
+                self.process_command_collect_metrics,
+                conversation_key, user_account_key)
+            d.addErrback(
+                log.err, "Error collecting metrics for conversation %s for "
+                "user %s." % (conversation_key, user_account_key))
+            return d
+
+        return gatherResults([
+            collect(user_account_key, conversation_key)
+            for user_account_key, conversation_key in conversations])
+
     @inlineCallbacks
     def process_command_start(self, user_account_key, conversation_key):
         log.info("Starting conversation '%s' for user '%s'." % (
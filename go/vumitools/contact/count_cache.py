@@ -0,0 +1,160 @@
+# -*- test-case-name: go.vumitools.contact.tests.test_count_cache -*-
+
+import re
+
+from twisted.internet.defer import returnValue
+from vumi.persist.redis_base import Manager
+
+
+def contact_data_changed(old_data, new_data):
+    """
+    Return `True` if a contact's data changed in a way that could change
+    which smart groups it belongs to. `old_data` or `new_data` may be `None`
+    for new or deleted contacts.
+    """
+    old_data = dict(old_data or {})
+    new_data = dict(new_data or {})
+    # Materialized smart group memberships are derived from the other data.
+    old_data.pop('smart_groups', None)
+    new_data.pop('smart_groups', None)
+    return old_data != new_data
+
+
+class SmartGroupQuery(object):
+    """
+    A smart group query that can be evaluated against a contact's data
+    without doing a Riak search.
+
+    Only queries made up of `field:term`, `field:prefix*` and
+    `field:"a phrase"` clauses joined by `AND` are supported. Field values
+    are split on whitespace, as Riak search's default analyzer does.
+    """
+
+    CLAUSE_RE = re.compile(
+        r'^(?P<field>[\w-]+):(?:"(?P<phrase>[^"\\*?]+)"'
+        r'|(?P<term>[^\s"\\*?~^()\[\]{}:]+)(?P<prefix>\*)?)$', re.UNICODE)
+
+    def __init__(self, clauses):
+        self.clauses = clauses
+
+    @classmethod
+    def parse(cls, query):
+        """
+        Parse `query` and return a :class:`SmartGroupQuery` for it, or
+        `None` if the query is too complex to evaluate locally.
+        """
+        clauses = []
+        for clause in query.strip().split(u' AND '):
+            match = cls.CLAUSE_RE.match(clause.strip())
+            if match is None:
+                return None
+            if match.group('phrase') is not None:
+                tokens = match.group('phrase').split()
+                if not tokens:
+                    return None
+                clauses.append((match.group('field'), tokens, False))
+            else:
+                clauses.append((
+                    match.group('field'), [match.group('term')],
+                    bool(match.group('prefix'))))
+        return cls(clauses)
+
+    def matches(self, data):
+        """
+        Return `True` if the contact `data` (as returned by
+        :meth:`Contact.get_data`) matches this query. `None` never matches.
+        """
+        if data is None:
+            return False
+        for field, tokens, prefix in self.clauses:
+            value = data.get(field)
+            if not isinstance(value, basestring):
+                return False
+            if not self.match_tokens(value.split(), tokens, prefix):
+                return False
+        return True
+
+    def match_tokens(self, value_tokens, tokens, prefix):
+        if prefix:
+            return any(t.startswith(tokens[0]) for t in value_tokens)
+        size = len(tokens)
+        return any(
+            value_tokens[i:i + size] == tokens
+            for i in range(len(value_tokens) - size + 1))
+
+
+class SmartGroupCountCache(object):
+    """
+    Caches the number of contacts in an account's smart groups.
+
+    Cached counts are adjusted when contacts change if the group's query can
+    be evaluated locally and are discarded otherwise. Each count also
+    expires after `COUNT_TTL` seconds so that it is periodically recounted
+    from Riak in case it has drifted.
+    """
+
+    # How long a count is cached for in seconds
+    COUNT_TTL = 60 * 60
+
+    def __init__(self, redis):
+        self.manager = self.redis = redis
+
+    def group_key(self, group_key):
+        return 'group:%s' % (group_key,)
+
+    @Manager.calls_manager
+    def get_count(self, group):
+        """
+        Return the cached count for the smart `group`, or `None` if there
+        isn't one or it was counted for a different query.
+        """
+        cached = yield self.redis.hgetall(self.group_key(group.key))
+        if cached.get('query') != group.query.encode('utf-8'):
+            returnValue(None)
+        returnValue(int(cached['count']))
+
+    @Manager.calls_manager
+    def set_count(self, group, count):
+        key = self.group_key(group.key)
+        yield self.redis.hmset(key, {
+            'query': group.query.encode('utf-8'),
+            'count': count,
+        })
+        yield self.redis.expire(key, self.COUNT_TTL)
+        yield self.redis.sadd('groups', group.key)
+
+    @Manager.calls_manager
+    def invalidate(self, group_key):
+        yield self.redis.delete(self.group_key(group_key))
+        yield self.redis.srem('groups', group_key)
+
+    @Manager.calls_manager
+    def contact_changed(self, old_data, new_data):
+        """
+        Update the cached counts after a contact's data changes from
+        `old_data` to `new_data`. `old_data` is `None` for new contacts and
+        `new_data` is `None` for deleted contacts.
+        """
+        group_keys = yield self.redis.smembers('groups')
+        # Fetch all the cached counts before waiting for any of them so that
+        # they're fetched concurrently when using an asynchronous Redis
+        # manager.
+        cached_counts = [
+            self.redis.hgetall(self.group_key(group_key))
+            for group_key in group_keys]
+        for group_key, cached in zip(group_keys, cached_counts):
+            cached = yield cached
+            if 'query' not in cached:
+                # The count has expired.
+                yield self.invalidate(group_key)
+                continue
+            query = SmartGroupQuery.parse(cached['query'].decode('utf-8'))
+            if query is None:
+                if contact_data_changed(old_data, new_data):
+                    yield self.invalidate(group_key)
+                continue
+            delta = (int(query.matches(new_data)) -
+                     int(query.matches(old_data)))
+            if delta:
+                yield self.redis.hincrby(
+                    self.group_key(group_key), 'count', delta)
@@ -0,0 +1,22 @@
+from vumi.persist.fields import FieldDescriptor, Unicode
+
+
+class LowerCaseIndexDescriptor(FieldDescriptor):
+    def _add_index(self, modelobj, value):
+        # Index values have to be non-empty, so empty values aren't indexed.
+        if value:
+            modelobj._riak_object.add_index(
+                self.index_name, value.lower().encode('utf-8'))
+
+
+class LowerCaseIndexedUnicode(Unicode):
+    """Field that accepts unicode strings and indexes them lower-cased.
+
+    This allows case-insensitive prefix lookups using index ranges. Empty
+    and null values are not indexed.
+    """
+    descriptor_class = LowerCaseIndexDescriptor
+
+    def __init__(self, index_name, **kw):
+        super(LowerCaseIndexedUnicode, self).__init__(
+            index=True, index_name=index_name, **kw)
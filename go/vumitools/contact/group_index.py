@@ -0,0 +1,106 @@
+# -*- test-case-name: go.vumitools.contact.tests.test_group_index -*-
+
+from twisted.internet.defer import returnValue
+from vumi.persist.redis_base import Manager
+
+
+class GroupNameIndex(object):
+    """
+    Redis sorted sets of an account's contact groups ordered by name.
+
+    Every member has the same score, so Redis orders them by their value,
+    which is the group's UTF-8 encoded name followed by a null byte and the
+    group's key. There is one sorted set for all groups and one each for
+    static and smart groups.
+
+    There is also a set of group keys for each group name, so that groups
+    can be looked up by their exact names.
+    """
+
+    GROUP_TYPES = (None, 'static', 'smart')
+
+    def __init__(self, redis):
+        self.manager = self.redis = redis
+
+    def index_key(self, group_type=None):
+        return 'group_names:%s' % (group_type or 'all',)
+
+    def group_type(self, group):
+        return 'smart' if group.is_smart_group() else 'static'
+
+    def member(self, group):
+        return '%s\x00%s' % (
+            group.name.encode('utf-8'), group.key.encode('utf-8'))
+
+    def member_key(self, member):
+        return member.rsplit('\x00', 1)[1].decode('utf-8')
+
+    def name_key(self, name):
+        return 'group_name_keys:%s' % (name.encode('utf-8'),)
+
+    def member_name_key(self, member):
+        return 'group_name_keys:%s' % (member.rsplit('\x00', 1)[0],)
+
+    def is_built(self):
+        return self.redis.exists('group_names_built')
+
+    @Manager.calls_manager
+    def build(self, groups):
+        """
+        Replace the index with one containing `groups`.
+        """
+        members = yield self.redis.hgetall('group_members')
+        for member in members.itervalues():
+            yield self.redis.delete(self.member_name_key(member))
+        yield self.redis.delete('group_members')
+        for group_type in self.GROUP_TYPES:
+            yield self.redis.delete(self.index_key(group_type))
+        for group in groups:
+            yield self.add_group(group)
+        yield self.redis.set('group_names_built', '1')
+
+    @Manager.calls_manager
+    def add_group(self, group):
+        """
+        Add `group` to the index, replacing any existing entry for it.
+        """
+        yield self.remove_group(group.key)
+        member = self.member(group)
+        yield self.redis.zadd(self.index_key(), **{member: 0})
+        yield self.redis.zadd(
+            self.index_key(self.group_type(group)), **{member: 0})
+        yield self.redis.sadd(self.name_key(group.name), group.key)
+        yield self.redis.hset('group_members', group.key, member)
+
+    @Manager.calls_manager
+    def remove_group(self, group_key):
+        member = yield self.redis.hget('group_members', group_key)
+        if member is None:
+            return
+        for group_type in self.GROUP_TYPES:
+            yield self.redis.zrem(self.index_key(group_type), member)
+        yield self.redis.srem(self.member_name_key(member), group_key)
+        yield self.redis.hdel('group_members', group_key)
+
+    def count(self, group_type=None):
+        return self.redis.zcard(self.index_key(group_type))
+
+    @Manager.calls_manager
+    def keys_page(self, start, stop, group_type=None):
+        """
+        Return the keys of the groups from position `start` up to (but not
+        including) `stop` in name order.
+        """
+        if stop <= start:
+            returnValue([])
+        members = yield self.redis.zrange(
+            self.index_key(group_type), start, stop - 1)
+        returnValue([self.member_key(member) for member in members])
+
+    @Manager.calls_manager
+    def keys_for_name(self, name):
+        """
+        Return the keys of the groups named exactly `name`, sorted.
+        """
+        keys = yield self.redis.smembers(self.name_key(name))
+        returnValue(sorted(key.decode('utf-8') for key in keys))
@@ -42,3 +42,30 @@ class ContactMigrator(ModelMigrator):
             mdata.set_value(field, value, index=('%s_bin' % (field,)))
 
         return mdata
+
+    def migrate_from_2(self, mdata):
+
+        mdata.copy_values(
+            'name', 'surname', 'email_address', 'dob', 'created_at',
+            'msisdn', 'twitter_handle', 'facebook_id', 'bbm_pin', 'gtalk_id',
+            'mxit_id', 'wechat_id')
+        mdata.copy_dynamic_values(
+            'extras-', 'subscription-')
+        mdata.copy_indexes(
+            'user_account_bin', 'groups_bin', 'smart_groups_bin',
+            'msisdn_bin', 'twitter_handle_bin', 'facebook_id_bin',
+            'bbm_pin_bin', 'gtalk_id_bin', 'mxit_id_bin', 'wechat_id_bin')
+
+        # Contacts migrated from older versions only have these as indexes.
+        for field in ('user_account', 'groups', 'smart_groups'):
+            if field in mdata.old_data:
+                mdata.copy_values(field)
+
+        # Add stuff that's new in this version
+        mdata.set_value('$VERSION', 3)
+
+        surname = mdata.old_data['surname']
+        if surname:
+            mdata.add_index('surname_lower_bin', surname.lower())
+
+        return mdata
@@ -1,5 +1,6 @@
 # -*- test-case-name: go.vumitools.tests.test_contact -*-
 
+import time
 from uuid import uuid4
 from datetime import datetime
 
@@ -9,6 +10,10 @@ from vumi.persist.fields import (
     Unicode, ManyToMany, ForeignKey, Timestamp, Dynamic)
 
 from go.vumitools.account import UserAccount, PerAccountStore
+from go.vumitools.contact.count_cache import (
+    SmartGroupCountCache, SmartGroupQuery, contact_data_changed)
+from go.vumitools.contact.fields import LowerCaseIndexedUnicode
+from go.vumitools.contact.group_index import GroupNameIndex
 from go.vumitools.contact.migrations import ContactMigrator
 from go.vumitools.opt_out import OptOutStore
 
@@ -78,12 +83,6 @@ class ContactGroup(Model):
     user_account = ForeignKey(UserAccount)
     created_at = Timestamp(default=datetime.utcnow)
 
-    @Manager.calls_manager
-    def add_contacts(self, contacts, save=True):
-        for contact in contacts:
-            contact.groups.add(self)
-            yield contact.save()
-
     def is_smart_group(self):
         return self.query is not None
 
@@ -94,17 +93,21 @@ class ContactGroup(Model):
 class Contact(Model):
     """A contact"""
 
-    VERSION = 2
+    VERSION = 3
     MIGRATOR = ContactMigrator
 
     # key is UUID
     user_account = ForeignKey(UserAccount)
     name = Unicode(max_length=255, null=True)
-    surname = Unicode(max_length=255, null=True)
+    surname = LowerCaseIndexedUnicode(
+        'surname_lower_bin', max_length=255, null=True)
     email_address = Unicode(null=True)  # EmailField?
     dob = Timestamp(null=True)
     created_at = Timestamp(default=datetime.utcnow)
     groups = ManyToMany(ContactGroup)
+    # Materialized smart group memberships, see
+    # ContactStore.materialize_smart_group().
+    smart_groups = ManyToMany(ContactGroup, backlink='smart_contacts')
     extra = Dynamic(prefix='extras-')
     subscription = Dynamic(prefix='subscription-')
 
@@ -146,7 +149,7 @@ class Contact(Model):
 
 
 class ContactStore(PerAccountStore):
-    NONSETTABLE_CONTACT_FIELDS = ['$VERSION', 'user_account']
+    NONSETTABLE_CONTACT_FIELDS = ['$VERSION', 'user_account', 'smart_groups']
 
     # These two values control how contacts are found based on address.
     # If FIND_BY_INDEX is disabled, search will be used instead of index
@@ -160,10 +163,43 @@ class ContactStore(PerAccountStore):
     FIND_BY_INDEX = True
     FIND_BY_INDEX_SEARCH_FALLBACK = True
 
+    # If FILTER_SURNAME_BY_INDEX is disabled, filtering contacts on surname
+    # uses a map-reduce over every contact instead of the lower-cased
+    # surname index. This finds contacts that have not yet been migrated to
+    # version 3, but is much slower.
+    FILTER_SURNAME_BY_INDEX = True
+
+    # Materialized smart group memberships older than this many seconds are
+    # considered stale and are rebuilt by refresh_stale_smart_groups().
+    MATERIALIZED_GROUP_MAX_AGE = 60 * 60 * 24
+
+    def __init__(self, base_manager, user_account_key, redis=None):
+        # Smart group counts are only cached, smart group memberships are
+        # only materialized and group names are only indexed if we're given
+        # a Redis manager.
+        self.redis = None
+        self.store_redis = None
+        self.count_cache = None
+        self.group_index = None
+        if redis is not None:
+            self.store_redis = redis
+            self.redis = redis.sub_manager(user_account_key)
+            self.count_cache = SmartGroupCountCache(self.redis)
+            self.group_index = GroupNameIndex(self.redis)
+        super(ContactStore, self).__init__(base_manager, user_account_key)
+
     def setup_proxies(self):
         self.contacts = self.manager.proxy(Contact)
         self.groups = self.manager.proxy(ContactGroup)
 
+    @staticmethod
+    def materialized_account_keys(redis):
+        """
+        Return the keys of the accounts with materialized smart groups.
+        `redis` is the Redis manager contact stores are created with.
+        """
+        return redis.smembers('materialized_accounts')
+
     @classmethod
     def settable_contact_fields(cls, **fields):
         return dict((k, v) for k, v in fields.iteritems()
@@ -183,7 +219,7 @@ class ContactStore(PerAccountStore):
         for group in groups:
             contact.add_to_group(group)
 
-        yield contact.save()
+        yield self.save_contact(contact)
         returnValue(contact)
 
     @Manager.calls_manager
@@ -193,6 +229,7 @@ class ContactStore(PerAccountStore):
         fields = self.settable_contact_fields(**fields)
 
         contact = yield self.get_contact_by_key(key)
+        old_data = contact.get_data()
         for field_name, field_value in fields.iteritems():
             if field_name in contact.field_descriptors:
                 setattr(contact, field_name, field_value)
@@ -200,15 +237,50 @@ class ContactStore(PerAccountStore):
         for group in groups:
             contact.add_to_group(group)
 
-        yield contact.save()
+        yield self.save_contact(contact, old_data)
         returnValue(contact)
 
+    @Manager.calls_manager
+    def save_contact(self, contact, old_data=None):
+        """
+        Save `contact` and update the cached smart group counts.
+
+        `old_data` is the contact's data from before it was changed, as
+        returned by :meth:`Contact.get_data`, or `None` for new contacts.
+        """
+        if self.redis is not None:
+            yield self.update_smart_group_memberships(contact, old_data)
+        yield contact.save()
+        if self.count_cache is not None:
+            yield self.count_cache.contact_changed(
+                old_data, contact.get_data())
+
+    @Manager.calls_manager
+    def add_contacts_to_group(self, group, contacts):
+        """
+        Add each of `contacts` to the static `group` and save them.
+        """
+        for contact in contacts:
+            old_data = contact.get_data()
+            contact.add_to_group(group)
+            yield self.save_contact(contact, old_data)
+
+    @Manager.calls_manager
+    def delete_contact(self, contact):
+        """
+        Delete `contact` and update the cached smart group counts.
+        """
+        old_data = contact.get_data()
+        yield contact.delete()
+        if self.count_cache is not None:
+            yield self.count_cache.contact_changed(old_data, None)
+
     @Manager.calls_manager
     def new_group(self, name):
         group_id = uuid4().get_hex()
         group = self.groups(
             group_id, name=name, user_account=self.user_account_key)
-        yield group.save()
+        yield self.save_group(group)
         returnValue(group)
 
     @Manager.calls_manager
@@ -216,9 +288,27 @@ class ContactStore(PerAccountStore):
         group_id = uuid4().get_hex()
         group = self.groups(group_id, name=name,
             user_account=self.user_account_key, query=query)
-        yield group.save()
+        yield self.save_group(group)
         returnValue(group)
 
+    @Manager.calls_manager
+    def save_group(self, group):
+        """
+        Save `group` and update the group name index.
+        """
+        yield group.save()
+        if self.group_index is not None:
+            yield self.group_index.add_group(group)
+
+    @Manager.calls_manager
+    def delete_group(self, group):
+        """
+        Delete `group` and remove it from the group name index.
+        """
+        yield group.delete()
+        if self.group_index is not None:
+            yield self.group_index.remove_group(group.key)
+
     @Manager.calls_manager
     def get_contact_by_key(self, key):
         contact = yield self.contacts.load(key)
@@ -262,20 +352,192 @@ class ContactStore(PerAccountStore):
         """
         return group.backlinks.contacts()
 
+    @Manager.calls_manager
     def get_dynamic_contacts_for_group(self, group):
         """
-        Use Riak search to find matching contacts.
+        Use the materialized membership index if it is up to date, otherwise
+        use Riak search to find matching contacts.
+        """
+        if (yield self.smart_group_is_materialized(group)):
+            keys = yield self.contacts.index_keys('smart_groups', group.key)
+        else:
+            keys = yield self.contacts.raw_search(group.query).get_keys()
+        returnValue(keys)
+
+    def materialized_key(self, group_key):
+        return 'materialized:%s' % (group_key,)
+
+    @Manager.calls_manager
+    def smart_group_is_materialized(self, group):
+        """
+        Return `True` if the smart `group` has an up to date materialized
+        membership index.
+        """
+        if self.redis is None:
+            returnValue(False)
+        materialized = yield self.redis.hgetall(
+            self.materialized_key(group.key))
+        if materialized.get('query') != group.query.encode('utf-8'):
+            returnValue(False)
+        if materialized.get('stale') or 'refreshed_at' not in materialized:
+            returnValue(False)
+        age = time.time() - float(materialized['refreshed_at'])
+        returnValue(age < self.MATERIALIZED_GROUP_MAX_AGE)
+
+    @Manager.calls_manager
+    def materialize_smart_group(self, group):
+        """
+        Build (or rebuild) the materialized membership index for the smart
+        `group` by adding the group to the `smart_groups` of every contact
+        that matches its query and removing it from those that don't.
+
+        Once a group is materialized, contacts saved with
+        :meth:`save_contact` keep the index up to date where possible and
+        mark it stale otherwise. Stale groups are rebuilt by
+        :meth:`refresh_stale_smart_groups`.
+        """
+        key = self.materialized_key(group.key)
+        yield self.store_redis.sadd(
+            'materialized_accounts', self.user_account_key)
+        yield self.redis.sadd('materialized_groups', group.key)
+        # Any contacts saved from here on update the index themselves, or
+        # mark the group stale again. The index isn't used until it has
+        # been rebuilt.
+        yield self.redis.hdel(key, 'refreshed_at')
+        yield self.redis.hmset(key, {
+            'query': group.query.encode('utf-8'),
+            'stale': '',
+        })
+        search_keys = yield self.contacts.raw_search(group.query).get_keys()
+        search_keys = set(search_keys)
+        indexed_keys = yield self.contacts.index_keys(
+            'smart_groups', group.key)
+        indexed_keys = set(indexed_keys)
+
+        for contact_key in search_keys - indexed_keys:
+            contact = yield self.contacts.load(contact_key)
+            if contact is not None:
+                contact.smart_groups.add_key(group.key)
+                yield contact.save()
+        for contact_key in indexed_keys - search_keys:
+            contact = yield self.contacts.load(contact_key)
+            if contact is not None:
+                contact.smart_groups.remove_key(group.key)
+                yield contact.save()
+
+        yield self.redis.hset(key, 'refreshed_at', repr(time.time()))
+
+    @Manager.calls_manager
+    def dematerialize_smart_group(self, group_key):
+        """
+        Remove the materialized membership index for a smart group.
+        """
+        yield self.redis.srem('materialized_groups', group_key)
+        yield self.redis.delete(self.materialized_key(group_key))
+        if not (yield self.redis.scard('materialized_groups')):
+            yield self.store_redis.srem(
+                'materialized_accounts', self.user_account_key)
+        contact_keys = yield self.contacts.index_keys(
+            'smart_groups', group_key)
+        for contact_key in contact_keys:
+            contact = yield self.contacts.load(contact_key)
+            if contact is not None:
+                contact.smart_groups.remove_key(group_key)
+                yield contact.save()
+
+    @Manager.calls_manager
+    def refresh_stale_smart_groups(self):
+        """
+        Rebuild the materialized membership indexes that are out of date.
+        Returns the keys of the groups that were rebuilt.
         """
-        return self.contacts.raw_search(group.query).get_keys()
+        refreshed = []
+        group_keys = yield self.redis.smembers('materialized_groups')
+        for group_key in group_keys:
+            group = yield self.get_group(group_key.decode('utf-8'))
+            if group is None or not group.is_smart_group():
+                yield self.dematerialize_smart_group(group_key)
+            elif not (yield self.smart_group_is_materialized(group)):
+                yield self.materialize_smart_group(group)
+                refreshed.append(group.key)
+        returnValue(refreshed)
 
+    @Manager.calls_manager
+    def update_smart_group_memberships(self, contact, old_data):
+        """
+        Update the materialized smart group memberships of `contact` before
+        it is saved. Groups with queries that can't be evaluated locally are
+        marked stale if the contact's data changed.
+        """
+        group_keys = yield self.redis.smembers('materialized_groups')
+        if not group_keys:
+            return
+        new_data = contact.get_data()
+        old_group_keys = (old_data or {}).get('smart_groups', [])
+        changed = contact_data_changed(old_data, new_data)
+        for group_key in group_keys:
+            group_key = group_key.decode('utf-8')
+            query = yield self.redis.hget(
+                self.materialized_key(group_key), 'query')
+            if query is None:
+                continue
+            query = SmartGroupQuery.parse(query.decode('utf-8'))
+            if query is not None:
+                is_member = query.matches(new_data)
+            else:
+                is_member = group_key in old_group_keys
+                if changed:
+                    yield self.redis.hset(
+                        self.materialized_key(group_key), 'stale', '1')
+            if is_member:
+                contact.smart_groups.add_key(group_key)
+            elif group_key in contact.smart_groups.keys():
+                contact.smart_groups.remove_key(group_key)
+
+    @Manager.calls_manager
     def count_contacts_for_group(self, group):
-        if group.is_smart_group():
-            return self.contacts.raw_search(group.query).get_count()
-        else:
-            return self.contacts.index_lookup('groups', group.key).get_count()
+        if not group.is_smart_group():
+            count = yield self.contacts.index_lookup(
+                'groups', group.key).get_count()
+            returnValue(count)
+
+        if self.count_cache is not None:
+            count = yield self.count_cache.get_count(group)
+            if count is not None:
+                returnValue(count)
+
+        count = yield self.contacts.raw_search(group.query).get_count()
+        if self.count_cache is not None:
+            yield self.count_cache.set_count(group, count)
+        returnValue(count)
 
     @Manager.calls_manager
     def filter_contacts_on_surname(self, letter, group=None):
+        """
+        Return the contacts whose surnames start with `letter` (ignoring
+        case), optionally only those in the static `group`.
+        """
+        if not self.FILTER_SURNAME_BY_INDEX:
+            contacts = yield self.map_reduce_contacts_on_surname(letter, group)
+            returnValue(contacts)
+
+        prefix = letter.lower().encode('utf-8')
+        # Index ranges are inclusive and '\xff' never appears in UTF-8, so
+        # this covers every value starting with `prefix`.
+        keys = yield self.manager.index_keys(
+            Contact, 'surname_lower_bin', prefix, prefix + '\xff')
+        if group is not None:
+            group_keys = yield self.get_static_contacts_for_group(group)
+            group_keys = set(group_keys)
+            keys = [key for key in keys if key in group_keys]
+
+        contacts = []
+        for contacts_bunch in self.contacts.load_all_bunches(keys):
+            contacts.extend((yield contacts_bunch))
+        returnValue([contact for contact in contacts if contact is not None])
+
+    @Manager.calls_manager
+    def map_reduce_contacts_on_surname(self, letter, group=None):
         # FIXME: This does a mapreduce over a bucket, which means hitting every
         #        key in riak.
         # TODO: vumi.persist needs to have better ways of supporting
@@ -311,6 +573,46 @@ class ContactStore(PerAccountStore):
                 manager, result[0], result[1]))
         returnValue(contacts)
 
+    @Manager.calls_manager
+    def search_contacts_page(self, query, after=None, rows=None):
+        """
+        Return a `(keys, next_after)` tuple containing up to `rows` keys,
+        in key order, of contacts matching the Lucene `query` with keys
+        greater than `after`. `next_after` is the last key returned if
+        there are more matches and `None` otherwise.
+
+        Riak search map-reduce inputs can't be limited directly, so when
+        `rows` is given the matches are filtered, sorted and truncated in a
+        reduce phase in Riak and no more than `rows + 1` keys are returned
+        to us.
+        """
+        if rows is None:
+            keys = yield self.contacts.raw_search(query).get_keys()
+            returnValue((sorted(
+                key for key in keys if after is None or key > after), None))
+
+        mr = self.manager.riak_map_reduce()
+        mr.search(self.manager.bucket_name(Contact), query)
+        # Reduce phases may be rerun over their own output, so this must
+        # accept keys as well as the `[bucket, key, data]` search inputs.
+        js_function = """function(values, arg) {
+            var keys = [];
+            values.forEach(function(value) {
+                var key = (typeof value === 'string') ? value : value[1];
+                if (arg.after === null || key > arg.after) {
+                    keys.push(key);
+                }
+            });
+            keys.sort();
+            return keys.slice(0, arg.limit);
+        }"""
+        mr.reduce(js_function, {'arg': {'after': after, 'limit': rows + 1}})
+        keys = sorted((yield self.manager.run_map_reduce(mr)))
+
+        page = keys[:rows]
+        next_after = page[-1] if len(keys) > rows and page else None
+        returnValue((page, next_after))
+
     def list_contacts(self):
         return self.list_keys(self.contacts)
 
@@ -327,16 +629,132 @@ class ContactStore(PerAccountStore):
 
     @Manager.calls_manager
     def list_smart_groups(self):
-        # FIXME: When used with list_static_groups() we load each group twice.
+        if self.group_index is not None:
+            groups = yield self.list_groups_page(0, None, 'smart')
+            returnValue(groups)
         groups = yield self.list_groups()
         returnValue([group for group in groups if group.is_smart_group()])
 
     @Manager.calls_manager
     def list_static_groups(self):
-        # FIXME: When used with list_smart_groups() we load each group twice.
+        if self.group_index is not None:
+            groups = yield self.list_groups_page(0, None, 'static')
+            returnValue(groups)
         groups = yield self.list_groups()
         returnValue([group for group in groups if not group.is_smart_group()])
 
+    @Manager.calls_manager
+    def build_group_index(self):
+        """
+        Build the group name index from the account's groups if it hasn't
+        been built yet. Groups saved with :meth:`save_group` and deleted
+        with :meth:`delete_group` keep it up to date after that.
+        """
+        if not (yield self.group_index.is_built()):
+            yield self.rebuild_group_index()
+
+    @Manager.calls_manager
+    def rebuild_group_index(self):
+        """
+        Rebuild the group name index from the account's groups.
+        """
+        groups = yield self.list_groups()
+        yield self.group_index.build(groups)
+
+    @Manager.calls_manager
+    def get_groups_by_name(self, name):
+        """
+        Return the groups named `name`.
+
+        Groups are looked up in the group name index if we have one. If
+        the index has no groups with this name, a Riak search is used
+        instead in case the groups were saved without updating the index
+        and any groups found are added to the index.
+        """
+        if self.group_index is not None:
+            yield self.build_group_index()
+            keys = yield self.group_index.keys_for_name(name)
+            groups = yield self._load_groups(keys)
+            # Groups deleted or renamed without updating the index are
+            # re-indexed below if they are still around.
+            for key in set(keys) - set(group.key for group in groups):
+                yield self.group_index.remove_group(key)
+            for group in groups:
+                if group.name != name:
+                    yield self.group_index.add_group(group)
+            groups = [group for group in groups if group.name == name]
+            if groups:
+                returnValue(groups)
+
+        keys = yield self.groups.search(name=name).get_keys()
+        groups = yield self._load_groups(keys)
+        if self.group_index is not None:
+            for group in groups:
+                yield self.group_index.add_group(group)
+        returnValue(groups)
+
+    @Manager.calls_manager
+    def count_groups(self, group_type=None):
+        """
+        Return the number of groups of `group_type` (`'static'`, `'smart'`
+        or `None` for all groups).
+        """
+        if self.group_index is None:
+            groups = yield self.list_groups()
+            returnValue(len([
+                group for group in groups
+                if group_type in (None, self._group_type(group))]))
+        yield self.build_group_index()
+        count = yield self.group_index.count(group_type)
+        returnValue(count)
+
+    @Manager.calls_manager
+    def list_groups_page(self, start, stop, group_type=None):
+        """
+        Return the groups of `group_type` (`'static'`, `'smart'` or `None`
+        for all groups) from position `start` up to (but not including)
+        `stop` when ordered by name. If `stop` is `None`, all groups from
+        `start` onwards are returned.
+
+        Only the groups on the page are loaded.
+        """
+        if self.group_index is None:
+            groups = yield self.list_groups()
+            groups = [
+                group for group in groups
+                if group_type in (None, self._group_type(group))]
+            returnValue(groups[start:stop])
+
+        yield self.build_group_index()
+        if stop is None:
+            stop = yield self.group_index.count(group_type)
+        keys = yield self.group_index.keys_page(start, stop, group_type)
+        groups_by_key = {}
+        for groups_bunch in self.groups.load_all_bunches(keys):
+            for group in (yield groups_bunch):
+                groups_by_key[group.key] = group
+
+        groups = []
+        for key in keys:
+            if key in groups_by_key:
+                groups.append(groups_by_key[key])
+            else:
+                # The group has been deleted without updating the index.
+                yield self.group_index.remove_group(key)
+        returnValue(groups)
+
+    @Manager.calls_manager
+    def _load_groups(self, keys):
+        groups = []
+        for groups_bunch in self.groups.load_all_bunches(keys):
+            for group in (yield groups_bunch):
+                if group is not None:
+                    groups.append(group)
+        returnValue(groups)
+
+    def _group_type(self, group):
+        return 'smart' if group.is_smart_group() else 'static'
+
     @Manager.calls_manager
     def contact_has_opted_out(self, contact):
         # FIXME:    opt-outs are currently had coded to only work for msisdns
@@ -142,3 +142,47 @@ class ContactV1(Model):
                     self.gtalk_id or self.twitter_handle or self.msisdn or
                     self.mxit_id or self.wechat_id or
                     'Unknown User')
+
+
+class ContactV2(Model):
+    """A contact"""
+
+    bucket = "contact"
+
+    VERSION = 2
+    MIGRATOR = ContactMigrator
+
+    # key is UUID
+    user_account = ForeignKey(UserAccount)
+    name = Unicode(max_length=255, null=True)
+    surname = Unicode(max_length=255, null=True)
+    email_address = Unicode(null=True)  # EmailField?
+    dob = Timestamp(null=True)
+    created_at = Timestamp(default=datetime.utcnow)
+    groups = ManyToMany(ContactGroupVNone)
+    extra = Dynamic(prefix='extras-')
+    subscription = Dynamic(prefix='subscription-')
+
+    # Address fields
+    msisdn = Unicode(max_length=255, index=True)
+    twitter_handle = Unicode(max_length=100, null=True, index=True)
+    facebook_id = Unicode(max_length=100, null=True, index=True)
+    bbm_pin = Unicode(max_length=100, null=True, index=True)
+    gtalk_id = Unicode(null=True, index=True)
+    mxit_id = Unicode(null=True, index=True)
+    wechat_id = Unicode(null=True, index=True)
+
+    def add_to_group(self, group):
+        if isinstance(group, ContactGroupVNone):
+            self.groups.add(group)
+        else:
+            self.groups.add_key(group)
+
+    def __unicode__(self):
+        if self.name and self.surname:
+            return u' '.join([self.name, self.surname])
+        else:
+            return (self.surname or self.name or
+                    self.gtalk_id or self.twitter_handle or self.msisdn or
+                    self.mxit_id or self.wechat_id or
+                    'Unknown User')
@@ -0,0 +1,131 @@
+from twisted.internet.defer import inlineCallbacks
+
+from vumi.tests.helpers import VumiTestCase, PersistenceHelper
+
+from go.vumitools.contact.count_cache import (
+    SmartGroupQuery, SmartGroupCountCache)
+
+
+class FakeGroup(object):
+    def __init__(self, key, query):
+        self.key = key
+        self.query = query
+
+
+class TestSmartGroupQuery(VumiTestCase):
+
+    def assert_matches(self, query, data):
+        self.assertTrue(SmartGroupQuery.parse(query).matches(data))
+
+    def assert_not_matches(self, query, data):
+        self.assertFalse(SmartGroupQuery.parse(query).matches(data))
+
+    def test_parse_unsupported(self):
+        self.assertEqual(SmartGroupQuery.parse(u'name:foo OR name:bar'), None)
+        self.assertEqual(SmartGroupQuery.parse(u'NOT name:foo'), None)
+        self.assertEqual(SmartGroupQuery.parse(u'msisdn:\\+27*'), None)
+        self.assertEqual(SmartGroupQuery.parse(u'(name:foo)'), None)
+        self.assertEqual(SmartGroupQuery.parse(u'foo'), None)
+
+    def test_term(self):
+        self.assert_matches(u'name:foo', {'name': u'foo'})
+        self.assert_matches(u'name:foo', {'name': u'bar foo'})
+        self.assert_not_matches(u'name:foo', {'name': u'foobar'})
+        self.assert_not_matches(u'name:foo', {'surname': u'foo'})
+        self.assert_not_matches(u'name:foo', None)
+
+    def test_prefix(self):
+        self.assert_matches(u'name:foo*', {'name': u'foobar'})
+        self.assert_not_matches(u'name:foo*', {'name': u'barfoo'})
+
+    def test_phrase(self):
+        self.assert_matches(u'surname:"Foo 1"', {'surname': u'Foo 1'})
+        self.assert_matches(u'surname:"Foo 1"', {'surname': u'A Foo 1'})
+        self.assert_not_matches(u'surname:"Foo 1"', {'surname': u'Foo 2'})
+        self.assert_not_matches(u'surname:"Foo 1"', {'surname': u'1 Foo'})
+
+    def test_conjunction(self):
+        query = u'name:foo AND extras-bar:baz'
+        self.assert_matches(query, {'name': u'foo', 'extras-bar': u'baz'})
+        self.assert_not_matches(query, {'name': u'foo'})
+
+
+class TestSmartGroupCountCache(VumiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.redis = yield self.persistence_helper.get_redis_manager()
+        self.cache = SmartGroupCountCache(self.redis.sub_manager('counts'))
+
+    @inlineCallbacks
+    def test_get_count_missing(self):
+        group = FakeGroup(u'group1', u'name:foo')
+        self.assertEqual((yield self.cache.get_count(group)), None)
+
+    @inlineCallbacks
+    def test_set_count(self):
+        group = FakeGroup(u'group1', u'name:foo')
+        yield self.cache.set_count(group, 3)
+        self.assertEqual((yield self.cache.get_count(group)), 3)
+        ttl = yield self.cache.redis.ttl('group:group1')
+        self.assertTrue(0 < ttl <= SmartGroupCountCache.COUNT_TTL)
+
+    @inlineCallbacks
+    def test_get_count_query_changed(self):
+        group = FakeGroup(u'group1', u'name:foo')
+        yield self.cache.set_count(group, 3)
+        group.query = u'name:bar'
+        self.assertEqual((yield self.cache.get_count(group)), None)
+
+    @inlineCallbacks
+    def test_invalidate(self):
+        group = FakeGroup(u'group1', u'name:foo')
+        yield self.cache.set_count(group, 3)
+        yield self.cache.invalidate(group.key)
+        self.assertEqual((yield self.cache.get_count(group)), None)
+        self.assertEqual((yield self.cache.redis.smembers('groups')), set())
+
+    @inlineCallbacks
+    def test_contact_changed(self):
+        group = FakeGroup(u'group1', u'name:foo')
+        yield self.cache.set_count(group, 3)
+        yield self.cache.contact_changed(None, {'name': u'foo'})
+        self.assertEqual((yield self.cache.get_count(group)), 4)
+        yield self.cache.contact_changed({'name': u'foo'}, {'name': u'bar'})
+        self.assertEqual((yield self.cache.get_count(group)), 3)
+        yield self.cache.contact_changed({'name': u'bar'}, {'name': u'baz'})
+        self.assertEqual((yield self.cache.get_count(group)), 3)
+        yield self.cache.contact_changed({'name': u'bar'}, None)
+        self.assertEqual((yield self.cache.get_count(group)), 3)
+
+    @inlineCallbacks
+    def test_contact_changed_multiple_groups(self):
+        group1 = FakeGroup(u'group1', u'name:foo')
+        group2 = FakeGroup(u'group2', u'name:bar')
+        group3 = FakeGroup(u'group3', u'name:foo OR name:bar')
+        yield self.cache.set_count(group1, 3)
+        yield self.cache.set_count(group2, 5)
+        yield self.cache.set_count(group3, 8)
+        yield self.cache.contact_changed({'name': u'foo'}, {'name': u'bar'})
+        self.assertEqual((yield self.cache.get_count(group1)), 2)
+        self.assertEqual((yield self.cache.get_count(group2)), 6)
+        self.assertEqual((yield self.cache.get_count(group3)), None)
+
+    @inlineCallbacks
+    def test_contact_changed_unsupported_query(self):
+        group = FakeGroup(u'group1', u'name:foo OR name:bar')
+        yield self.cache.set_count(group, 3)
+        yield self.cache.contact_changed({'name': u'a'}, {'name': u'a'})
+        self.assertEqual((yield self.cache.get_count(group)), 3)
+        yield self.cache.contact_changed({'name': u'a'}, {'name': u'bar'})
+        self.assertEqual((yield self.cache.get_count(group)), None)
+
+    @inlineCallbacks
+    def test_contact_changed_expired(self):
+        group = FakeGroup(u'group1', u'name:foo')
+        yield self.cache.set_count(group, 3)
+        yield self.cache.redis.delete('group:group1')
+        yield self.cache.contact_changed(None, {'name': u'foo'})
+        self.assertEqual((yield self.cache.get_count(group)), None)
+        self.assertEqual((yield self.cache.redis.smembers('groups')), set())
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+from twisted.internet.defer import inlineCallbacks
+
+from vumi.tests.helpers import VumiTestCase, PersistenceHelper
+
+from go.vumitools.contact.group_index import GroupNameIndex
+
+
+class FakeGroup(object):
+    def __init__(self, key, name, query=None):
+        self.key = key
+        self.name = name
+        self.query = query
+
+    def is_smart_group(self):
+        return self.query is not None
+
+
+class TestGroupNameIndex(VumiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.redis = yield self.persistence_helper.get_redis_manager()
+        self.index = GroupNameIndex(self.redis.sub_manager('groups'))
+
+    @inlineCallbacks
+    def test_build(self):
+        self.assertFalse((yield self.index.is_built()))
+        yield self.index.build([
+            FakeGroup(u'key1', u'b'),
+            FakeGroup(u'key2', u'a', u'name:foo'),
+        ])
+        self.assertTrue((yield self.index.is_built()))
+        self.assertEqual(
+            (yield self.index.keys_page(0, 10)), [u'key2', u'key1'])
+
+    @inlineCallbacks
+    def test_build_replaces_index(self):
+        yield self.index.build([FakeGroup(u'key1', u'a')])
+        yield self.index.build([FakeGroup(u'key2', u'b')])
+        self.assertEqual((yield self.index.keys_page(0, 10)), [u'key2'])
+        self.assertEqual((yield self.index.count()), 1)
+
+    @inlineCallbacks
+    def test_add_group(self):
+        yield self.index.add_group(FakeGroup(u'key1', u'c'))
+        yield self.index.add_group(FakeGroup(u'key2', u'a'))
+        yield self.index.add_group(FakeGroup(u'key3', u'b', u'name:foo'))
+        self.assertEqual((yield self.index.count()), 3)
+        self.assertEqual((yield self.index.count('static')), 2)
+        self.assertEqual((yield self.index.count('smart')), 1)
+        self.assertEqual(
+            (yield self.index.keys_page(0, 10)), [u'key2', u'key3', u'key1'])
+        self.assertEqual(
+            (yield self.index.keys_page(0, 10, 'static')), [u'key2', u'key1'])
+        self.assertEqual(
+            (yield self.index.keys_page(0, 10, 'smart')), [u'key3'])
+
+    @inlineCallbacks
+    def test_add_group_renamed(self):
+        group = FakeGroup(u'key1', u'a')
+        yield self.index.add_group(group)
+        yield self.index.add_group(FakeGroup(u'key2', u'b'))
+        group.name = u'c'
+        yield self.index.add_group(group)
+        self.assertEqual((yield self.index.count()), 2)
+        self.assertEqual(
+            (yield self.index.keys_page(0, 10)), [u'key2', u'key1'])
+
+    @inlineCallbacks
+    def test_add_group_unicode(self):
+        yield self.index.add_group(FakeGroup(u'key1', u'Zoë'))
+        yield self.index.add_group(FakeGroup(u'key2', u'Zo'))
+        self.assertEqual(
+            (yield self.index.keys_page(0, 10)), [u'key2', u'key1'])
+
+    @inlineCallbacks
+    def test_remove_group(self):
+        yield self.index.add_group(FakeGroup(u'key1', u'a', u'name:foo'))
+        yield self.index.remove_group(u'key1')
+        yield self.index.remove_group(u'unknown')
+        self.assertEqual((yield self.index.count()), 0)
+        self.assertEqual((yield self.index.count('smart')), 0)
+
+    @inlineCallbacks
+    def test_keys_page(self):
+        for i in range(5):
+            yield self.index.add_group(
+                FakeGroup(u'key%s' % (i,), u'group %s' % (i,)))
+        self.assertEqual(
+            (yield self.index.keys_page(1, 3)), [u'key1', u'key2'])
+        self.assertEqual((yield self.index.keys_page(4, 10)), [u'key4'])
+        self.assertEqual((yield self.index.keys_page(5, 10)), [])
+        self.assertEqual((yield self.index.keys_page(3, 3)), [])
+
+    @inlineCallbacks
+    def test_keys_for_name(self):
+        yield self.index.add_group(FakeGroup(u'key1', u'Zoë'))
+        yield self.index.add_group(FakeGroup(u'key2', u'Zo'))
+        self.assertEqual((yield self.index.keys_for_name(u'Zoë')), [u'key1'])
+        self.assertEqual((yield self.index.keys_for_name(u'Zo')), [u'key2'])
+        self.assertEqual((yield self.index.keys_for_name(u'zo')), [])
+
+    @inlineCallbacks
+    def test_keys_for_name_duplicates(self):
+        yield self.index.add_group(FakeGroup(u'key2', u'a'))
+        yield self.index.add_group(FakeGroup(u'key1', u'a', u'name:foo'))
+        self.assertEqual(
+            (yield self.index.keys_for_name(u'a')), [u'key1', u'key2'])
+
+    @inlineCallbacks
+    def test_keys_for_name_renamed(self):
+        group = FakeGroup(u'key1', u'a')
+        yield self.index.add_group(group)
+        group.name = u'b'
+        yield self.index.add_group(group)
+        self.assertEqual((yield self.index.keys_for_name(u'a')), [])
+        self.assertEqual((yield self.index.keys_for_name(u'b')), [u'key1'])
+
+    @inlineCallbacks
+    def test_keys_for_name_removed(self):
+        yield self.index.add_group(FakeGroup(u'key1', u'a'))
+        yield self.index.add_group(FakeGroup(u'key2', u'a'))
+        yield self.index.remove_group(u'key1')
+        self.assertEqual((yield self.index.keys_for_name(u'a')), [u'key2'])
+
+    @inlineCallbacks
+    def test_build_replaces_names(self):
+        yield self.index.build([FakeGroup(u'key1', u'a')])
+        yield self.index.build([FakeGroup(u'key2', u'b')])
+        self.assertEqual((yield self.index.keys_for_name(u'a')), [])
+        self.assertEqual((yield self.index.keys_for_name(u'b')), [u'key2'])
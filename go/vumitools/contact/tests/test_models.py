@@ -6,7 +6,8 @@ from vumi.tests.helpers import VumiTestCase, PersistenceHelper
 from go.vumitools.account.models import AccountStore
 from go.vumitools.contact.models import (
     ContactNotFoundError, Contact, ContactStore)
-from go.vumitools.contact.old_models import ContactVNone, ContactV1
+from go.vumitools.contact.old_models import (
+    ContactVNone, ContactV1, ContactV2)
 from go.vumitools.tests.helpers import VumiApiHelper
 
 
@@ -23,7 +24,8 @@ class TestContact(VumiTestCase):
         per_account_manager = riak_manager.sub_manager(self.user.key)
         self.contacts_vnone = per_account_manager.proxy(ContactVNone)
         self.contacts_v1 = per_account_manager.proxy(ContactV1)
-        self.contacts_v2 = per_account_manager.proxy(Contact)
+        self.contacts_v2 = per_account_manager.proxy(ContactV2)
+        self.contacts_v3 = per_account_manager.proxy(Contact)
 
     def assert_with_index(self, model_obj, field, value):
         self.assertEqual(getattr(model_obj, field), value)
@@ -56,6 +58,14 @@ class TestContact(VumiTestCase):
     def make_contact_v2(self, **fields):
         return self._make_contact(self.contacts_v2, **fields)
 
+    def make_contact_v3(self, **fields):
+        return self._make_contact(self.contacts_v3, **fields)
+
+    def get_index_values(self, model_obj, index_name):
+        return [index.get_value()
+                for index in model_obj._riak_object.get_indexes()
+                if index.get_field() == index_name]
+
     @inlineCallbacks
     def test_contact_vnone(self):
         contact = yield self.make_contact_vnone(name=u'name', msisdn=u'msisdn')
@@ -148,6 +158,63 @@ class TestContact(VumiTestCase):
         self.assert_with_index(contact_v2, 'mxit_id', None)
         self.assert_with_index(contact_v2, 'wechat_id', None)
 
+    @inlineCallbacks
+    def test_contact_v3(self):
+        contact = yield self.make_contact_v3(
+            name=u'name', surname=u'Sur\xf1ame', msisdn=u'msisdn')
+        self.assertEqual(contact.surname, u'Sur\xf1ame')
+        self.assertEqual(
+            self.get_index_values(contact, 'surname_lower_bin'),
+            [u'sur\xf1ame'.encode('utf-8')])
+        self.assert_with_index(contact, 'msisdn', 'msisdn')
+
+    @inlineCallbacks
+    def test_contact_v3_without_surname(self):
+        contact = yield self.make_contact_v3(name=u'name', msisdn=u'msisdn')
+        self.assertEqual(
+            self.get_index_values(contact, 'surname_lower_bin'), [])
+        contact.surname = u''
+        self.assertEqual(
+            self.get_index_values(contact, 'surname_lower_bin'), [])
+        contact.surname = u'Surname'
+        self.assertEqual(
+            self.get_index_values(contact, 'surname_lower_bin'), ['surname'])
+
+    @inlineCallbacks
+    def test_contact_v2_to_v3(self):
+        contact_v2 = yield self.make_contact_v2(
+            name=u'name', surname=u'Surname', msisdn=u'msisdn',
+            twitter_handle=u'twitter', mxit_id=u'mxit')
+        contact_v2.extra["thing"] = u"extra-thing"
+        contact_v2.add_to_group(u'group1')
+        yield contact_v2.save()
+        self.assertEqual(contact_v2.VERSION, 2)
+        contact_v3 = yield self.contacts_v3.load(contact_v2.key)
+        self.assertEqual(contact_v3.name, 'name')
+        self.assertEqual(contact_v3.surname, 'Surname')
+        self.assertEqual(contact_v3.extra["thing"], u"extra-thing")
+        self.assertEqual(contact_v3.groups.keys(), [u'group1'])
+        self.assertEqual(contact_v3.user_account.key, self.user.key)
+        self.assertEqual(contact_v3.VERSION, 3)
+        self.assert_with_index(contact_v3, 'msisdn', 'msisdn')
+        self.assert_with_index(contact_v3, 'twitter_handle', 'twitter')
+        self.assert_with_index(contact_v3, 'mxit_id', 'mxit')
+        self.assertEqual(
+            self.get_index_values(contact_v3, 'surname_lower_bin'),
+            ['surname'])
+
+    @inlineCallbacks
+    def test_contact_v1_to_v3(self):
+        contact_v1 = yield self.make_contact_v1(
+            name=u'name', surname=u'Surname', msisdn=u'msisdn')
+        contact_v3 = yield self.contacts_v3.load(contact_v1.key)
+        self.assertEqual(contact_v3.VERSION, 3)
+        self.assertEqual(contact_v3.user_account.key, self.user.key)
+        self.assert_with_index(contact_v3, 'msisdn', 'msisdn')
+        self.assertEqual(
+            self.get_index_values(contact_v3, 'surname_lower_bin'),
+            ['surname'])
+
 
 class TestContactStore(VumiTestCase):
     @inlineCallbacks
@@ -13,6 +13,7 @@ from vumi.components.message_store import Batch
 from go.vumitools.account import UserAccount, PerAccountStore
 from go.vumitools.contact import ContactGroup
 from go.vumitools.conversation.migrators import ConversationMigrator
+from go.vumitools.conversation.summary_index import ConversationSummaryIndex
 from go.vumitools.routing_table import GoConnector
 
 
@@ -129,6 +130,16 @@ class Conversation(Model):
 
 
 class ConversationStore(PerAccountStore):
+    def __init__(self, base_manager, user_account_key, redis=None):
+        # Conversation summaries are only indexed if we're given a Redis
+        # manager.
+        self.redis = None
+        self.summary_index = None
+        if redis is not None:
+            self.redis = redis.sub_manager(user_account_key)
+            self.summary_index = ConversationSummaryIndex(self.redis)
+        super(ConversationStore, self).__init__(base_manager, user_account_key)
+
     def setup_proxies(self):
         self.conversations = self.manager.proxy(Conversation)
 
@@ -154,7 +165,17 @@ class ConversationStore(PerAccountStore):
         for group in groups:
             conversation.add_group(group)
 
+        conversation = yield self.save_conversation(conversation)
+        returnValue(conversation)
+
+    @Manager.calls_manager
+    def save_conversation(self, conversation):
+        """
+        Save `conversation` and update its summary in the summary index.
+        """
         conversation = yield conversation.save()
+        if self.summary_index is not None:
+            yield self.summary_index.add_conversation(conversation)
         returnValue(conversation)
 
     def list_running_conversations(self):
@@ -177,3 +198,63 @@ class ConversationStore(PerAccountStore):
     def load_all_bunches(self, keys):
         # Convenience to avoid the extra attribute lookup everywhere.
         return self.conversations.load_all_bunches(keys)
+
+    @Manager.calls_manager
+    def _load_all_conversations(self):
+        keys = yield self.list_conversations()
+        conversations = []
+        for convs_bunch in self.load_all_bunches(keys):
+            conversations.extend((yield convs_bunch))
+        returnValue(conversations)
+
+    @Manager.calls_manager
+    def build_summary_index(self):
+        """
+        Build the summary index from every conversation in the account if
+        it hasn't been built or has expired.
+        """
+        if not (yield self.summary_index.is_built()):
+            conversations = yield self._load_all_conversations()
+            yield self.summary_index.build(conversations)
+
+    @Manager.calls_manager
+    def list_conversation_summaries(self, conversation_status=None,
+                                    conversation_type=None, query=None):
+        """
+        Return summaries of the conversations with `conversation_status`
+        (`'running'`, `'finished'`, `'draft'` or `None` for all active
+        conversations) and `conversation_type` whose names contain `query`,
+        newest first. See :class:`ConversationSummaryIndex` for the fields
+        in a summary.
+        """
+        if self.summary_index is None:
+            conversations = yield self._load_all_conversations()
+            index = ConversationSummaryIndex(None)
+            returnValue(index.filter_summaries(
+                [index.summarize(conv) for conv in conversations],
+                conversation_status, conversation_type, query))
+
+        yield self.build_summary_index()
+        summaries = yield self.summary_index.get_summaries(
+            conversation_status, conversation_type, query)
+        returnValue(summaries)
+
+    @Manager.calls_manager
+    def load_conversations(self, keys):
+        """
+        Return the conversations with the given `keys`, in the same order.
+        Conversations that no longer exist are left out and removed from
+        the summary index.
+        """
+        convs_by_key = {}
+        for convs_bunch in self.load_all_bunches(keys):
+            for conv in (yield convs_bunch):
+                convs_by_key[conv.key] = conv
+
+        conversations = []
+        for key in keys:
+            if key in convs_by_key:
+                conversations.append(convs_by_key[key])
+            elif self.summary_index is not None:
+                yield self.summary_index.remove_conversation(key)
+        returnValue(conversations)
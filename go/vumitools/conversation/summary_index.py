@@ -0,0 +1,110 @@
+# -*- test-case-name: go.vumitools.conversation.tests.test_summary_index -*-
+
+import json
+
+from twisted.internet.defer import returnValue
+from vumi.persist.redis_base import Manager
+
+
+class ConversationSummaryIndex(object):
+    """
+    A Redis hash of summaries of an account's conversations.
+
+    Each conversation's name, type, statuses and creation time are stored as
+    JSON in the `summaries` hash under the conversation's key, so that the
+    account's conversations can be filtered, sorted and paged without
+    loading them from Riak.
+
+    The index is rebuilt from Riak after `BUILT_TTL` seconds in case it has
+    drifted because a conversation was saved without updating it.
+    """
+
+    # How long the index is used for before it is rebuilt, in seconds
+    BUILT_TTL = 60 * 60
+
+    # Functions that filter summaries by the conversation statuses used in
+    # the conversation dashboard. `None` selects all active conversations.
+    STATUS_FILTERS = {
+        None: lambda s: s['archive_status'] == u'active',
+        'running': lambda s: s['status'] == u'running',
+        'finished': lambda s: s['archive_status'] == u'archived',
+        'draft': lambda s: (
+            s['archive_status'] == u'active' and s['status'] == u'stopped'),
+    }
+
+    def __init__(self, redis):
+        self.manager = self.redis = redis
+
+    def summarize(self, conversation):
+        created_at = conversation.created_at
+        return {
+            'key': conversation.key,
+            'name': conversation.name,
+            'conversation_type': conversation.conversation_type,
+            'status': conversation.status,
+            'archive_status': conversation.archive_status,
+            'created_at': (
+                created_at.strftime('%Y-%m-%d %H:%M:%S.%f')
+                if created_at is not None else u''),
+        }
+
+    def is_built(self):
+        return self.redis.exists('summaries_built')
+
+    @Manager.calls_manager
+    def build(self, conversations):
+        """
+        Replace the index with one containing `conversations`.
+        """
+        yield self.redis.delete('summaries')
+        for conversation in conversations:
+            yield self.add_conversation(conversation)
+        yield self.redis.set('summaries_built', '1')
+        yield self.redis.expire('summaries_built', self.BUILT_TTL)
+
+    def add_conversation(self, conversation):
+        """
+        Add `conversation` to the index, replacing any existing summary of
+        it.
+        """
+        return self.redis.hset(
+            'summaries', conversation.key,
+            json.dumps(self.summarize(conversation)))
+
+    def remove_conversation(self, conversation_key):
+        return self.redis.hdel('summaries', conversation_key)
+
+    def filter_summaries(self, summaries, conversation_status=None,
+                         conversation_type=None, query=None):
+        """
+        Return the `summaries` of conversations with the given status and
+        type whose names contain `query`, newest first.
+        """
+        status_filter = self.STATUS_FILTERS[conversation_status]
+        if query:
+            query = query.lower()
+        matches = []
+        for summary in summaries:
+            if not status_filter(summary):
+                continue
+            if (conversation_type and
+                    summary['conversation_type'] != conversation_type):
+                continue
+            if query and query not in summary['name'].lower():
+                continue
+            matches.append(summary)
+        matches.sort(
+            key=lambda s: (s['created_at'], s['key']), reverse=True)
+        return matches
+
+    @Manager.calls_manager
+    def get_summaries(self, conversation_status=None, conversation_type=None,
+                      query=None):
+        """
+        Return the indexed summaries that match the filters described in
+        :meth:`filter_summaries`.
+        """
+        summaries = yield self.redis.hgetall('summaries')
+        returnValue(self.filter_summaries(
+            [json.loads(summary) for summary in summaries.itervalues()],
+            conversation_status, conversation_type, query))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from vumi.tests.helpers import VumiTestCase, PersistenceHelper
+
+from go.vumitools.conversation.summary_index import ConversationSummaryIndex
+
+
+class FakeConversation(object):
+    def __init__(self, key, name, created_at, conversation_type=u'dummy',
+                 status=u'stopped', archive_status=u'active'):
+        self.key = key
+        self.name = name
+        self.created_at = created_at
+        self.conversation_type = conversation_type
+        self.status = status
+        self.archive_status = archive_status
+
+
+class TestConversationSummaryIndex(VumiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.redis = yield self.persistence_helper.get_redis_manager()
+        self.index = ConversationSummaryIndex(
+            self.redis.sub_manager('conversations'))
+
+    def mkconv(self, key, name, day, **kw):
+        return FakeConversation(key, name, datetime(2014, 1, day), **kw)
+
+    @inlineCallbacks
+    def get_keys(self, *args, **kw):
+        summaries = yield self.index.get_summaries(*args, **kw)
+        returnValue([summary['key'] for summary in summaries])
+
+    @inlineCallbacks
+    def test_build(self):
+        self.assertFalse((yield self.index.is_built()))
+        yield self.index.build([
+            self.mkconv(u'key1', u'a', 1),
+            self.mkconv(u'key2', u'b', 2),
+        ])
+        self.assertTrue((yield self.index.is_built()))
+        self.assertEqual((yield self.get_keys()), [u'key2', u'key1'])
+
+    @inlineCallbacks
+    def test_build_replaces_index(self):
+        yield self.index.build([self.mkconv(u'key1', u'a', 1)])
+        yield self.index.build([self.mkconv(u'key2', u'b', 2)])
+        self.assertEqual((yield self.get_keys()), [u'key2'])
+
+    @inlineCallbacks
+    def test_build_expires(self):
+        yield self.index.build([])
+        ttl = yield self.redis.ttl('conversations:summaries_built')
+        self.assertTrue(0 < ttl <= self.index.BUILT_TTL)
+
+    @inlineCallbacks
+    def test_add_conversation(self):
+        conv = self.mkconv(u'key1', u'a', 1)
+        yield self.index.add_conversation(conv)
+        conv.name = u'b'
+        yield self.index.add_conversation(conv)
+        [summary] = yield self.index.get_summaries()
+        self.assertEqual(summary, {
+            'key': u'key1',
+            'name': u'b',
+            'conversation_type': u'dummy',
+            'status': u'stopped',
+            'archive_status': u'active',
+            'created_at': u'2014-01-01 00:00:00.000000',
+        })
+
+    @inlineCallbacks
+    def test_remove_conversation(self):
+        yield self.index.add_conversation(self.mkconv(u'key1', u'a', 1))
+        yield self.index.add_conversation(self.mkconv(u'key2', u'b', 2))
+        yield self.index.remove_conversation(u'key2')
+        self.assertEqual((yield self.get_keys()), [u'key1'])
+
+    @inlineCallbacks
+    def test_get_summaries_by_status(self):
+        yield self.index.build([
+            self.mkconv(u'draft', u'a', 1),
+            self.mkconv(u'running', u'b', 2, status=u'running'),
+            self.mkconv(u'archived', u'c', 3, archive_status=u'archived'),
+        ])
+        self.assertEqual((yield self.get_keys()), [u'running', u'draft'])
+        self.assertEqual((yield self.get_keys('running')), [u'running'])
+        self.assertEqual((yield self.get_keys('draft')), [u'draft'])
+        self.assertEqual((yield self.get_keys('finished')), [u'archived'])
+
+    @inlineCallbacks
+    def test_get_summaries_by_type_and_query(self):
+        yield self.index.build([
+            self.mkconv(u'key1', u'Foo bar', 1),
+            self.mkconv(u'key2', u'Baz', 2),
+            self.mkconv(u'key3', u'ébar', 3, conversation_type=u'other'),
+        ])
+        self.assertEqual(
+            (yield self.get_keys(conversation_type=u'dummy')),
+            [u'key2', u'key1'])
+        self.assertEqual(
+            (yield self.get_keys(query=u'BAR')), [u'key3', u'key1'])
+        self.assertEqual(
+            (yield self.get_keys(conversation_type=u'other', query=u'bar')),
+            [u'key3'])
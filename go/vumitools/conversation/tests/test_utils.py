@@ -161,6 +161,76 @@ class TestConversationWrapper(VumiTestCase):
         [reply] = yield self.conv.received_messages_in_cache()
         self.assertEqual(msg['message_id'], reply['message_id'])
 
+    def record_message_loads(self, proxy):
+        """
+        Record the keys of the messages loaded from Riak through `proxy`.
+        """
+        loaded_keys = []
+        orig_load_all_bunches = proxy.load_all_bunches
+
+        def load_all_bunches(keys):
+            loaded_keys.extend(keys)
+            return orig_load_all_bunches(keys)
+
+        self.patch(proxy, 'load_all_bunches', load_all_bunches)
+        return loaded_keys
+
+    @inlineCallbacks
+    def test_received_messages_page_riak_loads(self):
+        yield self.conv.start()
+        yield self.msg_helper.add_inbound_to_conv(self.conv, 25)
+        loaded_keys = self.record_message_loads(self.conv.mdb.inbound_messages)
+
+        page = yield self.conv.received_messages_in_cache(0, 20)
+        self.assertEqual(len(loaded_keys), len(page))
+        # Rendering the same page again doesn't load anything from Riak.
+        cached_page = yield self.conv.received_messages_in_cache(0, 20)
+        self.assertEqual(len(loaded_keys), len(page))
+        self.assertEqual(
+            [msg['message_id'] for msg in cached_page],
+            [msg['message_id'] for msg in page])
+
+        # A new message invalidates the cached page.
+        yield self.msg_helper.add_inbound_to_conv(self.conv, 1)
+        yield self.conv.received_messages_in_cache(0, 20)
+        self.assertEqual(len(loaded_keys), 2 * len(page))
+
+    @inlineCallbacks
+    def test_received_messages_sensitive_not_loaded(self):
+        yield self.conv.start()
+        msg = yield self.msg_helper.make_stored_inbound(self.conv, "hi")
+        yield self.msg_helper.make_stored_inbound(
+            self.conv, "hi", helper_metadata={
+                'go': {'sensitive': True},
+            })
+        loaded_keys = self.record_message_loads(self.conv.mdb.inbound_messages)
+        [reply] = yield self.conv.received_messages_in_cache()
+        self.assertEqual(reply['message_id'], msg['message_id'])
+        self.assertEqual(loaded_keys, [msg['message_id']])
+
+    @inlineCallbacks
+    def test_received_messages_cached_include_sensitive_and_scrub(self):
+        yield self.conv.start()
+        yield self.msg_helper.make_stored_inbound(
+            self.conv, "hi", helper_metadata={
+                'go': {'sensitive': True},
+            })
+
+        def scrubber(msg):
+            msg['content'] = 'scrubbed'
+            return msg
+
+        # The cached page holds the unscrubbed message.
+        [msg] = yield self.conv.received_messages_in_cache(
+            include_sensitive=True)
+        self.assertEqual(msg['content'], 'hi')
+        [msg] = yield self.conv.received_messages_in_cache(
+            include_sensitive=True, scrubber=scrubber)
+        self.assertEqual(msg['content'], 'scrubbed')
+        [msg] = yield self.conv.received_messages_in_cache(
+            include_sensitive=True)
+        self.assertEqual(msg['content'], 'hi')
+
     @inlineCallbacks
     def test_sent_messages(self):
         yield self.conv.start()
@@ -487,6 +557,48 @@ class TestConversationWrapper(VumiTestCase):
         for bucket in buckets:
             self.assertEqual(bucket, 2)
 
+    @inlineCallbacks
+    def test_get_aggregate_count_uses_counters(self):
+        yield self.conv.start()
+        yield self.msg_helper.add_inbound_to_conv(
+            self.conv, 20, time_multiplier=12)
+
+        def fail_get_aggregate_keys(*args, **kw):
+            self.fail("Counters should be used.")
+
+        self.patch(self.conv, 'get_aggregate_keys', fail_get_aggregate_keys)
+        inbound_aggregate = yield self.conv.get_aggregate_count('inbound')
+        self.assertEqual(
+            inbound_aggregate,
+            [(datetime.now().date() - timedelta(days=i), 2)
+             for i in range(9, -1, -1)])
+
+    @inlineCallbacks
+    def test_get_aggregate_count_matches_keys(self):
+        yield self.conv.start()
+        yield self.msg_helper.add_inbound_to_conv(
+            self.conv, 15, time_multiplier=7)
+        yield self.msg_helper.add_outbound_to_conv(
+            self.conv, 10, time_multiplier=17)
+        for direction in ['inbound', 'outbound']:
+            counted = yield self.conv.get_aggregate_count(direction)
+            from_keys = yield self.conv.get_aggregate_count(
+                direction, bucket_func=lambda dt: dt.date())
+            self.assertEqual(counted, from_keys)
+
+    @inlineCallbacks
+    def test_get_aggregate_count_uncounted_batch(self):
+        yield self.conv.start()
+        yield self.msg_helper.add_outbound_to_conv(
+            self.conv, 20, time_multiplier=12)
+        # Batches started before aggregates were counted.
+        yield self.conv.mdb.cache.aggregates.clear(self.conv.batch.key)
+        outbound_aggregate = yield self.conv.get_aggregate_count('outbound')
+        self.assertEqual(
+            outbound_aggregate,
+            [(datetime.now().date() - timedelta(days=i), 2)
+             for i in range(9, -1, -1)])
+
     @inlineCallbacks
     def test_get_groups(self):
         groups = yield self.user_helper.user_api.list_groups()
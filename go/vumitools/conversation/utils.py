@@ -29,7 +29,7 @@ class ConversationWrapper(object):
     @Manager.calls_manager
     def stop_conversation(self):
         self.c.set_status_stopping()
-        yield self.c.save()
+        yield self.save()
         yield self.dispatch_command('stop',
                                     user_account_key=self.c.user_account.key,
                                     conversation_key=self.c.key)
@@ -37,13 +37,20 @@ class ConversationWrapper(object):
     @Manager.calls_manager
     def archive_conversation(self):
         self.c.set_status_finished()
-        yield self.c.save()
+        yield self.save()
         yield self._remove_from_routing_table()
 
     def __getattr__(self, name):
         # Proxy anything we don't have back to the wrapped conversation.
         return getattr(self.c, name)
 
+    def save(self):
+        """
+        Save the wrapped conversation and update the account's conversation
+        summary index.
+        """
+        return self.user_api.conversation_store.save_conversation(self.c)
+
     # TODO: Something about setattr?
 
     def get_config(self):
@@ -159,7 +166,7 @@ class ConversationWrapper(object):
         """Send the start command to this conversation's application worker.
         """
         self.c.set_status_starting()
-        yield self.c.save()
+        yield self.save()
 
         yield self.dispatch_command('start',
                                     user_account_key=self.c.user_account.key,
@@ -196,7 +203,7 @@ class ConversationWrapper(object):
                 "content": ("Please visit %s to start your conversation." %
                             (token_url,)),
                 })
-        yield self.c.save()
+        yield self.save()
 
     def count_replies(self):
         """
@@ -303,19 +310,9 @@ class ConversationWrapper(object):
             content of the message to be scrubbed. By default it is a noop
             which leaves the content unchanged.
         """
-        scrubber = scrubber or (lambda msg: msg)
-
-        # Redis counts from zero, so we - 1 on the limit.
-        keys = yield self.mdb.cache.get_inbound_message_keys(
-            self.batch.key, start, limit - 1)
-
-        replies = yield self.collect_messages(
-            keys, self.mdb.inbound_messages, include_sensitive, scrubber)
-
-        # Preserve order
-        returnValue(
-            sorted(replies, key=lambda msg: msg['timestamp'],
-                   reverse=True))
+        replies = yield self._messages_page_in_cache(
+            'inbound', start, limit, include_sensitive, scrubber)
+        returnValue(replies)
 
     def sent_messages(self, start=0, limit=100, include_sensitive=False,
                       scrubber=None):
@@ -346,18 +343,89 @@ class ConversationWrapper(object):
             content of the message to be scrubbed. By default it is a noop
             which leaves the content unchanged.
         """
+        sent_messages = yield self._messages_page_in_cache(
+            'outbound', start, limit, include_sensitive, scrubber)
+        returnValue(sent_messages)
+
+    @Manager.calls_manager
+    def _messages_page_in_cache(self, direction, start, limit,
+                                include_sensitive, scrubber):
+        """
+        Get a page of messages in `direction`, newest first. Pages are
+        cached in the message store cache until the number of messages in
+        that direction changes.
+        """
         scrubber = scrubber or (lambda msg: msg)
+        cache = self.mdb.cache
+        if direction == 'inbound':
+            count_keys = cache.count_inbound_message_keys
+            get_keys = cache.get_inbound_message_keys
+            proxy = self.mdb.inbound_messages
+        else:
+            count_keys = cache.count_outbound_message_keys
+            get_keys = cache.get_outbound_message_keys
+            proxy = self.mdb.outbound_messages
+
+        message_count = yield count_keys(self.batch.key)
+        page = yield cache.pages.get_page(
+            self.batch.key, direction, start, limit, include_sensitive,
+            message_count)
+        if page is None:
+            # Redis counts from zero, so we - 1 on the limit.
+            keys = yield get_keys(self.batch.key, start, limit - 1)
+            page = yield self._load_messages_page(
+                keys, proxy, include_sensitive)
+            yield cache.pages.set_page(
+                self.batch.key, direction, start, limit, include_sensitive,
+                message_count, page)
+
+        messages = []
+        for sensitive, msg in page:
+            if not sensitive:
+                messages.append(msg)
+            else:
+                scrubbed_msg = scrubber(msg)
+                if scrubbed_msg:
+                    messages.append(scrubbed_msg)
+        returnValue(messages)
+
+    @Manager.calls_manager
+    def _load_messages_page(self, keys, proxy, include_sensitive):
+        """
+        Load the messages with the given keys and return a list of
+        `(sensitive, msg)` tuples, newest first. Sensitive messages are
+        left out unless `include_sensitive` is true.
 
-        keys = yield self.mdb.cache.get_outbound_message_keys(
-            self.batch.key, start, limit - 1)
+        If the batch's sensitivity flags are complete, sensitive messages
+        that are left out aren't loaded at all.
+        """
+        flags = yield self.mdb.cache.get_sensitive_flags(self.batch.key, keys)
+        if flags is not None:
+            sensitive_keys = set(
+                key for key, sensitive in zip(keys, flags) if sensitive)
+            if not include_sensitive:
+                keys = [key for key in keys if key not in sensitive_keys]
+
+        messages = []
+        bunches = yield proxy.load_all_bunches(keys)
+        for bunch in bunches:
+            messages.extend((yield bunch))
 
-        sent_messages = yield self.collect_messages(
-            keys, self.mdb.outbound_messages, include_sensitive, scrubber)
+        page = []
+        for message in messages:
+            if message is None:
+                continue
+            msg = message.msg
+            if flags is not None:
+                sensitive = message.key in sensitive_keys
+            else:
+                sensitive = MessageMetadataHelper(self.api, msg).is_sensitive()
+            if include_sensitive or not sensitive:
+                page.append((sensitive, msg))
 
         # Preserve order
-        returnValue(
-            sorted(sent_messages, key=lambda msg: msg['timestamp'],
-                   reverse=True))
+        page.sort(key=lambda item: item[1]['timestamp'], reverse=True)
+        returnValue(page)
 
     def find_inbound_messages_matching(self, pattern, flags="i",
                                        key="msg.content", ttl=None,
@@ -453,6 +521,20 @@ class ConversationWrapper(object):
 
     @Manager.calls_manager
     def get_aggregate_count(self, direction, bucket_func=None):
+        """
+        Get aggregated total count of messages handled bucketed per day.
+
+        The message store's pre-bucketed counters are used if there's no
+        `bucket_func` and the batch's messages have been counted, otherwise
+        the counts are calculated from the message keys.
+        """
+        if bucket_func is None:
+            if direction not in ('inbound', 'outbound'):
+                direction = 'inbound'
+            counts = yield self.mdb.get_aggregate_counts(
+                self.batch.key, direction)
+            if counts is not None:
+                returnValue(counts)
         aggregate_keys = yield self.get_aggregate_keys(direction, bucket_func)
         returnValue([(bucket, len(keys)) for bucket, keys in aggregate_keys])
 
@@ -0,0 +1,272 @@
+# -*- test-case-name: go.vumitools.tests.test_message_store -*-
+
+import json
+from datetime import datetime
+
+from twisted.internet.defer import returnValue
+
+from vumi.components.message_store import MessageStore
+from vumi.components.message_store_cache import MessageStoreCache
+from vumi.message import TransportUserMessage
+from vumi.persist.model import Manager
+from vumi import log
+
+from go.vumitools.utils import MessageMetadataDictHelper
+
+
+def is_sensitive_message(msg):
+    """
+    Return `True` if `msg` has been marked as containing sensitive
+    information.
+    """
+    # Copy the helper metadata because the helper adds a `go` entry to it.
+    helper_metadata = dict(msg.get('helper_metadata') or {})
+    return MessageMetadataDictHelper(helper_metadata).is_sensitive()
+
+
+class MessageAggregates(object):
+    """
+    Per-batch counts of inbound and outbound messages bucketed by the day
+    and by the hour of their timestamps.
+
+    Each batch, direction and bucket size has a Redis hash mapping buckets
+    to message counts. Counts are only complete for batches that have
+    been counted since they were started or reconciled, which is recorded
+    in the `counted` set.
+    """
+
+    DIRECTIONS = ('inbound', 'outbound')
+    BUCKET_FORMATS = {
+        'day': '%Y-%m-%d',
+        'hour': '%Y-%m-%dT%H',
+    }
+
+    def __init__(self, redis):
+        self.redis = self.manager = redis
+
+    def counts_key(self, batch_id, direction, bucket_size):
+        return 'aggregates:%s:%s:%s' % (batch_id, direction, bucket_size)
+
+    def is_counted(self, batch_id):
+        return self.redis.sismember('aggregates:counted', batch_id)
+
+    def mark_counted(self, batch_id):
+        return self.redis.sadd('aggregates:counted', batch_id)
+
+    @Manager.calls_manager
+    def add_message(self, batch_id, direction, timestamp):
+        for bucket_size, bucket_format in self.BUCKET_FORMATS.iteritems():
+            yield self.redis.hincrby(
+                self.counts_key(batch_id, direction, bucket_size),
+                timestamp.strftime(bucket_format), 1)
+
+    @Manager.calls_manager
+    def clear(self, batch_id):
+        yield self.redis.srem('aggregates:counted', batch_id)
+        for direction in self.DIRECTIONS:
+            for bucket_size in self.BUCKET_FORMATS:
+                yield self.redis.delete(
+                    self.counts_key(batch_id, direction, bucket_size))
+
+    @Manager.calls_manager
+    def get_counts(self, batch_id, direction, bucket_size='day'):
+        """
+        Return a sorted list of `(bucket, count)` tuples. Buckets are dates
+        for the `day` bucket size and datetimes for the `hour` bucket size.
+        """
+        bucket_format = self.BUCKET_FORMATS[bucket_size]
+        counts = yield self.redis.hgetall(
+            self.counts_key(batch_id, direction, bucket_size))
+        aggregates = []
+        for bucket, count in counts.iteritems():
+            bucket = datetime.strptime(bucket, bucket_format)
+            if bucket_size == 'day':
+                bucket = bucket.date()
+            aggregates.append((bucket, int(count)))
+        returnValue(sorted(aggregates))
+
+
+class MessagePageCache(object):
+    """
+    Pages of a batch's messages as displayed in conversation message lists.
+
+    Each page is stored in a Redis hash per batch along with the number of
+    messages in the batch when the page was loaded, and is only used while
+    that number stays the same. Every message is stored with its
+    sensitivity flag so that sensitive messages can be scrubbed when the
+    page is read.
+    """
+
+    # How long a batch's pages are kept after the last page was stored
+    PAGES_TTL = 60 * 60
+
+    def __init__(self, redis):
+        self.redis = self.manager = redis
+
+    def pages_key(self, batch_id):
+        return 'message_pages:%s' % (batch_id,)
+
+    def page_field(self, direction, start, limit, include_sensitive):
+        return '%s:%s:%s:%d' % (
+            direction, start, limit, 1 if include_sensitive else 0)
+
+    @Manager.calls_manager
+    def get_page(self, batch_id, direction, start, limit, include_sensitive,
+                 message_count):
+        """
+        Return a list of `(sensitive, msg)` tuples for the page, or `None`
+        if the page isn't cached for the batch's current `message_count`.
+        """
+        page = yield self.redis.hget(
+            self.pages_key(batch_id),
+            self.page_field(direction, start, limit, include_sensitive))
+        if page is None:
+            returnValue(None)
+        page = json.loads(page)
+        if page['message_count'] != message_count:
+            returnValue(None)
+        returnValue([
+            (sensitive, TransportUserMessage.from_json(msg))
+            for sensitive, msg in page['messages']])
+
+    @Manager.calls_manager
+    def set_page(self, batch_id, direction, start, limit, include_sensitive,
+                 message_count, messages):
+        """
+        Store a page of `(sensitive, msg)` tuples loaded when the batch had
+        `message_count` messages.
+        """
+        page = {
+            'message_count': message_count,
+            'messages': [
+                (sensitive, msg.to_json()) for sensitive, msg in messages],
+        }
+        pages_key = self.pages_key(batch_id)
+        yield self.redis.hset(
+            pages_key,
+            self.page_field(direction, start, limit, include_sensitive),
+            json.dumps(page))
+        yield self.redis.expire(pages_key, self.PAGES_TTL)
+
+    def clear(self, batch_id):
+        return self.redis.delete(self.pages_key(batch_id))
+
+
+class GoMessageStoreCache(MessageStoreCache):
+    """
+    Message store cache that also maintains :class:`MessageAggregates`, the
+    sensitivity flags of messages and a :class:`MessagePageCache`.
+
+    Like the aggregates, the sensitivity flags are only complete for
+    batches that have been counted.
+    """
+
+    def __init__(self, redis):
+        super(GoMessageStoreCache, self).__init__(redis)
+        self.aggregates = MessageAggregates(redis)
+        self.pages = MessagePageCache(redis)
+
+    def sensitive_key(self, batch_id):
+        return 'sensitive:%s' % (batch_id,)
+
+    def set_sensitive_flag(self, batch_id, msg):
+        if is_sensitive_message(msg):
+            return self.redis.sadd(
+                self.sensitive_key(batch_id), msg['message_id'])
+        return self.redis.srem(
+            self.sensitive_key(batch_id), msg['message_id'])
+
+    @Manager.calls_manager
+    def get_sensitive_flags(self, batch_id, message_keys):
+        """
+        Return a list of sensitivity flags for `message_keys`, or `None` if
+        the batch's flags aren't complete.
+        """
+        if not (yield self.aggregates.is_counted(batch_id)):
+            returnValue(None)
+        sensitive_key = self.sensitive_key(batch_id)
+        # Make all the calls before waiting for any of them so that they run
+        # concurrently when using an asynchronous Redis manager.
+        flags = [
+            self.redis.sismember(sensitive_key, key) for key in message_keys]
+        results = []
+        for flag in flags:
+            results.append(bool((yield flag)))
+        returnValue(results)
+
+    @Manager.calls_manager
+    def batch_start(self, batch_id, use_counters=True):
+        yield super(GoMessageStoreCache, self).batch_start(
+            batch_id, use_counters=use_counters)
+        yield self.aggregates.mark_counted(batch_id)
+
+    @Manager.calls_manager
+    def clear_batch(self, batch_id):
+        yield super(GoMessageStoreCache, self).clear_batch(batch_id)
+        yield self.aggregates.clear(batch_id)
+        yield self.redis.delete(self.sensitive_key(batch_id))
+        yield self.pages.clear(batch_id)
+
+    @Manager.calls_manager
+    def add_inbound_message(self, batch_id, msg):
+        yield super(GoMessageStoreCache, self).add_inbound_message(
+            batch_id, msg)
+        yield self.aggregates.add_message(
+            batch_id, 'inbound', msg['timestamp'])
+        yield self.set_sensitive_flag(batch_id, msg)
+
+    @Manager.calls_manager
+    def add_outbound_message(self, batch_id, msg):
+        yield super(GoMessageStoreCache, self).add_outbound_message(
+            batch_id, msg)
+        yield self.aggregates.add_message(
+            batch_id, 'outbound', msg['timestamp'])
+        yield self.set_sensitive_flag(batch_id, msg)
+
+
+class GoMessageStore(MessageStore):
+    """
+    Message store that keeps per-batch message counts bucketed by time in
+    its cache.
+    """
+
+    def __init__(self, manager, redis):
+        super(GoMessageStore, self).__init__(manager, redis)
+        self.cache = GoMessageStoreCache(redis)
+
+    @Manager.calls_manager
+    def reconcile_aggregates(self, batch_id):
+        """
+        Rebuild the aggregate message counts and the message sensitivity
+        flags for `batch_id` from the messages in the message store.
+        """
+        aggregates = self.cache.aggregates
+        yield aggregates.clear(batch_id)
+        yield self.cache.redis.delete(self.cache.sensitive_key(batch_id))
+        for direction, get_keys, proxy in [
+                ('inbound', self.batch_inbound_keys, self.inbound_messages),
+                ('outbound', self.batch_outbound_keys,
+                 self.outbound_messages)]:
+            keys = yield get_keys(batch_id)
+            for msgs_bunch in proxy.load_all_bunches(keys):
+                for msg_record in (yield msgs_bunch):
+                    try:
+                        yield aggregates.add_message(
+                            batch_id, direction, msg_record.msg['timestamp'])
+                        yield self.cache.set_sensitive_flag(
+                            batch_id, msg_record.msg)
+                    except Exception:
+                        log.err()
+        yield aggregates.mark_counted(batch_id)
+
+    @Manager.calls_manager
+    def get_aggregate_counts(self, batch_id, direction, bucket_size='day'):
+        """
+        Return the sorted `(bucket, count)` aggregates for `batch_id`, or
+        `None` if the batch's messages haven't all been counted.
+        """
+        aggregates = self.cache.aggregates
+        if not (yield aggregates.is_counted(batch_id)):
+            returnValue(None)
+        counts = yield aggregates.get_counts(batch_id, direction, bucket_size)
+        returnValue(counts)
@@ -18,18 +18,19 @@ class GoMetricsWorkerConfig(BaseWorker.CONFIG_CLASS, GoWorkerConfigMixin):
        into `metrics_interval / metrics_granularity` buckets.
 
        Immediately afterwards and then after each `metrics_granulatiry`
-       interval, the metrics worker sends a `collect_metrics` command to each
-       of the conversations in the current bucket until all buckets have been
-       processed.
+       interval, the metrics worker sends `collect_metrics_batch` commands
+       for the conversations in the current bucket until all buckets have
+       been processed. Each command carries the conversations in the bucket
+       that belong to a single application worker, up to `metrics_batch_size`
+       conversations per command.
 
        Once all buckets have been processed, active conversations are
        collected again and the cycle repeats.
        """
 
     metrics_interval = ConfigInt(
-        "How often (in seconds) the worker should send `collect_metrics` "
-        "commands for each conversation. Must be an integer multiple of "
-        "`metrics_granularity`.",
+        "How often (in seconds) the worker should collect metrics for each "
+        "conversation. Must be an integer multiple of `metrics_granularity`.",
         default=300,
         static=True)
 
@@ -39,6 +40,12 @@ class GoMetricsWorkerConfig(BaseWorker.CONFIG_CLASS, GoWorkerConfigMixin):
         default=5,
         static=True)
 
+    metrics_batch_size = ConfigInt(
+        "The maximum number of conversations to include in a single "
+        "`collect_metrics_batch` command.",
+        default=500,
+        static=True)
+
     def post_validate(self):
         if (self.metrics_interval % self.metrics_granularity != 0):
             raise ConfigError("Metrics interval must be an integer multiple"
@@ -77,6 +84,8 @@ class GoMetricsWorker(BaseWorker, GoWorkerMixin):
         self._buckets = dict((i, []) for i in range(self._num_buckets))
         self._conversation_workers = {}
 
+        self._batch_size = config.metrics_batch_size
+
         self._looper = LoopingCall(self.metrics_loop_func)
         self._looper.start(config.metrics_granularity)
 
@@ -117,9 +126,14 @@ class GoMetricsWorker(BaseWorker, GoWorkerMixin):
     @inlineCallbacks
     def process_bucket(self, bucket):
         convs, self._buckets[bucket] = self._buckets[bucket], []
+        worker_convs = {}
         for account_key, conversation_key, worker_name in convs:
-            yield self.send_metrics_command(
-                account_key, conversation_key, worker_name)
+            worker_convs.setdefault(worker_name, []).append(
+                [account_key, conversation_key])
+        for worker_name, conversations in sorted(worker_convs.items()):
+            for i in range(0, len(conversations), self._batch_size):
+                yield self.send_metrics_batch_command(
+                    conversations[i:i + self._batch_size], worker_name)
 
     def increment_bucket(self):
         self._current_bucket += 1
@@ -152,3 +166,10 @@ class GoMetricsWorker(BaseWorker, GoWorkerMixin):
             conversation_key=conversation_key,
             user_account_key=account_key)
         return self.command_publisher.publish_message(cmd)
+
+    def send_metrics_batch_command(self, conversations, worker_name):
+        cmd = VumiApiCommand.command(
+            worker_name,
+            'collect_metrics_batch',
+            conversations=conversations)
+        return self.command_publisher.publish_message(cmd)
@@ -12,6 +12,7 @@ from vumi.errors import ConfigError
 from vumi.persist.txredis_manager import TxRedisManager
 
 from go.vumitools.api import VumiApi
+from go.vumitools.message_store import GoMessageStore
 from go.vumitools.utils import MessageMetadataHelper
 
 
@@ -226,6 +227,9 @@ class GoStoringMiddleware(StoringMiddleware):
     @inlineCallbacks
     def setup_middleware(self):
         yield super(GoStoringMiddleware, self).setup_middleware()
+        # Replace the store so that aggregate message counts are kept.
+        self.store = GoMessageStore(
+            self.store.manager, self.store.cache.redis)
         self.vumi_api = yield VumiApi.from_config_async(self.config)
 
     @inlineCallbacks
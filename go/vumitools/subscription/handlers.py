@@ -42,8 +42,9 @@ class SubscriptionHandler(EventHandler):
 
         contact = yield user_api.contact_store.get_contact_by_key(
             fields['contact_id'])
+        old_data = contact.get_data()
         contact.subscription[fields['campaign_name']] = {
             'subscribe': u'subscribed',
             'unsubscribe': u'unsubscribed',
             }[fields['operation']]
-        yield contact.save()
+        yield user_api.contact_store.save_contact(contact, old_data)
@@ -0,0 +1,90 @@
+# -*- test-case-name: go.vumitools.tests.test_tagpool -*-
+
+import json
+
+from twisted.internet.defer import returnValue
+
+from vumi.components.tagpool import TagpoolManager
+from vumi.persist.redis_base import Manager
+
+
+class CachingTagpoolManager(TagpoolManager):
+    """
+    A :class:`TagpoolManager` that caches a snapshot of the number of free
+    tags in and the metadata of every pool.
+
+    The snapshot is stored in Redis for `SNAPSHOT_TTL` seconds and is
+    invalidated whenever tags are acquired, released or declared or a
+    pool's metadata changes through this manager. Pools changed by other
+    tagpool managers are only seen once the snapshot expires.
+    """
+
+    # How long a snapshot is used for, in seconds
+    SNAPSHOT_TTL = 10
+
+    def _snapshot_key(self):
+        return ":".join(["tagpools", "snapshot"])
+
+    @Manager.calls_manager
+    def get_snapshot(self):
+        """
+        Return a dict mapping each pool's name to a dict containing the
+        number of `free` tags in the pool and the pool's `metadata`.
+        """
+        snapshot = yield self.redis.get(self._snapshot_key())
+        if snapshot is not None:
+            returnValue(json.loads(snapshot))
+
+        pools = sorted((yield self.list_pools()))
+        # Make all the calls before waiting for any of them so that they run
+        # concurrently when using an asynchronous Redis manager.
+        free_counts = [
+            self.redis.scard(self._tag_pool_keys(pool)[1]) for pool in pools]
+        metadata = [self.get_metadata(pool) for pool in pools]
+        snapshot = {}
+        for pool, free_count, pool_metadata in zip(
+                pools, free_counts, metadata):
+            snapshot[pool] = {
+                'free': (yield free_count),
+                'metadata': (yield pool_metadata),
+            }
+        yield self.redis.set(self._snapshot_key(), json.dumps(snapshot))
+        yield self.redis.expire(self._snapshot_key(), self.SNAPSHOT_TTL)
+        returnValue(snapshot)
+
+    def invalidate_snapshot(self):
+        return self.redis.delete(self._snapshot_key())
+
+    @Manager.calls_manager
+    def acquire_tag(self, pool, owner=None, reason=None):
+        tag = yield super(CachingTagpoolManager, self).acquire_tag(
+            pool, owner, reason)
+        yield self.invalidate_snapshot()
+        returnValue(tag)
+
+    @Manager.calls_manager
+    def acquire_specific_tag(self, tag, owner=None, reason=None):
+        tag = yield super(CachingTagpoolManager, self).acquire_specific_tag(
+            tag, owner, reason)
+        yield self.invalidate_snapshot()
+        returnValue(tag)
+
+    @Manager.calls_manager
+    def release_tag(self, tag):
+        yield super(CachingTagpoolManager, self).release_tag(tag)
+        yield self.invalidate_snapshot()
+
+    @Manager.calls_manager
+    def declare_tags(self, tags):
+        yield super(CachingTagpoolManager, self).declare_tags(tags)
+        yield self.invalidate_snapshot()
+
+    @Manager.calls_manager
+    def set_metadata(self, pool, metadata):
+        yield super(CachingTagpoolManager, self).set_metadata(pool, metadata)
+        yield self.invalidate_snapshot()
+
+    @Manager.calls_manager
+    def purge_pool(self, pool):
+        yield super(CachingTagpoolManager, self).purge_pool(pool)
+        yield self.invalidate_snapshot()
@@ -462,6 +462,7 @@ class UserApiHelper(object):
         account = yield self.get_user_account()
         account.applications.add(permission)
         yield account.save()
+        yield self.user_api.api.invalidate_cached_applications(account.key)
 
     @proxyable
     @maybe_async
@@ -170,6 +170,53 @@ class TestTxVumiUserApi(VumiTestCase):
         self.assertEqual((yield self.user_api.acquire_tag(u"poolA")), None)
         yield self.assert_account_tags([list(tag1), list(tag2)])
 
+    @inlineCallbacks
+    def test_tagpools(self):
+        yield self.vumi_helper.setup_tagpool(
+            u"pool1", [u"1234"], metadata={"display_name": u"Pool 1"})
+        [tag2] = yield self.vumi_helper.setup_tagpool(u"pool2", [u"5678"])
+        yield self.vumi_helper.setup_tagpool(u"pool3", [u"9012"])
+        yield self.user_helper.add_tagpool_permission(u"pool1")
+        yield self.user_helper.add_tagpool_permission(u"pool2")
+
+        tagpools = yield self.user_api.tagpools()
+        self.assertEqual(sorted(tagpools.pools()), [u"pool1", u"pool2"])
+        self.assertEqual(tagpools.display_name(u"pool1"), u"Pool 1")
+
+        # Pools without free tags aren't available.
+        yield self.user_api.acquire_specific_tag(tag2)
+        tagpools = yield self.user_api.tagpools()
+        self.assertEqual(tagpools.pools(), [u"pool1"])
+
+    @inlineCallbacks
+    def test_tagpools_redis_round_trips(self):
+        pools = [u"pool%d" % i for i in range(300)]
+        for pool in pools:
+            yield self.vumi_helper.setup_tagpool(
+                pool, [u"tag1"], metadata={"display_name": pool})
+            yield self.user_helper.add_tagpool_permission(pool)
+
+        redis_class = type(self.vumi_api.redis)
+        make_redis_call = redis_class._make_redis_call
+        calls = []
+
+        def counting_make_redis_call(redis, call, *args, **kw):
+            calls.append(call)
+            return make_redis_call(redis, call, *args, **kw)
+
+        self.patch(redis_class, '_make_redis_call', counting_make_redis_call)
+
+        tagpools = yield self.user_api.tagpools()
+        self.assertEqual(len(tagpools.pools()), 300)
+        # A snapshot lookup, the pool list, the free tag count and the
+        # metadata of each pool and storing the snapshot.
+        self.assertEqual(len(calls), 1 + 1 + 2 * 300 + 2)
+
+        del calls[:]
+        tagpools = yield self.user_api.tagpools()
+        self.assertEqual(len(tagpools.pools()), 300)
+        self.assertEqual(calls, ['get'])
+
     @inlineCallbacks
     def test_release_tag_without_owner(self):
         [tag] = yield self.vumi_helper.setup_tagpool(u"pool1", [u"1234"])
@@ -351,6 +398,7 @@ class TestTxVumiUserApi(VumiTestCase):
         account = yield self.user_api.get_user_account()
         account.applications.add(permission)
         yield account.save()
+        yield self.user_api.api.invalidate_cached_applications(account.key)
 
     @inlineCallbacks
     def test_applications(self):
@@ -364,6 +412,46 @@ class TestTxVumiUserApi(VumiTestCase):
                 'namespace': 'bulk_message',
             }})
 
+    @inlineCallbacks
+    def test_applications_cached(self):
+        yield self.add_app_permission(u'go.apps.bulk_message')
+        yield self.user_api.applications()
+        cached = yield self.user_api.api.get_cached_applications(
+            self.user_api.user_account_key)
+        self.assertEqual(cached, [u'go.apps.bulk_message'])
+        ttl = yield self.user_api.api.cached_applications.ttl(
+            self.user_api.user_account_key)
+        self.assertTrue(0 < ttl <= self.user_api.api.APPLICATIONS_CACHE_TTL)
+
+        loads = []
+        orig_get_user_account = self.user_api.get_user_account
+
+        def get_user_account():
+            loads.append(True)
+            return orig_get_user_account()
+
+        self.patch(self.user_api, 'get_user_account', get_user_account)
+        applications = yield self.user_api.applications()
+        self.assertEqual(applications.keys(), [u'go.apps.bulk_message'])
+        self.assertEqual(loads, [])
+
+    @inlineCallbacks
+    def test_applications_cache_invalidated(self):
+        yield self.user_api.applications()
+        permission = self.user_api.api.account_store.application_permissions(
+            uuid.uuid4().hex, application=u'go.apps.bulk_message')
+        yield permission.save()
+        account = yield self.user_api.get_user_account()
+        account.applications.add(permission)
+        yield account.save()
+
+        # The cached permissions are used until they're invalidated.
+        applications = yield self.user_api.applications()
+        self.assertEqual(applications, {})
+        yield self.user_api.api.invalidate_cached_applications(account.key)
+        applications = yield self.user_api.applications()
+        self.assertEqual(applications.keys(), [u'go.apps.bulk_message'])
+
 
 class TestVumiUserApi(TestTxVumiUserApi):
     sync_persistence = True
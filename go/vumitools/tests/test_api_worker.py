@@ -2,7 +2,9 @@
 
 """Tests for go.vumitools.api_worker."""
 
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import (
+    inlineCallbacks, returnValue, Deferred, DeferredSemaphore)
+from twisted.internet.task import Clock
 
 from vumi.tests.helpers import VumiTestCase
 from vumi.tests.utils import LogCatcher
@@ -66,6 +68,21 @@ class ToyHandler(EventHandler):
         self.handled_events.append((event, handler_config))
 
 
+class WaitingHandler(EventHandler):
+    def setup_handler(self):
+        self.waiting = []
+
+    def handle_event(self, event, handler_config):
+        d = Deferred()
+        self.waiting.append((event, d))
+        return d
+
+
+class FailingHandler(EventHandler):
+    def handle_event(self, event, handler_config):
+        raise ValueError("Failed to handle event.")
+
+
 class TestEventDispatcher(VumiTestCase):
 
     application_class = EventDispatcher
@@ -81,10 +98,13 @@ class TestEventDispatcher(VumiTestCase):
                 'event_handlers': {
                     'handler1': '%s.ToyHandler' % __name__,
                     'handler2': '%s.ToyHandler' % __name__,
+                    'waiting': '%s.WaitingHandler' % __name__,
+                    'failing': '%s.FailingHandler' % __name__,
                 },
             }))
         self.handler1 = self.ed.handlers['handler1']
         self.handler2 = self.ed.handlers['handler2']
+        self.waiting_handler = self.ed.handlers['waiting']
 
     def publish_event(self, event_type, content, conv_key="conv_key",
                       account_key="acct"):
@@ -136,6 +156,161 @@ class TestEventDispatcher(VumiTestCase):
             self.handler1.handled_events)
         self.assertEqual([(event2, {})], self.handler2.handled_events)
 
+    def mk_event(self, event_type, content, conv_key="conv_key",
+                 account_key="acct"):
+        return VumiApiEvent.event(account_key, conv_key, event_type, content)
+
+    def get_handler_metrics(self):
+        self.ed.metrics.publish_metrics()
+        metrics = {}
+        for datapoints in self.worker_helper.get_dispatched_metrics():
+            for name, aggs, points in datapoints:
+                metrics.setdefault(name, []).extend(
+                    value for _, value in points)
+        return metrics
+
+    @inlineCallbacks
+    def test_handlers_run_concurrently(self):
+        self.ed.account_config['acct'] = {
+            ('conv_key', 'my_event'): [('waiting', {}), ('waiting', {})]}
+        event = self.mk_event("my_event", {})
+        d = self.ed.consume_api_event(event)
+        [(_, d1), (_, d2)] = self.waiting_handler.waiting
+        self.assertFalse(d.called)
+        d1.callback(None)
+        self.assertFalse(d.called)
+        d2.callback(None)
+        yield d
+
+    @inlineCallbacks
+    def test_max_concurrent_handlers(self):
+        self.ed.handler_semaphore = DeferredSemaphore(1)
+        self.ed.account_config['acct'] = {
+            ('conv_key', 'my_event'): [('waiting', {}), ('waiting', {})]}
+        d = self.ed.consume_api_event(self.mk_event("my_event", {}))
+        [(_, d1)] = self.waiting_handler.waiting
+        d1.callback(None)
+        [_, (_, d2)] = self.waiting_handler.waiting
+        d2.callback(None)
+        yield d
+
+    @inlineCallbacks
+    def test_handler_failure_is_isolated(self):
+        self.ed.account_config['acct'] = {
+            ('conv_key', 'my_event'): [('failing', {}), ('handler1', {})]}
+        event = self.mk_event("my_event", {})
+        yield self.ed.consume_api_event(event)
+        self.assertEqual([(event, {})], self.handler1.handled_events)
+        [failure] = self.flushLoggedErrors(ValueError)
+        metrics = self.get_handler_metrics()
+        self.assertEqual(
+            metrics['go.event_dispatcher.handlers.failing.errors'], [1])
+        self.assertEqual(
+            len(metrics['go.event_dispatcher.handlers.failing.latency']), 1)
+
+    @inlineCallbacks
+    def test_handler_timeout(self):
+        self.ed.clock = Clock()
+        self.ed.account_config['acct'] = {
+            ('conv_key', 'my_event'): [('waiting', {}), ('handler1', {})]}
+        event = self.mk_event("my_event", {})
+        d = self.ed.consume_api_event(event)
+        self.assertEqual([(event, {})], self.handler1.handled_events)
+        self.assertFalse(d.called)
+        self.ed.clock.advance(self.ed.handler_timeout)
+        yield d
+        metrics = self.get_handler_metrics()
+        self.assertEqual(
+            metrics['go.event_dispatcher.handlers.waiting.timeouts'], [1])
+        self.assertEqual(
+            metrics['go.event_dispatcher.handlers.waiting.latency'],
+            [self.ed.handler_timeout])
+        self.assertEqual(
+            metrics['go.event_dispatcher.handlers.handler1.latency'], [0])
+
+    @inlineCallbacks
+    def test_unknown_handler(self):
+        self.ed.account_config['acct'] = {
+            ('conv_key', 'my_event'): [('unknown', {}), ('handler1', {})]}
+        event = self.mk_event("my_event", {})
+        with LogCatcher() as logs:
+            yield self.ed.consume_api_event(event)
+            [error] = logs.errors
+        self.assertTrue("Unknown event handler" in error['message'][0])
+        self.assertEqual([(event, {})], self.handler1.handled_events)
+
+    @inlineCallbacks
+    def setup_account_config(self, handler):
+        yield self.vumi_helper.setup_vumi_api()
+        user_helper = yield self.vumi_helper.make_user(u'dbacct')
+        yield user_helper.user_api.set_event_handler_config([
+            [['conv_key', 'my_event'], [(handler, {})]]])
+        returnValue(user_helper)
+
+    @inlineCallbacks
+    def test_reload_account_config_command(self):
+        user_helper = yield self.setup_account_config('handler1')
+        account_key = user_helper.account_key
+        event = yield self.publish_event(
+            "my_event", {}, account_key=account_key)
+        self.assertEqual([(event, {})], self.handler1.handled_events)
+
+        # The command reaches the event dispatcher through a command
+        # dispatcher that forwards commands to it.
+        yield self.worker_helper.get_worker(
+            CommandDispatcher, self.vumi_helper.mk_config({
+                'transport_name': 'command_dispatcher',
+                'worker_names': ['event_dispatcher'],
+            }))
+        yield user_helper.user_api.set_event_handler_config([
+            [['conv_key', 'my_event'], [('handler2', {})]]])
+        [_, cmd] = self.vumi_helper.get_dispatched_commands()
+        self.assertEqual(cmd['worker_name'], 'event_dispatcher')
+        self.assertEqual(cmd['command'], 'reload_account_config')
+        self.assertEqual(
+            cmd['kwargs'], {'account_key': account_key, 'version': 2})
+        yield self.worker_helper.kick_delivery()
+        self.assertEqual(
+            self.worker_helper.get_dispatched(
+                'event_dispatcher', 'control', VumiApiCommand),
+            [cmd])
+
+        event2 = yield self.publish_event(
+            "my_event", {}, account_key=account_key)
+        self.assertEqual([(event, {})], self.handler1.handled_events)
+        self.assertEqual([(event2, {})], self.handler2.handled_events)
+
+    @inlineCallbacks
+    def test_reload_account_config_command_for_old_version(self):
+        user_helper = yield self.setup_account_config('handler1')
+        account_key = user_helper.account_key
+        yield self.ed.get_account_config(account_key)
+        self.ed.process_command_reload_account_config(account_key, 1)
+        self.assertTrue(account_key in self.ed.account_config)
+        self.ed.process_command_reload_account_config(account_key, 2)
+        self.assertFalse(account_key in self.ed.account_config)
+
+    @inlineCallbacks
+    def test_account_config_version_check(self):
+        self.ed.clock = Clock()
+        user_helper = yield self.setup_account_config('handler1')
+        account_key = user_helper.account_key
+        event = yield self.publish_event(
+            "my_event", {}, account_key=account_key)
+
+        # The reload command isn't delivered, so the old config is used
+        # until its version is checked.
+        yield user_helper.user_api.set_event_handler_config([
+            [['conv_key', 'my_event'], [('handler2', {})]]])
+        event2 = yield self.publish_event(
+            "my_event", {}, account_key=account_key)
+        self.ed.clock.advance(self.ed.account_config_check_interval)
+        event3 = yield self.publish_event(
+            "my_event", {}, account_key=account_key)
+        self.assertEqual(
+            [(event, {}), (event2, {})], self.handler1.handled_events)
+        self.assertEqual([(event3, {})], self.handler2.handled_events)
+
 
 class TestSendingEventDispatcher(VumiTestCase):
     @inlineCallbacks
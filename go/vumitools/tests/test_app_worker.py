@@ -114,6 +114,30 @@ class TestGoApplicationWorker(VumiTestCase):
             self.app_helper.get_published_metrics(self.app),
             [("%s.dummy_metric" % prefix, 42)])
 
+    @inlineCallbacks
+    def test_collect_metrics_batch(self):
+        conv2 = yield self.app_helper.create_conversation()
+        yield self.app_helper.start_conversation(self.conv)
+        yield self.app_helper.start_conversation(conv2)
+
+        self.assertEqual(self.app_helper.get_published_metrics(self.app), [])
+
+        yield self.app_helper.dispatch_command(
+            'collect_metrics_batch',
+            conversations=[
+                [self.conv.user_account.key, self.conv.key],
+                [conv2.user_account.key, conv2.key],
+            ])
+
+        prefix = "go.campaigns.test-0-user.conversations"
+
+        self.assertEqual(
+            sorted(self.app_helper.get_published_metrics(self.app)),
+            sorted([
+                ("%s.%s.dummy_metric" % (prefix, self.conv.key), 42),
+                ("%s.%s.dummy_metric" % (prefix, conv2.key), 42),
+            ]))
+
     @inlineCallbacks
     def test_conversation_metric_publishing(self):
         yield self.app_helper.start_conversation(self.conv)
@@ -227,6 +227,427 @@ class TestContactStore(VumiTestCase):
         count = yield self.store.count_contacts_for_group(group)
         self.assertEqual(count, 1)
 
+    @inlineCallbacks
+    def test_count_contacts_for_smart_group_cached(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(u'test group', u'surname:"Foo 1"')
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        self.assertEqual((yield store.count_contacts_for_group(group)), 1)
+        self.assertEqual((yield store.count_cache.get_count(group)), 1)
+
+        contact = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        self.assertEqual((yield store.count_cache.get_count(group)), 2)
+        yield store.update_contact(contact.key, surname=u'Foo 2')
+        self.assertEqual((yield store.count_cache.get_count(group)), 1)
+        yield store.update_contact(contact.key, surname=u'Foo 1')
+        self.assertEqual((yield store.count_cache.get_count(group)), 2)
+        yield store.delete_contact(contact)
+        self.assertEqual((yield store.count_cache.get_count(group)), 1)
+        self.assertEqual((yield store.count_contacts_for_group(group)), 1)
+
+    @inlineCallbacks
+    def test_count_contacts_for_smart_group_query_changed(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(u'test group', u'surname:"Foo 1"')
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 2', msisdn=u'12345')
+        self.assertEqual((yield store.count_contacts_for_group(group)), 0)
+        group.query = u'surname:"Foo 2"'
+        yield group.save()
+        self.assertEqual((yield store.count_contacts_for_group(group)), 1)
+
+    @inlineCallbacks
+    def test_count_contacts_for_smart_group_complex_query(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(
+            u'test group', u'surname:"Foo 1" OR surname:"Foo 2"')
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        self.assertEqual((yield store.count_contacts_for_group(group)), 1)
+        # Saving a contact discards the count because the query can't be
+        # evaluated locally.
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 2', msisdn=u'12345')
+        self.assertEqual((yield store.count_cache.get_count(group)), None)
+        self.assertEqual((yield store.count_contacts_for_group(group)), 2)
+
+    @inlineCallbacks
+    def test_add_contacts_to_group(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_group(u'static group')
+        smart_group = yield store.new_smart_group(
+            u'test group', u'surname:"Foo 1" OR surname:"Foo 2"')
+        contact1 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        contact2 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 2', msisdn=u'12345')
+        self.assertEqual(
+            (yield store.count_contacts_for_group(smart_group)), 2)
+
+        yield store.add_contacts_to_group(group, [contact1, contact2])
+        self.assertEqual(
+            sorted((yield store.get_contacts_for_group(group))),
+            sorted([contact1.key, contact2.key]))
+        # The contacts were saved through save_contact(), so the cached
+        # count that can't be updated locally was discarded.
+        self.assertEqual(
+            (yield store.count_cache.get_count(smart_group)), None)
+
+    @inlineCallbacks
+    def assert_materialized_matches_search(self, store, group):
+        materialized = yield store.contacts.index_keys(
+            'smart_groups', group.key)
+        live = yield store.contacts.raw_search(group.query).get_keys()
+        self.assertEqual(sorted(materialized), sorted(live))
+
+    @inlineCallbacks
+    def test_materialize_smart_group(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(u'test group', u'surname:"Foo 1"')
+        contact1 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 2', msisdn=u'12345')
+        self.assertFalse((yield store.smart_group_is_materialized(group)))
+
+        yield store.materialize_smart_group(group)
+        self.assertTrue((yield store.smart_group_is_materialized(group)))
+        yield self.assert_materialized_matches_search(store, group)
+        self.assertEqual(
+            (yield store.get_dynamic_contacts_for_group(group)),
+            [contact1.key])
+
+    @inlineCallbacks
+    def test_materialized_smart_group_contact_edits(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(u'test group', u'surname:"Foo 1"')
+        contact1 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        contact2 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 2', msisdn=u'12345')
+        yield store.materialize_smart_group(group)
+
+        contact3 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        yield self.assert_materialized_matches_search(store, group)
+        yield store.update_contact(contact1.key, surname=u'Foo 2')
+        yield self.assert_materialized_matches_search(store, group)
+        yield store.update_contact(contact2.key, surname=u'Foo 1')
+        yield self.assert_materialized_matches_search(store, group)
+        yield store.update_contact(contact2.key, name=u'Other')
+        yield self.assert_materialized_matches_search(store, group)
+        yield store.delete_contact(contact3)
+        yield self.assert_materialized_matches_search(store, group)
+
+        # The index stays up to date, so it is still used.
+        self.assertTrue((yield store.smart_group_is_materialized(group)))
+        self.assertEqual(
+            (yield store.get_dynamic_contacts_for_group(group)),
+            [contact2.key])
+
+    @inlineCallbacks
+    def test_materialized_smart_group_complex_query(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(
+            u'test group', u'surname:"Foo 1" OR surname:"Foo 2"')
+        contact1 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        yield store.materialize_smart_group(group)
+        self.assertTrue((yield store.smart_group_is_materialized(group)))
+
+        # The query can't be evaluated locally, so editing a contact marks
+        # the index stale and searches are used until it is rebuilt.
+        contact2 = yield store.new_contact(
+            name=u'Contact', surname=u'Foo 2', msisdn=u'12345')
+        self.assertFalse((yield store.smart_group_is_materialized(group)))
+        self.assertEqual(
+            sorted((yield store.get_dynamic_contacts_for_group(group))),
+            sorted([contact1.key, contact2.key]))
+
+        self.assertEqual(
+            (yield store.refresh_stale_smart_groups()), [group.key])
+        self.assertTrue((yield store.smart_group_is_materialized(group)))
+        yield self.assert_materialized_matches_search(store, group)
+        self.assertEqual((yield store.refresh_stale_smart_groups()), [])
+
+    @inlineCallbacks
+    def test_materialized_smart_group_stale(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(u'test group', u'surname:"Foo 1"')
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        yield store.materialize_smart_group(group)
+
+        # Changing the query makes the index stale.
+        group.query = u'surname:"Foo 2"'
+        yield group.save()
+        self.assertFalse((yield store.smart_group_is_materialized(group)))
+        self.assertEqual(
+            (yield store.refresh_stale_smart_groups()), [group.key])
+        yield self.assert_materialized_matches_search(store, group)
+
+        # So does age.
+        self.patch(store, 'MATERIALIZED_GROUP_MAX_AGE', 0)
+        self.assertFalse((yield store.smart_group_is_materialized(group)))
+
+    @inlineCallbacks
+    def test_dematerialize_smart_group(self):
+        store = self.user_helper.contact_store
+        group = yield store.new_smart_group(u'test group', u'surname:"Foo 1"')
+        yield store.new_contact(
+            name=u'Contact', surname=u'Foo 1', msisdn=u'12345')
+        yield store.materialize_smart_group(group)
+        yield store.dematerialize_smart_group(group.key)
+        self.assertFalse((yield store.smart_group_is_materialized(group)))
+        self.assertEqual(
+            (yield store.contacts.index_keys('smart_groups', group.key)), [])
+
+    @inlineCallbacks
+    def test_materialized_account_keys(self):
+        store = self.user_helper.contact_store
+        group1 = yield store.new_smart_group(u'group 1', u'surname:"Foo 1"')
+        group2 = yield store.new_smart_group(u'group 2', u'surname:"Foo 2"')
+        self.assertEqual(
+            (yield ContactStore.materialized_account_keys(store.store_redis)),
+            set())
+
+        yield store.materialize_smart_group(group1)
+        yield store.materialize_smart_group(group2)
+        self.assertEqual(
+            (yield ContactStore.materialized_account_keys(store.store_redis)),
+            set([store.user_account_key]))
+
+        # The account is only removed once it has no materialized groups.
+        yield store.dematerialize_smart_group(group1.key)
+        self.assertEqual(
+            (yield ContactStore.materialized_account_keys(store.store_redis)),
+            set([store.user_account_key]))
+        yield store.dematerialize_smart_group(group2.key)
+        self.assertEqual(
+            (yield ContactStore.materialized_account_keys(store.store_redis)),
+            set())
+
+    @inlineCallbacks
+    def test_filter_contacts_on_surname(self):
+        group = yield self.store.new_group(u'test group')
+        contact1 = yield self.store.new_contact(
+            name=u'A', surname=u'Smith', msisdn=u'12345', groups=[group])
+        contact2 = yield self.store.new_contact(
+            name=u'B', surname=u'smythe', msisdn=u'12345')
+        yield self.store.new_contact(
+            name=u'C', surname=u'Jones', msisdn=u'12345', groups=[group])
+        yield self.store.new_contact(name=u'D', msisdn=u'12345')
+        yield self.store_alt.new_contact(
+            name=u'E', surname=u'Smith', msisdn=u'12345')
+
+        def keys(contacts):
+            return sorted(contact.key for contact in contacts)
+
+        for letter in [u's', u'S']:
+            contacts = yield self.store.filter_contacts_on_surname(letter)
+            self.assertEqual(
+                keys(contacts), sorted([contact1.key, contact2.key]))
+        contacts = yield self.store.filter_contacts_on_surname(
+            u's', group=group)
+        self.assertEqual(keys(contacts), [contact1.key])
+        contacts = yield self.store.filter_contacts_on_surname(u'x')
+        self.assertEqual(contacts, [])
+
+    @inlineCallbacks
+    def test_filter_contacts_on_surname_matches_map_reduce(self):
+        group = yield self.store.new_group(u'test group')
+        for surname in [u'Smith', u'smythe', u'Jones', u'S', u'', None]:
+            yield self.store.new_contact(
+                surname=surname, msisdn=u'12345', groups=[group])
+        contact = yield self.store.new_contact(
+            surname=u'Sandler', msisdn=u'12345')
+        yield self.store.update_contact(contact.key, surname=u'Jameson')
+
+        def keys(contacts):
+            return sorted(contact.key for contact in contacts)
+
+        for letter in [u's', u'J', u'x']:
+            for group_filter in [None, group]:
+                indexed = yield self.store.filter_contacts_on_surname(
+                    letter, group=group_filter)
+                map_reduced = yield self.store.map_reduce_contacts_on_surname(
+                    letter, group=group_filter)
+                self.assertEqual(keys(indexed), keys(map_reduced))
+
+    @inlineCallbacks
+    def test_search_contacts_page(self):
+        keys = []
+        for i in range(5):
+            contact = yield self.store.new_contact(
+                surname=u'Smith%s' % i, msisdn=u'12345')
+            keys.append(contact.key)
+        yield self.store.new_contact(surname=u'Jones', msisdn=u'12345')
+        keys.sort()
+
+        page = yield self.store.search_contacts_page(u'surname:Smith*')
+        self.assertEqual(page, (keys, None))
+        page = yield self.store.search_contacts_page(
+            u'surname:Smith*', rows=2)
+        self.assertEqual(page, (keys[:2], keys[1]))
+        page = yield self.store.search_contacts_page(
+            u'surname:Smith*', after=keys[1], rows=2)
+        self.assertEqual(page, (keys[2:4], keys[3]))
+        page = yield self.store.search_contacts_page(
+            u'surname:Smith*', after=keys[3], rows=2)
+        self.assertEqual(page, (keys[4:], None))
+        page = yield self.store.search_contacts_page(
+            u'surname:Smith*', after=keys[2])
+        self.assertEqual(page, (keys[3:], None))
+        page = yield self.store.search_contacts_page(
+            u'surname:Smith*', rows=0)
+        self.assertEqual(page, ([], None))
+        page = yield self.store.search_contacts_page(u'surname:Foo*', rows=2)
+        self.assertEqual(page, ([], None))
+
+    @inlineCallbacks
+    def test_list_groups_page(self):
+        store = self.user_helper.contact_store
+        groups = []
+        for name in [u'c', u'a', u'd', u'b']:
+            groups.append((yield store.new_group(name)))
+        smart_group = yield store.new_smart_group(u'e', u'name:foo')
+
+        def names(groups):
+            return [group.name for group in groups]
+
+        self.assertEqual((yield store.count_groups()), 5)
+        self.assertEqual((yield store.count_groups('static')), 4)
+        self.assertEqual((yield store.count_groups('smart')), 1)
+        self.assertEqual(
+            names((yield store.list_groups_page(0, 2))), [u'a', u'b'])
+        self.assertEqual(
+            names((yield store.list_groups_page(2, 4))), [u'c', u'd'])
+        self.assertEqual(
+            names((yield store.list_groups_page(3, None, 'static'))), [u'd'])
+        self.assertEqual(
+            names((yield store.list_groups_page(0, 10, 'smart'))), [u'e'])
+        self.assertEqual(
+            names((yield store.list_smart_groups())), [u'e'])
+        self.assertEqual(
+            names((yield store.list_static_groups())),
+            [u'a', u'b', u'c', u'd'])
+
+        groups[0].name = u'aa'
+        yield store.save_group(groups[0])
+        yield store.delete_group(smart_group)
+        self.assertEqual(
+            names((yield store.list_groups_page(0, None))),
+            [u'a', u'aa', u'b', u'd'])
+
+    @inlineCallbacks
+    def test_list_groups_page_loads_only_page(self):
+        store = self.user_helper.contact_store
+        for i in range(10):
+            yield store.new_group(u'group %s' % (i,))
+
+        loaded_keys = []
+        load_all_bunches = store.groups.load_all_bunches
+
+        def recording_load_all_bunches(keys):
+            loaded_keys.extend(keys)
+            return load_all_bunches(keys)
+
+        self.patch(store.groups, 'load_all_bunches',
+                   recording_load_all_bunches)
+        groups = yield store.list_groups_page(4, 6)
+        self.assertEqual(
+            [group.name for group in groups], [u'group 4', u'group 5'])
+        self.assertEqual(
+            sorted(loaded_keys), sorted(group.key for group in groups))
+
+    @inlineCallbacks
+    def test_list_groups_page_builds_index(self):
+        store = self.user_helper.contact_store
+        # Groups saved without updating the index, as groups created before
+        # the index existed would have been.
+        for name in [u'b', u'a']:
+            group = store.groups(
+                name, name=name, user_account=store.user_account_key)
+            yield group.save()
+        groups = yield store.list_groups_page(0, None)
+        self.assertEqual([g.name for g in groups], [u'a', u'b'])
+
+    @inlineCallbacks
+    def test_list_groups_page_removes_deleted_groups(self):
+        store = self.user_helper.contact_store
+        group1 = yield store.new_group(u'a')
+        group2 = yield store.new_group(u'b')
+        yield group1.delete()
+        groups = yield store.list_groups_page(0, None)
+        self.assertEqual([group.key for group in groups], [group2.key])
+        self.assertEqual((yield store.count_groups()), 1)
+
+    @inlineCallbacks
+    def test_list_groups_page_without_redis(self):
+        yield self.store.new_group(u'b')
+        yield self.store.new_group(u'a')
+        yield self.store.new_smart_group(u'c', u'name:foo')
+        self.assertEqual((yield self.store.count_groups('static')), 2)
+        groups = yield self.store.list_groups_page(1, None)
+        self.assertEqual([group.name for group in groups], [u'b', u'c'])
+
+    @inlineCallbacks
+    def test_get_groups_by_name(self):
+        store = self.user_helper.contact_store
+        group1 = yield store.new_group(u'a')
+        group2 = yield store.new_group(u'a')
+        group3 = yield store.new_group(u'b')
+
+        def keys(groups):
+            return sorted(group.key for group in groups)
+
+        groups = yield store.get_groups_by_name(u'a')
+        self.assertEqual(keys(groups), sorted([group1.key, group2.key]))
+
+        group3.name = u'c'
+        yield store.save_group(group3)
+        self.assertEqual((yield store.get_groups_by_name(u'b')), [])
+        groups = yield store.get_groups_by_name(u'c')
+        self.assertEqual(keys(groups), [group3.key])
+
+        yield store.delete_group(group1)
+        groups = yield store.get_groups_by_name(u'a')
+        self.assertEqual(keys(groups), [group2.key])
+
+    @inlineCallbacks
+    def test_get_groups_by_name_stale_index(self):
+        store = self.user_helper.contact_store
+        group1 = yield store.new_group(u'a')
+        group2 = yield store.new_group(u'a')
+        # Changes made without updating the index.
+        yield group1.delete()
+        group2.name = u'b'
+        yield group2.save()
+        self.assertEqual((yield store.get_groups_by_name(u'a')), [])
+        self.assertEqual((yield store.group_index.keys_for_name(u'a')), [])
+        self.assertEqual(
+            (yield store.group_index.keys_for_name(u'b')), [group2.key])
+
+    @inlineCallbacks
+    def test_get_groups_by_name_without_redis(self):
+        group = yield self.store.new_group(u'a')
+        groups = yield self.store.get_groups_by_name(u'a')
+        self.assertEqual([g.key for g in groups], [group.key])
+
+    @inlineCallbacks
+    def test_rebuild_group_index(self):
+        store = self.user_helper.contact_store
+        yield store.build_group_index()
+        group = store.groups(
+            u'key1', name=u'a', user_account=store.user_account_key)
+        yield group.save()
+        self.assertEqual((yield store.group_index.keys_for_name(u'a')), [])
+        yield store.rebuild_group_index()
+        self.assertEqual(
+            (yield store.group_index.keys_for_name(u'a')), [u'key1'])
+
     @inlineCallbacks
     def test_new_contact_for_addr(self):
         @inlineCallbacks
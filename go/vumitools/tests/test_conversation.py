@@ -190,6 +190,69 @@ class TestConversationStore(VumiTestCase):
         except ModelMigrationError as e:
             self.assert_batch_key_migration_error(e, 2, conv.key)
 
+    @inlineCallbacks
+    def test_list_conversation_summaries(self):
+        conv_store = self.user_helper.user_api.conversation_store
+        conv1 = yield conv_store.new_conversation(
+            u'bulk_message', u'foo', u'', {}, u'batch1')
+        conv2 = yield conv_store.new_conversation(
+            u'jsbox', u'bar', u'', {}, u'batch2')
+        summaries = yield conv_store.list_conversation_summaries()
+        self.assertEqual(
+            [s['key'] for s in summaries], [conv2.key, conv1.key])
+        summaries = yield conv_store.list_conversation_summaries(
+            conversation_type=u'jsbox')
+        self.assertEqual([s['key'] for s in summaries], [conv2.key])
+        summaries = yield conv_store.list_conversation_summaries(
+            query=u'FO')
+        self.assertEqual([s['key'] for s in summaries], [conv1.key])
+
+    @inlineCallbacks
+    def test_list_conversation_summaries_builds_index(self):
+        conv = yield self.conv_store.new_conversation(
+            u'bulk_message', u'name', u'', {}, u'batch1')
+        conv_store = self.user_helper.user_api.conversation_store
+        self.assertFalse((yield conv_store.summary_index.is_built()))
+        summaries = yield conv_store.list_conversation_summaries()
+        self.assertEqual([s['key'] for s in summaries], [conv.key])
+        self.assertTrue((yield conv_store.summary_index.is_built()))
+
+    @inlineCallbacks
+    def test_list_conversation_summaries_without_redis(self):
+        conv = yield self.conv_store.new_conversation(
+            u'bulk_message', u'name', u'', {}, u'batch1')
+        yield self.conv_store.new_conversation(
+            u'bulk_message', u'name', u'', {}, u'batch2',
+            archive_status=u'archived')
+        summaries = yield self.conv_store.list_conversation_summaries()
+        self.assertEqual([s['key'] for s in summaries], [conv.key])
+
+    @inlineCallbacks
+    def test_save_conversation_updates_summary(self):
+        conv_store = self.user_helper.user_api.conversation_store
+        conv = yield conv_store.new_conversation(
+            u'bulk_message', u'name', u'', {}, u'batch1')
+        conv.set_status_started()
+        yield conv_store.save_conversation(conv)
+        summaries = yield conv_store.list_conversation_summaries(u'running')
+        self.assertEqual([s['key'] for s in summaries], [conv.key])
+        summaries = yield conv_store.list_conversation_summaries(u'draft')
+        self.assertEqual(summaries, [])
+
+    @inlineCallbacks
+    def test_load_conversations(self):
+        conv_store = self.user_helper.user_api.conversation_store
+        conv1 = yield conv_store.new_conversation(
+            u'bulk_message', u'name', u'', {}, u'batch1')
+        conv2 = yield conv_store.new_conversation(
+            u'bulk_message', u'name', u'', {}, u'batch2')
+        yield conv2.delete()
+        convs = yield conv_store.load_conversations([conv2.key, conv1.key])
+        self.assertEqual([c.key for c in convs], [conv1.key])
+        # The deleted conversation is removed from the index.
+        summaries = yield conv_store.list_conversation_summaries()
+        self.assertEqual([s['key'] for s in summaries], [conv1.key])
+
 
 class TestConversationStoreSync(TestConversationStore):
     sync_persistence = True
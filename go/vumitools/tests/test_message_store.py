@@ -0,0 +1,157 @@
+from datetime import datetime, date
+
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from vumi.tests.helpers import VumiTestCase, MessageHelper, PersistenceHelper
+
+from go.vumitools.message_store import GoMessageStore
+
+
+class TestGoMessageStore(VumiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(
+            PersistenceHelper(use_riak=True))
+        self.msg_helper = self.add_helper(MessageHelper())
+        riak = self.persistence_helper.get_riak_manager()
+        redis = yield self.persistence_helper.get_redis_manager()
+        self.store = GoMessageStore(riak, redis)
+        self.aggregates = self.store.cache.aggregates
+        self.batch_id = yield self.store.batch_start([])
+
+    @inlineCallbacks
+    def add_messages(self):
+        timestamps = [
+            datetime(2014, 1, 1, 10, 15),
+            datetime(2014, 1, 1, 10, 45),
+            datetime(2014, 1, 1, 23, 59),
+            datetime(2014, 1, 3, 0, 0),
+        ]
+        for timestamp in timestamps:
+            yield self.store.add_inbound_message(
+                self.msg_helper.make_inbound('in', timestamp=timestamp),
+                batch_id=self.batch_id)
+        yield self.store.add_outbound_message(
+            self.msg_helper.make_outbound('out', timestamp=timestamps[0]),
+            batch_id=self.batch_id)
+
+    @inlineCallbacks
+    def assert_aggregates(self):
+        self.assertEqual(
+            (yield self.store.get_aggregate_counts(self.batch_id, 'inbound')),
+            [(date(2014, 1, 1), 3), (date(2014, 1, 3), 1)])
+        self.assertEqual(
+            (yield self.store.get_aggregate_counts(
+                self.batch_id, 'inbound', 'hour')),
+            [(datetime(2014, 1, 1, 10), 2),
+             (datetime(2014, 1, 1, 23), 1),
+             (datetime(2014, 1, 3, 0), 1)])
+        self.assertEqual(
+            (yield self.store.get_aggregate_counts(
+                self.batch_id, 'outbound')),
+            [(date(2014, 1, 1), 1)])
+
+    @inlineCallbacks
+    def test_batch_start(self):
+        self.assertTrue((yield self.aggregates.is_counted(self.batch_id)))
+        self.assertEqual(
+            (yield self.store.get_aggregate_counts(self.batch_id, 'inbound')),
+            [])
+
+    @inlineCallbacks
+    def test_add_messages(self):
+        yield self.add_messages()
+        yield self.assert_aggregates()
+
+    @inlineCallbacks
+    def test_uncounted_batch(self):
+        yield self.add_messages()
+        yield self.aggregates.clear(self.batch_id)
+        self.assertEqual(
+            (yield self.store.get_aggregate_counts(self.batch_id, 'inbound')),
+            None)
+
+    @inlineCallbacks
+    def test_clear_batch(self):
+        yield self.add_messages()
+        yield self.store.cache.clear_batch(self.batch_id)
+        self.assertFalse((yield self.aggregates.is_counted(self.batch_id)))
+        self.assertEqual(
+            (yield self.aggregates.get_counts(self.batch_id, 'inbound')), [])
+
+    @inlineCallbacks
+    def test_reconcile_aggregates(self):
+        yield self.add_messages()
+        yield self.aggregates.clear(self.batch_id)
+        yield self.store.reconcile_aggregates(self.batch_id)
+        yield self.assert_aggregates()
+
+    @inlineCallbacks
+    def test_reconcile_cache(self):
+        yield self.add_messages()
+        yield self.aggregates.clear(self.batch_id)
+        yield self.store.reconcile_cache(self.batch_id)
+        yield self.assert_aggregates()
+
+    @inlineCallbacks
+    def add_sensitive_messages(self):
+        msgs = [
+            self.msg_helper.make_inbound('in'),
+            self.msg_helper.make_inbound('in', helper_metadata={
+                'go': {'sensitive': True},
+            }),
+        ]
+        for msg in msgs:
+            yield self.store.add_inbound_message(msg, batch_id=self.batch_id)
+        returnValue([msg['message_id'] for msg in msgs])
+
+    @inlineCallbacks
+    def test_sensitive_flags(self):
+        keys = yield self.add_sensitive_messages()
+        self.assertEqual(
+            (yield self.store.cache.get_sensitive_flags(self.batch_id, keys)),
+            [False, True])
+
+    @inlineCallbacks
+    def test_sensitive_flags_uncounted_batch(self):
+        keys = yield self.add_sensitive_messages()
+        yield self.aggregates.clear(self.batch_id)
+        self.assertEqual(
+            (yield self.store.cache.get_sensitive_flags(self.batch_id, keys)),
+            None)
+
+    @inlineCallbacks
+    def test_reconcile_aggregates_sensitive_flags(self):
+        keys = yield self.add_sensitive_messages()
+        yield self.store.cache.clear_batch(self.batch_id)
+        yield self.store.reconcile_aggregates(self.batch_id)
+        self.assertEqual(
+            (yield self.store.cache.get_sensitive_flags(self.batch_id, keys)),
+            [False, True])
+
+    @inlineCallbacks
+    def test_message_pages(self):
+        pages = self.store.cache.pages
+        msg = self.msg_helper.make_inbound('in')
+        yield pages.set_page(
+            self.batch_id, 'inbound', 0, 20, True, 1, [(True, msg)])
+        self.assertEqual(
+            (yield pages.get_page(self.batch_id, 'inbound', 0, 20, True, 1)),
+            [(True, msg)])
+        # Pages are cached per direction, range and sensitivity and are
+        # stale once the message count changes.
+        self.assertEqual(
+            (yield pages.get_page(self.batch_id, 'inbound', 0, 20, False, 1)),
+            None)
+        self.assertEqual(
+            (yield pages.get_page(self.batch_id, 'outbound', 0, 20, True, 1)),
+            None)
+        self.assertEqual(
+            (yield pages.get_page(self.batch_id, 'inbound', 0, 20, True, 2)),
+            None)
+
+        yield self.store.cache.clear_batch(self.batch_id)
+        self.assertEqual(
+            (yield pages.get_page(self.batch_id, 'inbound', 0, 20, True, 1)),
+            None)
@@ -194,6 +194,84 @@ class TestGoMetricsWorker(VumiTestCase):
         self.assertEqual(
             cmd['kwargs']['user_account_key'], user_helper.account_key)
 
+    @inlineCallbacks
+    def test_send_metrics_batch_command(self):
+        worker = yield self.get_metrics_worker()
+        user_helper = yield self.vumi_helper.make_user(u'acc1')
+        conv1 = yield self.make_conv(user_helper, u'conv1', started=True)
+        conv2 = yield self.make_conv(user_helper, u'conv2', started=True)
+
+        yield worker.send_metrics_batch_command([
+            [user_helper.account_key, conv1.key],
+            [user_helper.account_key, conv2.key],
+        ], 'my_conv_application')
+        [cmd] = self.vumi_helper.get_dispatched_commands()
+
+        self.assertEqual(cmd['worker_name'], 'my_conv_application')
+        self.assertEqual(cmd['command'], 'collect_metrics_batch')
+        self.assertEqual(cmd['kwargs']['conversations'], [
+            [user_helper.account_key, conv1.key],
+            [user_helper.account_key, conv2.key],
+        ])
+
+    @inlineCallbacks
+    def test_process_bucket_batches_conversations(self):
+        worker = yield self.get_metrics_worker()
+        user_helper = yield self.vumi_helper.make_user(u'acc1')
+        convs = []
+        for name in [u'conv1', u'conv1a', u'conv1b']:
+            conv = yield self.make_conv(user_helper, name, started=True)
+            self.conversation_names[conv.key] = conv.name
+            convs.append(conv)
+
+        yield worker.populate_conversation_buckets()
+        yield worker.process_bucket(1)
+
+        [cmd] = self.vumi_helper.get_dispatched_commands()
+        self.assertEqual(cmd['command'], 'collect_metrics_batch')
+        self.assertEqual(
+            sorted(cmd['kwargs']['conversations']),
+            sorted([user_helper.account_key, c.key] for c in convs))
+
+    @inlineCallbacks
+    def test_process_bucket_respects_batch_size(self):
+        worker = yield self.get_metrics_worker({'metrics_batch_size': 2})
+        user_helper = yield self.vumi_helper.make_user(u'acc1')
+        convs = []
+        for name in [u'conv1', u'conv1a', u'conv1b']:
+            conv = yield self.make_conv(user_helper, name, started=True)
+            self.conversation_names[conv.key] = conv.name
+            convs.append(conv)
+
+        yield worker.populate_conversation_buckets()
+        yield worker.process_bucket(1)
+
+        cmds = self.vumi_helper.get_dispatched_commands()
+        self.assertEqual(
+            [len(cmd['kwargs']['conversations']) for cmd in cmds], [2, 1])
+        self.assertEqual(
+            sorted(c for cmd in cmds for c in cmd['kwargs']['conversations']),
+            sorted([user_helper.account_key, c.key] for c in convs))
+
+    @inlineCallbacks
+    def test_commands_per_interval_bounded_by_buckets(self):
+        worker = yield self.get_metrics_worker()
+        user_helper = yield self.vumi_helper.make_user(u'acc1')
+        # Ten conversations in each of three buckets.
+        for bucket in [0, 1, 2]:
+            for i in range(10):
+                conv = yield self.make_conv(
+                    user_helper, u'conv%d' % (bucket + 60 * i,), started=True)
+                self.conversation_names[conv.key] = conv.name
+
+        for _ in range(60):
+            yield worker.metrics_loop_func()
+
+        cmds = self.vumi_helper.get_dispatched_commands()
+        self.assertEqual(len(cmds), 3)
+        self.assertEqual(
+            sum(len(cmd['kwargs']['conversations']) for cmd in cmds), 30)
+
     @inlineCallbacks
     def setup_metric_loop_conversations(self, worker):
         user1_helper = yield self.vumi_helper.make_user(u'acc1')
@@ -217,9 +295,11 @@ class TestGoMetricsWorker(VumiTestCase):
         yield worker.metrics_loop_func()
         self.assertEqual(worker._current_bucket, 1)
 
-        cmds = self.vumi_helper.get_dispatched_commands()
-        conv_keys = [c.payload['kwargs']['conversation_key'] for c in cmds]
-        self.assertEqual(conv_keys, [conv0.key])
+        [cmd] = self.vumi_helper.get_dispatched_commands()
+        self.assertEqual(cmd['command'], 'collect_metrics_batch')
+        self.assertEqual(
+            cmd['kwargs']['conversations'],
+            [[conv0.user_account.key, conv0.key]])
 
         self.assert_conversations_bucketed(worker, {
             1: [conv1],
@@ -238,9 +318,11 @@ class TestGoMetricsWorker(VumiTestCase):
         yield worker.metrics_loop_func()
         self.assertEqual(worker._current_bucket, 2)
 
-        cmds = self.vumi_helper.get_dispatched_commands()
-        conv_keys = [c['kwargs']['conversation_key'] for c in cmds]
-        self.assertEqual(conv_keys, [conv1.key])
+        [cmd] = self.vumi_helper.get_dispatched_commands()
+        self.assertEqual(cmd['command'], 'collect_metrics_batch')
+        self.assertEqual(
+            cmd['kwargs']['conversations'],
+            [[conv1.user_account.key, conv1.key]])
 
         self.assert_conversations_bucketed(worker, {
             0: [conv0],
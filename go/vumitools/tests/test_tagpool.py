@@ -0,0 +1,72 @@
+"""Tests for go.vumitools.tagpool."""
+
+from twisted.internet.defer import inlineCallbacks
+
+from vumi.components.tagpool import TagpoolManager
+from vumi.tests.helpers import VumiTestCase, PersistenceHelper
+
+from go.vumitools.tagpool import CachingTagpoolManager
+
+
+class TestCachingTagpoolManager(VumiTestCase):
+
+    @inlineCallbacks
+    def setUp(self):
+        self.persistence_helper = self.add_helper(PersistenceHelper())
+        self.redis = yield self.persistence_helper.get_redis_manager()
+        self.tpm = CachingTagpoolManager(self.redis.sub_manager('tagpools'))
+        yield self.tpm.declare_tags([(u'pool1', u'tag1'), (u'pool1', u'tag2')])
+        yield self.tpm.set_metadata(u'pool1', {'display_name': u'Pool 1'})
+
+    @inlineCallbacks
+    def assert_snapshot(self, expected):
+        snapshot = yield self.tpm.get_snapshot()
+        self.assertEqual(snapshot, expected)
+
+    @inlineCallbacks
+    def test_get_snapshot(self):
+        yield self.tpm.declare_tags([(u'pool2', u'tag1')])
+        yield self.assert_snapshot({
+            u'pool1': {'free': 2, 'metadata': {u'display_name': u'Pool 1'}},
+            u'pool2': {'free': 1, 'metadata': {}},
+        })
+
+    @inlineCallbacks
+    def test_get_snapshot_cached(self):
+        yield self.tpm.get_snapshot()
+        # Changes made by other managers aren't seen until the snapshot
+        # expires.
+        other_tpm = TagpoolManager(self.redis.sub_manager('tagpools'))
+        yield other_tpm.acquire_tag(u'pool1')
+        yield self.assert_snapshot({
+            u'pool1': {'free': 2, 'metadata': {u'display_name': u'Pool 1'}},
+        })
+        ttl = yield self.tpm.redis.ttl(self.tpm._snapshot_key())
+        self.assertTrue(0 < ttl <= self.tpm.SNAPSHOT_TTL)
+
+    @inlineCallbacks
+    def test_acquire_and_release_invalidate_snapshot(self):
+        yield self.tpm.get_snapshot()
+        tag = yield self.tpm.acquire_tag(u'pool1')
+        yield self.assert_snapshot({
+            u'pool1': {'free': 1, 'metadata': {u'display_name': u'Pool 1'}},
+        })
+        yield self.tpm.acquire_specific_tag((u'pool1', u'tag2'))
+        yield self.assert_snapshot({
+            u'pool1': {'free': 0, 'metadata': {u'display_name': u'Pool 1'}},
+        })
+        yield self.tpm.release_tag(tag)
+        yield self.assert_snapshot({
+            u'pool1': {'free': 1, 'metadata': {u'display_name': u'Pool 1'}},
+        })
+
+    @inlineCallbacks
+    def test_pool_changes_invalidate_snapshot(self):
+        yield self.tpm.get_snapshot()
+        yield self.tpm.declare_tags([(u'pool1', u'tag3')])
+        yield self.tpm.set_metadata(u'pool1', {'display_name': u'One'})
+        yield self.assert_snapshot({
+            u'pool1': {'free': 3, 'metadata': {u'display_name': u'One'}},
+        })
+        yield self.tpm.purge_pool(u'pool1')
+        yield self.assert_snapshot({})
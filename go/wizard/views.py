@@ -115,7 +115,7 @@ def contacts(request, conversation_key):
         # TODO: Remove all groups
         for group_key in group_keys:
             conversation.add_group(group_key)
-        conversation.save()
+        request.user_api.conversation_store.save_conversation(conversation.c)
 
         return redirect('conversations:conversation',
                         conversation_key=conversation.key, path_suffix='')